@@ -0,0 +1,73 @@
+"""
+Reads against the hot tables before and after ``archive_closed`` moves
+closed deals and completed tasks out of them.
+
+    python -m benchmarks.archive [--rows 100000] [--closed 0.8]
+"""
+import argparse
+import io
+import time
+from datetime import timedelta
+
+from benchmarks import common
+
+URLS = [
+    '/api/dashboard/stats/',
+    '/api/tasks/?status=pending&ordering=updated_at',
+    '/api/tasks/?count=1',
+    '/api/deals/?stage=lead&count=1',
+]
+
+
+def best_of(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help='Tasks to seed.')
+    parser.add_argument('--closed', type=float, default=0.8, help='Share of tasks and deals closed long ago.')
+    args = parser.parse_args()
+
+    common.setup()
+    from django.core.cache import cache
+    from django.core.management import call_command
+    from django.utils import timezone
+
+    from tasks import archive
+    from tasks.models import Deal, Task
+
+    with common.test_database():
+        call_command('seed_crm', companies=args.rows // 200, contacts=args.rows // 20, deals=args.rows // 4,
+                     tasks=args.rows, stdout=io.StringIO())
+        # A CRM a few years in: most of what it holds was closed long ago.
+        old = timezone.now() - timedelta(days=400)
+        tasks = list(Task.objects.values_list('pk', flat=True)[:int(args.rows * args.closed)])
+        Task.objects.filter(pk__in=tasks).update(status='completed', is_overdue=False, priority_rank=None,
+                                                 updated_at=old)
+        deals = list(Deal.objects.values_list('pk', flat=True)[:int(args.rows // 4 * args.closed)])
+        Deal.objects.filter(pk__in=deals).update(stage='won', updated_at=old)
+        client = common.api_client()
+
+        def measure(label):
+            print(f'{label}: {Task.objects.count()} tasks, {Deal.objects.count()} deals in the hot tables')
+            for url in URLS:
+                def read():
+                    cache.clear()
+                    assert client.get(url).status_code == 200
+                print(f'  {url:48} {best_of(read) * 1000:9.1f} ms')
+
+        measure('before')
+        start = time.perf_counter()
+        moved = archive.archive()
+        print(f'archive: {moved} in {time.perf_counter() - start:.1f} s')
+        measure('after')
+
+
+if __name__ == '__main__':
+    main()
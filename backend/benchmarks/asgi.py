@@ -0,0 +1,98 @@
+"""
+Concurrent dashboard requests served by one worker, WSGI vs ASGI.
+
+The WSGI worker is a pool of ``--threads`` threads (gunicorn's gthread
+model). Each thread serves one request at a time through the sync views. The
+ASGI worker is a single event loop running the async views, with
+``--concurrency`` requests in flight. Both use token authentication.
+
+Django runs the async ORM, and the sync parts of its stock middleware, on
+one shared thread. On a warm cache, throughput is therefore bound by
+Python rather than by the database in both setups. What the ASGI worker
+adds is how many requests it can hold open at once.
+
+    python -m benchmarks.asgi [--concurrency 64] [--threads 4] [--url /api/deals/]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import common
+
+urlpatterns = []
+
+
+def report(label, timings, elapsed):
+    timings.sort()
+    print(f'{label:>38}: {len(timings) / elapsed:7.0f} req/s  p50 {statistics.median(timings):7.2f} ms  '
+          f'p95 {timings[int(len(timings) * 0.95)]:7.2f} ms')
+    return len(timings) / elapsed
+
+
+def run_wsgi(url, headers, requests, threads):
+    from django.test import Client
+
+    def one(_):
+        client = Client()
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.content
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        timings = list(pool.map(one, range(requests)))
+    return timings, time.perf_counter() - start
+
+
+async def run_asgi(url, headers, requests, concurrency):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            assert response.status_code == 200, response.content
+            return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    timings = await asyncio.gather(*(one() for _ in range(requests)))
+    return list(timings), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--url', default='/api/dashboard/stats/')
+    args = parser.parse_args()
+
+    common.setup()
+    from django.test.utils import override_settings
+    from django.urls import clear_url_caches, include, path
+
+    from tasks.authentication import get_token
+    from tasks.urls import api_urlpatterns
+
+    with common.test_database():
+        headers = {'Authorization': f'Token {get_token(common.demo_user()).key}'}
+        timings, elapsed = run_wsgi(args.url, headers, args.requests, args.threads)
+        wsgi = report(f'WSGI, {args.threads} threads', timings, elapsed)
+        for async_views in (False, True):
+            urlpatterns[:] = [path('api/', include(api_urlpatterns(async_views=async_views)))]
+            clear_url_caches()
+            with override_settings(ROOT_URLCONF=__name__):
+                timings, elapsed = asyncio.run(run_asgi(args.url, headers, args.requests, args.concurrency))
+            label = 'async' if async_views else 'sync'
+            asgi = report(f'ASGI, {label} views, {args.concurrency} in flight', timings, elapsed)
+        print(f'ASGI/WSGI: {asgi / wsgi:.1f}x throughput, {args.concurrency / args.threads:.0f}x requests in flight')
+
+
+if __name__ == '__main__':
+    main()
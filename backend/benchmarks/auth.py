@@ -0,0 +1,57 @@
+"""
+Queries and latency per token-authenticated request, with DRF's stock
+``TokenAuthentication`` and with ``CachingTokenAuthentication``.
+
+The dashboard endpoint serves a cached snapshot, so whatever queries remain
+are authentication's.
+
+    python -m benchmarks.auth [--requests 500]
+"""
+import argparse
+import statistics
+import time
+from unittest import mock
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    common.setup()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.test import APIClient
+    from rest_framework.views import APIView
+
+    from tasks.authentication import CachingTokenAuthentication, get_token, token_cache
+
+    with common.test_database():
+        token = get_token(common.demo_user())
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        url = '/api/dashboard/stats/'
+
+        for cls in (TokenAuthentication, CachingTokenAuthentication):
+            token_cache.clear()
+            # api_view functions copy the class list when they're decorated.
+            with mock.patch.object(APIView, 'authentication_classes', [cls]), \
+                    mock.patch('tasks.views.dashboard_stats.cls.authentication_classes', [cls]):
+                client.get(url)
+                timings = []
+                with CaptureQueriesContext(connection) as ctx:
+                    for _ in range(args.requests):
+                        start = time.perf_counter()
+                        response = client.get(url)
+                        timings.append((time.perf_counter() - start) * 1000)
+                        assert response.status_code == 200, response.content
+            timings.sort()
+            print(f'{cls.__name__:>27}: {len(ctx.captured_queries) / args.requests:.2f} queries/request  '
+                  f'p50 {statistics.median(timings):6.3f} ms  p95 {timings[int(len(timings) * 0.95)]:6.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
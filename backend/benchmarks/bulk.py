@@ -0,0 +1,48 @@
+"""
+Per-record POST vs. the ``bulk`` action for contacts.
+
+    python -m benchmarks.bulk [--rows 2000]
+"""
+import argparse
+
+from benchmarks import common
+
+
+def payload(prefix, rows, company_id):
+    return [
+        {'first_name': 'First', 'last_name': f'{prefix}{i}', 'email': f'{prefix}{i}@example.com',
+         'company': company_id, 'position': 'Buyer'}
+        for i in range(rows)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    common.setup()
+    from tasks.models import Company, Contact
+
+    with common.test_database():
+        client = common.api_client()
+        company = Company.objects.create(name='Bench Co')
+        timings = {}
+
+        with common.timer(timings, 'single'):
+            for item in payload('single', args.rows, company.pk):
+                response = client.post('/api/contacts/', item, format='json')
+                assert response.status_code == 201, response.content
+
+        with common.timer(timings, 'bulk'):
+            response = client.post('/api/contacts/bulk/', payload('bulk', args.rows, company.pk), format='json')
+            assert response.status_code == 201 and not response.data['errors'], response.content
+
+        assert Contact.objects.count() == 2 * args.rows
+        for name, seconds in timings.items():
+            print(f'{name:>6}: {args.rows / seconds:10.0f} rows/s  ({seconds:.2f}s)')
+        print(f'speedup: {timings["single"] / timings["bulk"]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
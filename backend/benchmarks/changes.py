@@ -0,0 +1,77 @@
+"""
+Keeping a client's lists current after a few writes: refetching every list
+page, as the frontend did, vs. one ``/api/changes/`` delta read.
+
+    python -m benchmarks.changes [--rows 10000 100000] [--writes 20]
+"""
+import argparse
+import io
+import time
+
+from benchmarks import common
+
+LISTS = ['/api/companies/', '/api/contacts/', '/api/deals/', '/api/tasks/']
+
+
+def refetch(client):
+    """Every page of every list; ``(seconds, requests, bytes)``."""
+    start = time.perf_counter()
+    requests = size = 0
+    for url in LISTS:
+        url += '?page_size=500'
+        while url:
+            response = client.get(url)
+            requests += 1
+            size += len(response.content)
+            url = response.json()['next']
+    return time.perf_counter() - start, requests, size
+
+
+def delta(client, cursor):
+    start = time.perf_counter()
+    requests = size = 0
+    more = True
+    while more:
+        response = client.get(f'/api/changes/?since={cursor}')
+        requests += 1
+        size += len(response.content)
+        data = response.json()
+        cursor, more = data['cursor'], data['more']
+    return time.perf_counter() - start, requests, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help='Contacts to seed.')
+    parser.add_argument('--writes', type=int, default=20, help='Records changed between syncs.')
+    args = parser.parse_args()
+
+    common.setup()
+    from django.core.cache import cache
+    from django.core.management import call_command
+
+    from tasks import changes
+    from tasks.models import Deal, Task
+
+    for rows in args.rows:
+        with common.test_database():
+            call_command('seed_crm', companies=rows // 10, contacts=rows, deals=rows // 2, tasks=rows * 2,
+                         stdout=io.StringIO())
+            client = common.api_client()
+            cursor = changes.latest_cursor()
+            for deal in Deal.objects.order_by('?')[:args.writes // 2]:
+                deal.stage = 'won'
+                deal.save()
+            for task in Task.objects.order_by('?')[:args.writes - args.writes // 2]:
+                task.status = 'completed'
+                task.save()
+            cache.clear()
+
+            print(f'{rows} contacts, {args.writes} records changed')
+            for name, result in (('refetch all lists', refetch(client)), ('changes since cursor', delta(client, cursor))):
+                seconds, requests, size = result
+                print(f'  {name:>20}: {seconds * 1000:9.1f} ms  {requests:5d} requests  {size / 1024:10.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
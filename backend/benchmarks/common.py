@@ -0,0 +1,57 @@
+"""
+Shared setup for the scripts in this package.
+
+Each benchmark runs against a throwaway test database so it never touches
+``db.sqlite3``. Run them from ``backend/``, e.g. ``python -m benchmarks.bulk``.
+"""
+import contextlib
+import os
+import time
+
+import django
+
+
+def setup(settings_module='config.settings'):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+    from django.conf import settings
+
+    # These time the endpoints, not request budgets; benchmarks.throttle does those.
+    settings.THROTTLE = {**settings.THROTTLE, 'ENABLED': False}
+
+
+@contextlib.contextmanager
+def test_database():
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from django.test.runner import DiscoverRunner
+
+    setup_test_environment()
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    old_config = runner.setup_databases()
+    try:
+        yield
+    finally:
+        runner.teardown_databases(old_config)
+        teardown_test_environment()
+
+
+def demo_user():
+    from django.contrib.auth.models import User
+
+    user, _ = User.objects.get_or_create(username='bench')
+    return user
+
+
+def api_client(user=None):
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+    client.force_authenticate(user or demo_user())
+    return client
+
+
+@contextlib.contextmanager
+def timer(results, name):
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
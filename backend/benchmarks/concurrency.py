@@ -0,0 +1,105 @@
+"""
+Write throughput and "database is locked" errors under concurrent writers.
+
+Each thread plays a worker serving requests: it checks for an existing
+company, creates one in the same transaction and ends the "request", which
+closes or keeps its connection according to ``CONN_MAX_AGE``. Two profiles
+run against the configured backend: Django's defaults, and the tuned
+settings from ``config/settings.py``. SQLite runs on a temporary file, not
+the usual in-memory test database, so journaling and locking are real.
+
+    python -m benchmarks.concurrency [--threads 8] [--writes 200]
+    DB_ENGINE=postgresql DB_NAME=... python -m benchmarks.concurrency
+"""
+import argparse
+import copy
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks import common
+
+
+def profiles(tuned):
+    if tuned['ENGINE'].endswith('sqlite3'):
+        default = {'OPTIONS': {'init_command': 'PRAGMA journal_mode=DELETE'}}
+    else:
+        default = {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}}
+    return {
+        'default': default,
+        'tuned': {key: copy.deepcopy(tuned[key]) for key in default},
+    }
+
+
+def configure(profile):
+    from django.db import connection
+
+    connection.close()
+    connection.settings_dict.update(copy.deepcopy(profile))
+    # Connect once alone so the journal mode switch can't race the workers.
+    connection.ensure_connection()
+    connection.close()
+
+
+def worker(prefix, writes, results):
+    from django.db import close_old_connections, connection, transaction
+    from django.db.utils import OperationalError
+
+    from tasks.models import Company
+
+    done = errors = 0
+    for i in range(writes):
+        close_old_connections()
+        name = f'{prefix}-{i}'
+        try:
+            with transaction.atomic():
+                if not Company.objects.filter(name=name).exists():
+                    Company.objects.create(name=name, industry='Benchmark')
+            done += 1
+        except OperationalError as exc:
+            if 'locked' not in str(exc):
+                raise
+            errors += 1
+        close_old_connections()
+    connection.close()
+    results.append((done, errors))
+
+
+def run(threads, writes, label):
+    results = []
+    workers = [threading.Thread(target=worker, args=(f'{label}-{n}', writes, results)) for n in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done = sum(result[0] for result in results)
+    errors = sum(result[1] for result in results)
+    return done / elapsed, errors / (threads * writes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200)
+    args = parser.parse_args()
+
+    common.setup()
+    from django.db import connection
+
+    settings_dict = connection.settings_dict
+    with tempfile.TemporaryDirectory() as tmp:
+        if connection.vendor == 'sqlite':
+            settings_dict['TEST'] = {**settings_dict.get('TEST', {}), 'NAME': str(Path(tmp) / 'bench.sqlite3')}
+        with common.test_database():
+            for label, profile in profiles(copy.deepcopy(settings_dict)).items():
+                configure(profile)
+                rate, error_rate = run(args.threads, args.writes, label)
+                print(f'{connection.vendor:>10} {label:>8}: {rate:8.0f} writes/s  '
+                      f'{error_rate:6.1%} locked errors ({args.threads} threads)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Cost of an exact COUNT(*) vs. ``tasks.counts`` on the task table, and of the
+task admin changelist that uses it.
+
+    python -m benchmarks.counts [--rows 1000000]
+"""
+import argparse
+import io
+import time
+
+from benchmarks import common
+
+
+def best_of(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='Tasks to seed.')
+    args = parser.parse_args()
+
+    common.setup()
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.core.management import call_command
+    from django.test import Client
+
+    from tasks import counts
+    from tasks.models import Task
+
+    with common.test_database():
+        call_command('seed_crm', companies=args.rows // 100, contacts=args.rows // 10, deals=args.rows // 20,
+                     tasks=args.rows, stdout=io.StringIO())
+        tasks = Task.objects.all()
+        open_tasks = Task.objects.filter(status__in=Task.OPEN_STATUSES)
+        print(f'{args.rows} tasks')
+        print(f'  COUNT(*):                 {best_of(tasks.count) * 1000:8.2f} ms')
+        print(f'  counts.count():           {best_of(lambda: counts.count(tasks)) * 1000:8.2f} ms')
+        print(f'  COUNT(*) of open tasks:   {best_of(open_tasks.count) * 1000:8.2f} ms')
+        print(f'  counts.count(), cached:   {best_of(lambda: counts.count(open_tasks)) * 1000:8.2f} ms')
+
+        client = Client()
+        client.force_login(User.objects.create_superuser('bench-admin', password='x'))
+
+        def changelist():
+            cache.clear()
+            assert client.get('/admin/tasks/task/').status_code == 200
+
+        print(f'  admin task changelist:    {best_of(changelist) * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Peak Python memory while streaming a contact export at growing table sizes.
+
+    python -m benchmarks.export [--rows 10000 100000]
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks import common
+
+
+def seed(target):
+    from tasks.models import Company, Contact
+
+    company = Company.objects.first() or Company.objects.create(name='Bench Co')
+    start = Contact.objects.count()
+    Contact.objects.bulk_create(
+        (Contact(first_name='First', last_name=f'Last {i}', email=f'export{i}@example.com',
+                 company=company, notes='x' * 200)
+         for i in range(start, target)),
+        batch_size=2000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    common.setup()
+    with common.test_database():
+        client = common.api_client()
+        for rows in sorted(args.rows):
+            seed(rows)
+            tracemalloc.start()
+            started = time.perf_counter()
+            response = client.get('/api/contacts/export/?format=csv')
+            size = sum(len(chunk) for chunk in response.streaming_content)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f'{rows:>9} rows: {size / 1e6:8.1f} MB streamed in {elapsed:6.2f}s, '
+                  f'peak {peak / 1e6:6.2f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Payload size, queries and time for full list pages vs. ``?fields=``, and for
+fetching each company's deals one request at a time vs. ``?expand=deals``.
+
+    python -m benchmarks.fieldsets [--rows 2000] [--page-size 100]
+"""
+import argparse
+
+from benchmarks import common
+from benchmarks.serialization import seed
+
+
+def measure(client, urls):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    client.get(urls[0])  # compile plans, warm the connection
+    cache.clear()
+    result = {}
+    size = 0
+    with CaptureQueriesContext(connection) as ctx, common.timer(result, 'time'):
+        for url in urls:
+            response = client.get(url)
+            assert response.status_code == 200, response.content
+            size += len(response.content)
+    return size, len(ctx.captured_queries), result['time']
+
+
+def report(label, size, queries, elapsed):
+    print(f'{label:>48}: {size / 1024:8.1f} KiB  {queries:4d} queries  {elapsed * 1000:7.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, default=100)
+    args = parser.parse_args()
+
+    common.setup()
+    from tasks.models import Company
+
+    with common.test_database():
+        seed(args.rows)
+        client = common.api_client()
+        page = f'/api/contacts/?page_size={args.page_size}'
+        report('contacts, all fields', *measure(client, [page]))
+        report('contacts, ?fields=id,full_name,email,company_name',
+               *measure(client, [page + '&fields=id,full_name,email,company_name']))
+
+        companies = f'/api/companies/?page_size={args.page_size}'
+        ids = Company.objects.order_by('-created_at', 'id').values_list('id', flat=True)[:args.page_size]
+        report('companies, then deals per company',
+               *measure(client, [companies] + [f'/api/deals/?company={pk}&page_size=500' for pk in ids]))
+        report('companies?expand=deals', *measure(client, [companies + '&expand=deals']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Time an HTTP worker spends on a contact export streamed in the request
+vs. handed to the job queue, and the queue's own per-job overhead.
+
+    python -m benchmarks.jobs [--rows 100000] [--jobs 500]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks import common
+from benchmarks.export import seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--jobs', type=int, default=500)
+    args = parser.parse_args()
+
+    common.setup()
+    from django.test.utils import override_settings
+
+    from tasks import jobs
+    from tasks.models import Job
+
+    with common.test_database(), tempfile.TemporaryDirectory() as tmp, \
+            override_settings(EXPORT_DIR=Path(tmp)):
+        seed(args.rows)
+        client = common.api_client()
+        worker = jobs.Worker()
+
+        start = time.perf_counter()
+        response = client.get('/api/contacts/export/?format=csv')
+        size = sum(len(chunk) for chunk in response.streaming_content)
+        inline = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.get('/api/contacts/export/?format=csv&background=1')
+        assert response.status_code == 202, response.content
+        queued = time.perf_counter() - start
+        worker.work(burst=True)
+        export = Job.objects.get(name='export')
+        assert export.result['bytes'] == size, export.result
+
+        print(f'{args.rows} contacts, {size / 1e6:.1f} MB CSV')
+        print(f'  streamed in the request: {inline * 1000:8.1f} ms of HTTP worker time')
+        print(f'  ?background=1:           {queued * 1000:8.1f} ms of HTTP worker time, '
+              f'then {export.duration * 1000:.1f} ms in the job worker')
+
+        with mock_job():
+            for _ in range(args.jobs):
+                jobs.enqueue('noop')
+            start = time.perf_counter()
+            worker.work(burst=True)
+            elapsed = time.perf_counter() - start
+        print(f'  {args.jobs} empty jobs: {args.jobs / elapsed:.0f} jobs/s, '
+              f'{elapsed / args.jobs * 1000:.2f} ms overhead per job')
+
+
+def mock_job():
+    from unittest import mock
+
+    from tasks import jobs
+
+    return mock.patch.dict(jobs.registry, {'noop': jobs.Registered(lambda job: None, 1, None)})
+
+
+if __name__ == '__main__':
+    main()
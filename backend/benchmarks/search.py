@@ -0,0 +1,65 @@
+"""
+Full-text search latency as the number of indexed contacts grows.
+
+Selective queries (a surname) should stay flat; broad ones (two words found
+in a large share of all notes) have to rank every match, so they grow with
+the number of matching rows rather than the table size.
+
+    python -m benchmarks.search [--rows 10000 100000]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks import common
+
+WORDS = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliet',
+         'kilo', 'lima', 'mike', 'november', 'oscar', 'papa', 'quebec', 'romeo', 'sierra', 'tango']
+
+
+def seed(target):
+    from tasks.models import Contact
+
+    rng = random.Random(target)
+    start = Contact.objects.count()
+    Contact.objects.bulk_create(
+        (Contact(first_name=rng.choice(WORDS).title(), last_name=f'{rng.choice(WORDS).title()}{i}',
+                 email=f'search{i}@example.com', position=rng.choice(WORDS),
+                 notes=' '.join(rng.choices(WORDS, k=12)))
+         for i in range(start, target)),
+        batch_size=2000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    common.setup()
+    from tasks import search
+
+    with common.test_database():
+        rng = random.Random(0)
+        for rows in sorted(args.rows):
+            seed(rows)
+            queries = {
+                'selective': lambda: f'{rng.choice(WORDS)}{rng.randrange(rows)}',
+                'broad': lambda: ' '.join(rng.sample(WORDS, 2)),
+            }
+            for label, make_query in queries.items():
+                timings = []
+                for _ in range(args.queries):
+                    query = make_query()
+                    start = time.perf_counter()
+                    search.search(query, limit=21)
+                    timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                print(f'{rows:>9} contacts, {label:>9}: p50 {statistics.median(timings):7.2f} ms  '
+                      f'p95 {timings[int(len(timings) * 0.95)]:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
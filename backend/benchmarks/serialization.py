@@ -0,0 +1,85 @@
+"""
+Per-row cost of rendering list pages: DRF serializers over model instances
+vs. ``RowPlan`` over ``values()`` rows, with DRF's and the orjson renderer.
+
+    python -m benchmarks.serialization [--rows 5000] [--repeat 5]
+"""
+import argparse
+from decimal import Decimal
+
+from benchmarks import common
+
+
+def seed(rows):
+    from django.utils import timezone
+
+    from tasks.models import Company, Contact, Deal, Task
+
+    user = common.demo_user()
+    companies = Company.objects.bulk_create(Company(name=f'Company {i}', created_by=user) for i in range(100))
+    contacts = Contact.objects.bulk_create(
+        Contact(first_name='First', last_name=f'Last {i}', email=f'c{i}@example.com',
+                company=companies[i % 100], created_by=user)
+        for i in range(rows)
+    )
+    deals = Deal.objects.bulk_create(
+        Deal(title=f'Deal {i}', amount=Decimal('1234.50'), company=companies[i % 100],
+             contact=contacts[i], created_by=user)
+        for i in range(rows)
+    )
+    Task.objects.bulk_create(
+        Task(title=f'Task {i}', contact=contacts[i], deal=deals[i], assigned_to=user,
+             due_date=timezone.now(), created_by=user)
+        for i in range(rows)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    common.setup()
+    from rest_framework.renderers import JSONRenderer
+
+    from tasks.models import Company, Contact, Deal, Task
+    from tasks.planning import plan_queryset
+    from tasks.renderers import FastJSONRenderer
+    from tasks.rows import RowPlan
+    from tasks.serializers import CompanySerializer, ContactSerializer, DealSerializer, TaskSerializer
+
+    with common.test_database():
+        seed(args.rows)
+        for model, serializer_class in [(Company, CompanySerializer), (Contact, ContactSerializer),
+                                        (Deal, DealSerializer), (Task, TaskSerializer)]:
+            plan = RowPlan.compile(serializer_class)
+
+            ordered = model.objects.order_by('-created_at', 'id')
+
+            def instances():
+                queryset = plan_queryset(ordered, serializer_class())
+                return JSONRenderer().render(serializer_class(queryset, many=True).data)
+
+            def rows():
+                return FastJSONRenderer().render(plan.to_representation_many(plan.values(ordered)))
+
+            count = model.objects.count()
+            timings = {}
+            for name, run in [('serializer', instances), ('rows', rows)]:
+                best = None
+                for _ in range(args.repeat):
+                    result = {}
+                    with common.timer(result, name):
+                        content = run()
+                    best = min(best or result[name], result[name])
+                timings[name] = best
+                timings[name + '_bytes'] = content
+            assert timings['serializer_bytes'] == timings['rows_bytes'], model
+            print(f'{model.__name__:>8} ({count} rows): serializer {timings["serializer"] / count * 1e6:6.1f} us/row  '
+                  f'rows {timings["rows"] / count * 1e6:6.1f} us/row  '
+                  f'({timings["serializer"] / timings["rows"]:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
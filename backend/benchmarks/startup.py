@@ -0,0 +1,136 @@
+"""
+Worker start-up cost per settings profile: import time of ``config.wsgi``
+(from ``python -X importtime``), the master's RSS, and the memory each
+forked worker holds after serving some requests, with and without
+``config.preload``.
+
+Workers are forked from the master as ``gunicorn --preload`` does. Their
+private memory (USS) is what each extra worker adds to the box; PSS also
+counts their share of the pages they still share. Memory figures need
+Linux's ``/proc``.
+
+    python -m benchmarks.startup [--workers 4] [--requests 50]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+PROFILES = ['config.settings', 'config.settings_api']
+URLS = ['/api/contacts/', '/api/deals/?page_size=100', '/api/tasks/mine/', '/api/dashboard/stats/']
+
+# Run in a fresh interpreter: imports the app as the master, then forks workers.
+WORKER = r'''
+import json, os, sys
+
+def memory():
+    fields = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if value.strip().endswith('kB'):
+                    fields[name] = int(value.split()[0])
+    except OSError:
+        return {}
+    return {'rss': fields['Rss'], 'pss': fields['Pss'],
+            'uss': fields['Private_Clean'] + fields['Private_Dirty']}
+
+from config.wsgi import application
+from wsgiref.util import setup_testing_defaults
+
+def get(url):
+    path, _, query = url.partition('?')
+    environ = {'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_AUTHORIZATION': 'Token ' + os.environ['TOKEN']}
+    setup_testing_defaults(environ)
+    status = []
+    body = b''.join(application(environ, lambda s, h, e=None: status.append(s)))
+    assert status[0].startswith('200'), (url, status, body[:200])
+
+urls, requests, workers = json.loads(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+result = {'master': memory(), 'workers': []}
+children = []
+for _ in range(workers):
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        for i in range(requests):
+            get(urls[i % len(urls)])
+        os.write(write, json.dumps(memory()).encode())
+        os._exit(0)
+    os.close(write)
+    children.append((pid, read))
+for pid, read in children:
+    with os.fdopen(read) as f:
+        result['workers'].append(json.loads(f.read()))
+    os.waitpid(pid, 0)
+print(json.dumps(result))
+'''
+
+
+def import_times(env, repeat=3):
+    """
+    ``(total ms, modules)`` imported by ``import config.wsgi``, from
+    ``-X importtime``; the fastest of ``repeat`` runs.
+    """
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import config.wsgi'],
+                              cwd=BACKEND, env=env, capture_output=True, text=True, check=True)
+        self_us = [int(m.group(1)) for m in re.finditer(r'^import time:\s+(\d+) \|', proc.stderr, re.M)]
+        runs.append((sum(self_us) / 1000, len(self_us)))
+    return min(runs)
+
+
+def prepare(env):
+    """A migrated, seeded throwaway database, and a token for it."""
+    def manage(*args):
+        subprocess.run([sys.executable, 'manage.py', *args], cwd=BACKEND, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+    manage('migrate', '-v', '0')
+    manage('seed_crm', '--companies', '50', '--contacts', '1000', '--deals', '500', '--tasks', '2000')
+    script = ('import django; django.setup(); from tasks.authentication import get_token; '
+              'from django.contrib.auth.models import User; print(get_token(User.objects.first()).key)')
+    return subprocess.run([sys.executable, '-c', script], cwd=BACKEND, env=env, capture_output=True,
+                          text=True, check=True).stdout.strip()
+
+
+def mib(kib):
+    return f'{kib / 1024:7.1f}' if kib is not None else '      ?'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=50, help='Requests each worker serves before measuring.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = {**os.environ, 'DB_NAME': str(Path(tmp) / 'startup.sqlite3'), 'DJANGO_SETTINGS_MODULE': PROFILES[0]}
+        token = prepare(base)
+        print(f'{"":>32} {"import":>9} {"modules":>8} {"master RSS":>11} {"worker USS":>11} {"worker PSS":>11}')
+        for profile in PROFILES:
+            for preload in ('0', '1'):
+                env = {**base, 'DJANGO_SETTINGS_MODULE': profile, 'PRELOAD': preload, 'TOKEN': token}
+                ms, modules = import_times(env)
+                proc = subprocess.run(
+                    [sys.executable, '-c', WORKER, json.dumps(URLS), str(args.requests), str(args.workers)],
+                    cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+                )
+                result = json.loads(proc.stdout)
+                workers = result['workers']
+                uss = sum(w['uss'] for w in workers) / len(workers) if workers[0] else None
+                pss = sum(w['pss'] for w in workers) / len(workers) if workers[0] else None
+                label = f'{profile}, preload {"on" if preload == "1" else "off"}'
+                print(f'{label:>32} {ms:7.0f}ms {modules:8d} {mib(result["master"].get("rss"))} MiB'
+                      f' {mib(uss)} MiB {mib(pss)} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+Latency percentiles, queries per request and peak memory for every GET
+endpoint in ``tasks/urls.py``, on data from ``seed_crm``, compared with a
+stored baseline.
+
+    python -m benchmarks.suite [--scale 1000 100000 1000000] [--requests 20]
+                               [--output results.json] [--update-baseline]
+
+A scale is the number of contacts; companies, deals and tasks are seeded in
+proportion. Each request starts with a cleared cache, so timings are for
+the uncached path. Exits non-zero when an endpoint runs more queries than
+in the baseline, or its median latency or peak memory grew by more than
+``--tolerance`` (p95 is allowed twice that).
+"""
+import argparse
+import gc
+import io
+import json
+import math
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks import common
+
+BASELINE = Path(__file__).parent / 'baselines' / 'suite.json'
+
+# Query strings for endpoints that need one to do real work.
+PARAMS = {
+    'search': '?q=renewal',
+    'company-export': '?format=csv',
+    'contact-export': '?format=csv',
+    'deal-export': '?format=csv',
+    'task-export': '?format=csv',
+}
+# Whole-table endpoints, timed fewer times at large scales.
+SLOW = {'company-export', 'contact-export', 'deal-export', 'task-export'}
+# Absolute slack on top of --tolerance, so tiny numbers don't flap.
+SLACK_MS = 3.0
+SLACK_KIB = 64.0
+
+
+def counts(scale):
+    return {'companies': max(scale // 10, 1), 'contacts': scale, 'deals': scale // 2, 'tasks': scale * 2}
+
+
+def endpoints():
+    """``(name, url)`` for each GET route, with ``pk`` filled in from the first row of its model."""
+    from django.apps import apps
+    from django.urls import URLResolver, get_resolver, reverse
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns)
+            else:
+                yield pattern
+
+    seen = set()
+    for pattern in walk(get_resolver('tasks.urls').url_patterns):
+        callback = pattern.callback
+        if pattern.name in seen or 'format' in pattern.pattern.regex.groupindex:
+            continue
+        actions = getattr(callback, 'actions', None)
+        cls = getattr(callback, 'cls', None)
+        if not (actions.get('get') if actions else cls is not None and hasattr(cls, 'get')):
+            continue
+        seen.add(pattern.name)
+        kwargs = {}
+        if 'pk' in pattern.pattern.regex.groupindex:
+            model = apps.get_model('tasks', pattern.name.split('-')[0])
+            kwargs['pk'] = model.objects.order_by('pk').values_list('pk', flat=True).first()
+            if kwargs['pk'] is None:
+                print(f'  skipping {pattern.name}: no {model._meta.verbose_name} to fetch', file=sys.stderr)
+                continue
+        url = reverse(pattern.name, kwargs=kwargs, urlconf='tasks.urls')
+        yield pattern.name, '/api' + url + PARAMS.get(pattern.name, '')
+
+
+def seed(scale, user):
+    from django.core.management import call_command
+
+    from tasks import jobs
+    from tasks.models import ImportJob
+
+    call_command('seed_crm', users=20, stdout=io.StringIO(), **counts(scale))
+    # Give the import and job endpoints something to show.
+    ImportJob.objects.create(kind='contacts', source='seed.csv', status='completed', created_by=user)
+    client = common.api_client(user)
+    assert client.get('/api/companies/export/?format=csv&background=1').status_code == 202
+    jobs.Worker().work(burst=True)
+
+
+def fetch(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, (url, response.status_code)
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def measure(client, url, requests):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    fetch(client, url)  # compile plans, warm the connection
+    timings = []
+    queries = 0
+    for _ in range(requests):
+        cache.clear()
+        # Collect first, so garbage left by earlier requests isn't collected
+        # inside this one's timing.
+        gc.collect()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            size = fetch(client, url)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = max(queries, len(ctx.captured_queries))
+
+    cache.clear()
+    tracemalloc.start()
+    try:
+        fetch(client, url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'url': url,
+        'requests': requests,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'queries': queries,
+        'peak_kib': round(peak / 1024, 1),
+        'bytes': size,
+    }
+
+
+def run_scale(scale, requests):
+    from django.test.utils import override_settings
+
+    with common.test_database(), tempfile.TemporaryDirectory() as tmp, \
+            override_settings(EXPORT_DIR=Path(tmp)):
+        user = common.demo_user()
+        start = time.perf_counter()
+        seed(scale, user)
+        print(f'scale {scale}: seeded {counts(scale)} in {time.perf_counter() - start:.1f}s')
+        client = common.api_client(user)
+        results = {}
+        for name, url in endpoints():
+            repeats = min(requests, 3) if name in SLOW and scale > 10000 else requests
+            results[name] = row = measure(client, url, repeats)
+            print(f'  {name:>20}: p50 {row["p50_ms"]:8.1f} ms  p95 {row["p95_ms"]:8.1f} ms  '
+                  f'p99 {row["p99_ms"]:8.1f} ms  {row["queries"]:3d} queries  {row["peak_kib"]:9.1f} KiB peak')
+        return results
+
+
+def compare(results, baseline, tolerance):
+    """Human-readable regressions of ``results`` against ``baseline``."""
+    regressions = []
+    for scale, endpoints in results.items():
+        expected = baseline.get(scale)
+        if expected is None:
+            continue
+        for name, old in expected.items():
+            new = endpoints.get(name)
+            if new is None:
+                regressions.append(f'{scale} {name}: missing from this run')
+                continue
+            if new['queries'] > old['queries']:
+                regressions.append(f'{scale} {name}: {new["queries"]} queries, baseline {old["queries"]}')
+            # Tails are noisier than medians, so they get twice the room.
+            for key, allowed in (('p50_ms', tolerance), ('p95_ms', 2 * tolerance)):
+                if new[key] > old[key] * (1 + allowed) + SLACK_MS:
+                    regressions.append(f'{scale} {name}: {key[:3]} {new[key]} ms, baseline {old[key]} ms')
+            if new['peak_kib'] > old['peak_kib'] * (1 + tolerance) + SLACK_KIB:
+                regressions.append(f'{scale} {name}: peak {new["peak_kib"]} KiB, baseline {old["peak_kib"]} KiB')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=int, nargs='+', default=[1000])
+    parser.add_argument('--requests', type=int, default=20, help='Timed requests per endpoint.')
+    parser.add_argument('--output', type=Path, help='Write the results here as JSON.')
+    parser.add_argument('--baseline', type=Path, default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative growth of p50 and peak memory; p95 gets twice this.')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Store these results as the baseline for their scales instead of comparing.')
+    args = parser.parse_args()
+
+    common.setup()
+    results = {str(scale): run_scale(scale, args.requests) for scale in args.scale}
+    report = {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'requests': args.requests,
+        },
+        'scales': results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + '\n')
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {'scales': {}}
+    if args.update_baseline:
+        baseline['meta'] = report['meta']
+        baseline['scales'].update(results)
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+        print(f'Baseline for scale(s) {", ".join(results)} written to {args.baseline}')
+        return
+
+    regressions = compare(results, baseline['scales'], args.tolerance)
+    unchecked = [scale for scale in results if scale not in baseline['scales']]
+    if unchecked:
+        print(f'No baseline for scale(s) {", ".join(unchecked)}; run with --update-baseline to store one.')
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) against {args.baseline}:', file=sys.stderr)
+        for line in regressions:
+            print(f'  {line}', file=sys.stderr)
+        sys.exit(1)
+    if len(unchecked) < len(results):
+        print('No regressions against the baseline.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Time spent in ``TokenBucketThrottle`` per request: the throttle call alone,
+with buckets in process and in the default cache, and a detail read through
+the full stack with throttling on and off. Exits non-zero if a throttle call
+takes longer than ``--budget`` microseconds.
+
+    python -m benchmarks.throttle [--calls 200000] [--callers 10000] [--budget 100]
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from benchmarks import common
+
+
+def per_call(func, calls):
+    """Median over five runs of ``calls`` calls, in microseconds per call."""
+    runs = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for i in range(calls):
+            func(i)
+        runs.append((time.perf_counter() - start) / calls * 1e6)
+    return statistics.median(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--callers', type=int, default=10000, help='Distinct users the calls are spread over.')
+    parser.add_argument('--budget', type=float, default=100.0, help='Allowed microseconds per throttle call.')
+    args = parser.parse_args()
+
+    common.setup()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.test import RequestFactory
+    from rest_framework.request import Request
+
+    from tasks import throttling
+    from tasks.models import Company
+    from tasks.views import ContactViewSet
+
+    enabled = {**settings.THROTTLE, 'ENABLED': True, 'RATE': 1e9, 'BURST': 1e12}
+    view = ContactViewSet(action='list', request=None, format_kwarg=None)
+    requests = []
+    for pk in range(args.callers):
+        request = Request(RequestFactory().get('/api/contacts/'))
+        request.user = User(pk=pk + 1)
+        requests.append(request)
+    throttle = throttling.TokenBucketThrottle()
+
+    def call(i):
+        assert throttle.allow_request(requests[i % args.callers], view)
+
+    worst = 0
+    for label, options in (('in process', enabled), ('default cache', {**enabled, 'CACHE': 'default'})):
+        settings.THROTTLE = options
+        throttling.buckets.clear()
+        cache.clear()
+        us = per_call(call, args.calls)
+        worst = max(worst, us)
+        print(f'  allow_request, {label:>13}: {us:7.2f} us')
+
+    with common.test_database():
+        client = common.api_client()
+        url = f'/api/companies/{Company.objects.create(name="Bench").pk}/'
+        for label, options in (('off', {**enabled, 'ENABLED': False}), ('on', enabled)):
+            settings.THROTTLE = options
+            # Served from the response cache, so the request is mostly overhead.
+            us = per_call(lambda i: client.get(url), 2000)
+            print(f'  GET detail, throttling {label:>3}:    {us:7.2f} us')
+
+    if worst > args.budget:
+        print(f'allow_request took {worst:.1f} us, over the {args.budget:.0f} us budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+A company's activity: every page of the contact, deal and task lists joined
+on the client, as the frontend did, vs. the first page of
+``/api/companies/:id/timeline/``.
+
+    python -m benchmarks.timeline [--rows 20000 200000]
+"""
+import argparse
+import io
+import time
+
+from benchmarks import common
+
+
+def best_of(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[20000, 200000], help='Tasks to seed.')
+    args = parser.parse_args()
+
+    common.setup()
+    from django.core.cache import cache
+    from django.core.management import call_command
+    from django.db.models import Count
+
+    from tasks.models import Company
+
+    for rows in args.rows:
+        with common.test_database():
+            call_command('seed_crm', companies=rows // 200, contacts=rows // 20, deals=rows // 4, tasks=rows,
+                         stdout=io.StringIO())
+            company = Company.objects.annotate(n=Count('deals')).order_by('-n').first()
+            client = common.api_client()
+
+            def everything():
+                cache.clear()
+                lists = {}
+                for name in ['contacts', 'deals', 'tasks']:
+                    lists[name] = []
+                    url = f'/api/{name}/?page_size=500'
+                    while url:
+                        page = client.get(url).json()
+                        lists[name] += page['results']
+                        url = page['next']
+                contacts = [c for c in lists['contacts'] if c['company'] == company.pk]
+                deals = [d for d in lists['deals'] if d['company'] == company.pk]
+                ids = {'deal': {d['id'] for d in deals}, 'contact': {c['id'] for c in contacts}}
+                tasks = [t for t in lists['tasks'] if t['deal'] in ids['deal'] or t['contact'] in ids['contact']]
+                return sorted(contacts + deals + tasks, key=lambda record: record['updated_at'], reverse=True)[:50]
+
+            def timeline():
+                cache.clear()
+                assert client.get(f'/api/companies/{company.pk}/timeline/').status_code == 200
+
+            print(f'{rows} tasks, {company.n} deals at the busiest company')
+            print(f'  all lists, joined on the client: {best_of(everything, 1) * 1000:9.1f} ms')
+            print(f'  timeline, first page:            {best_of(timeline) * 1000:9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
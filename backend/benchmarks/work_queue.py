@@ -0,0 +1,62 @@
+"""
+A sales rep's task list: every page of ``/api/tasks/`` filtered and sorted
+on the client, as the frontend did, vs. ``/api/tasks/mine/``.
+
+    python -m benchmarks.work_queue [--rows 20000 200000]
+"""
+import argparse
+import io
+import time
+
+from benchmarks import common
+
+
+def best_of(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[20000, 200000], help='Tasks to seed.')
+    args = parser.parse_args()
+
+    common.setup()
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.core.management import call_command
+    from django.db.models import Count
+
+    for rows in args.rows:
+        with common.test_database():
+            call_command('seed_crm', companies=rows // 200, contacts=rows // 20, deals=rows // 40, tasks=rows,
+                         users=20, stdout=io.StringIO())
+            user = User.objects.annotate(n=Count('assigned_tasks')).order_by('-n').first()
+            client = common.api_client(user)
+
+            def everything():
+                cache.clear()
+                tasks = []
+                url = '/api/tasks/?page_size=500'
+                while url:
+                    page = client.get(url).json()
+                    tasks += page['results']
+                    url = page['next']
+                mine = [task for task in tasks if task['assigned_to'] == user.pk and task['status'] != 'completed']
+                return sorted(mine, key=lambda task: (not task['is_overdue'], task['due_date'] or '~'))
+
+            def queue():
+                cache.clear()
+                assert client.get('/api/tasks/mine/').status_code == 200
+
+            print(f'{rows} tasks, {user.n} assigned to the busiest user')
+            print(f'  all pages, filtered on the client: {best_of(everything, 1) * 1000:9.1f} ms')
+            print(f'  /api/tasks/mine/:                  {best_of(queue) * 1000:9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
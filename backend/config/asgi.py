@@ -11,6 +11,10 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from config.preload import preload
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
+preload()
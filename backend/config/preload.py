@@ -0,0 +1,30 @@
+"""
+Start-up work done once when ``config.wsgi`` or ``config.asgi`` is imported.
+
+Under ``gunicorn --preload`` that happens in the master process before it
+forks workers, so the workers share the result copy-on-write instead of
+each repeating it on its first requests. ``PRELOAD=0`` turns it off.
+"""
+import gc
+import os
+
+
+def preload():
+    if os.environ.get('PRELOAD', '1') != '1':
+        return
+    from django.db import connections
+    from django.urls import get_resolver
+
+    from tasks.rows import RowPlan
+    from tasks.views import CHANGE_VIEWSETS
+
+    # Imports every view, serializer and model module, and builds the
+    # reverse lookup tables.
+    get_resolver()._populate()
+    for viewset in CHANGE_VIEWSETS.values():
+        RowPlan.compile(viewset.serializer_class)
+    # Forked workers mustn't share a connection.
+    connections.close_all()
+    # Objects alive now live as long as the process. Frozen, the collector
+    # never writes to them, so their pages stay shared between workers.
+    gc.freeze()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack.
+    'tasks.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -74,17 +77,208 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# Serve reads through the async views; config/asgi.py turns this on.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS') == '1'
+
 
 # Database
-# https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# SQLite by default. DB_ENGINE=postgresql (with DB_NAME, DB_USER, DB_PASSWORD,
+# DB_HOST, DB_PORT) switches to PostgreSQL, which needs psycopg installed.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+# Applied to every new SQLite connection. WAL lets readers carry on while a
+# write commits; synchronous=NORMAL is durable across crashes in WAL mode and
+# skips an fsync per commit; the rest keep hot pages in memory.
+SQLITE_PRAGMAS = ';'.join([
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=134217728',
+    'PRAGMA cache_size=-32000',
+    'PRAGMA temp_store=MEMORY',
+])
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'unitycrm'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            # Reuse connections across requests, checking them before reuse
+            # so a server restart doesn't surface as an error.
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    # DB_POOL=1 uses psycopg's connection pool (needs psycopg[pool]) instead
+    # of one persistent connection per worker thread.
+    if os.environ.get('DB_POOL') == '1':
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'init_command': SQLITE_PRAGMAS,
+                # Seconds a writer waits for the lock before "database is locked".
+                'timeout': int(os.environ.get('DB_TIMEOUT', 20)),
+                # Take the write lock at BEGIN: a deferred transaction that
+                # reads and then writes can't wait out a concurrent writer.
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The per-process default; point this at a shared backend (Redis, Memcached)
+# when running several workers so invalidations reach all of them.
 
-DATABASES = {
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Seconds a dashboard snapshot may be served; writes invalidate it sooner.
+DASHBOARD_CACHE_TIMEOUT = 60
+# Rendered list/detail responses, per user; writes invalidate them sooner.
+RESPONSE_CACHE_TIMEOUT = 300
+
+
+# Row counts (tasks.counts) for ?count=1 list pages and admin changelists:
+# exact up to EXACT_THRESHOLD rows, estimated past it. Counts that can't be
+# estimated from database statistics are cached for CACHE_TIMEOUT seconds.
+COUNTS = {
+    'EXACT_THRESHOLD': 10000,
+    'CACHE_TIMEOUT': 60,
+}
+
+
+# Bulk endpoints: largest accepted batch, and rows written per transaction.
+BULK_MAX_ITEMS = 10000
+BULK_CHUNK_SIZE = 500
+
+
+# Rows fetched per database round-trip by the streaming exports.
+EXPORT_CHUNK_SIZE = 2000
+# Exports requested with ?background=1 are written here by the job worker.
+EXPORT_DIR = BASE_DIR / 'exports'
+
+
+# CSV imports: uploads are kept here so interrupted imports can resume.
+IMPORT_DIR = BASE_DIR / 'imports'
+IMPORT_CHUNK_SIZE = 1000
+# Uploads up to this size are imported within the request.
+IMPORT_INLINE_MAX_BYTES = 1024 * 1024
+
+
+# Request metrics (tasks.metrics): Server-Timing headers, /metrics, and
+# warnings for requests over the query budget or repeating a SELECT this often.
+# Both expose query counts and timings, so they are off by default:
+# METRICS_SERVER_TIMING=1 adds the headers, and /metrics answers only the
+# client addresses in METRICS_ALLOWED_IPS (comma-separated).
+METRICS = {
+    'SERVER_TIMING': os.environ.get('METRICS_SERVER_TIMING') == '1',
+    'ALLOWED_IPS': [ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip],
+    'QUERY_BUDGET': 25,
+    'DUPLICATE_QUERIES': 5,
+}
+
+
+# Job queue (tasks.jobs, manage.py run_worker). Seconds unless noted.
+JOBS = {
+    # How long an idle worker sleeps between polls.
+    'POLL_INTERVAL': 1.0,
+    'MAX_ATTEMPTS': 3,
+    # First retry after this, doubling with each attempt.
+    'RETRY_DELAY': 10,
+    # A running job older than this is presumed dead and requeued.
+    'TIMEOUT': 3600,
+    'OVERDUE_SWEEP_INTERVAL': 60,
+    # Days finished jobs and their files are kept.
+    'KEEP_DAYS': 7,
+}
+
+
+# Change log (tasks.changes) behind /api/changes/ and the SSE stream. Seconds
+# unless noted.
+CHANGES = {
+    # Changes per /api/changes/ response.
+    'PAGE_SIZE': 500,
+    # How often each process checks the log for its open streams.
+    'POLL_INTERVAL': 1.0,
+    # Comment sent on an idle stream so proxies keep it open.
+    'KEEPALIVE': 15,
+    # Changes are served this long after they're written. On PostgreSQL,
+    # transactions can commit out of id order, and a client that moved past
+    # a later id would never see the earlier one. SQLite commits one at a time.
+    'SETTLE': 0 if DB_ENGINE == 'sqlite' else 1.0,
+    # Days kept; older cursors get a 410 and reload.
+    'KEEP_DAYS': 3,
+}
+
+
+# Archiving (tasks.archive, manage.py archive_closed): deals won or lost and
+# tasks completed more than AFTER_DAYS ago are moved to the archive tables,
+# BATCH_SIZE rows per transaction, by a job every INTERVAL seconds.
+ARCHIVE = {
+    'AFTER_DAYS': 180,
+    'BATCH_SIZE': 1000,
+    'INTERVAL': 24 * 3600,
+}
+
+
+# API token -> user lookups kept in process. Other workers see a deleted token
+# or deactivated user only once their entry expires, unless USE_DJANGO_CACHE
+# is set and the default cache is shared between them.
+TOKEN_AUTH_CACHE = {
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 60,
+    'USE_DJANGO_CACHE': False,
+}
+
+
+# Request budgets (tasks.throttling). Each user, or IP address when anonymous,
+# has a bucket of BURST units refilled at RATE units per second, and each
+# request spends its endpoint's cost from COSTS (1 if not listed): viewset
+# actions by name, other views by throttle_scope or function name. ENDPOINTS
+# also limits single endpoints per caller, in (requests per second, burst).
+# Buckets are kept in process, up to MAX_BUCKETS, unless CACHE names a cache
+# alias that workers share. The burst covers the frontend loading every page
+# of a list view's collections at once: about 260 pages of 500 rows at
+# 100,000 tasks.
+THROTTLE = {
+    'ENABLED': True,
+    'RATE': 20,
+    'BURST': 600,
+    'COSTS': {
+        'list': 2,
+        'export': 50,
+        'bulk': 20,
+        'timeline': 3,
+        'mine': 2,
+        'search': 5,
+        'changes': 2,
+        'dashboard_stats': 10,
+        'dashboard_pipeline': 5,
+    },
+    'ENDPOINTS': {
+        'export': (0.1, 5),
+        'login': (0.2, 10),
+    },
+    'MAX_BUCKETS': 10000,
+    'CACHE': None,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -136,10 +330,18 @@ CORS_ALLOWED_ORIGINS = [
 # REST Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'tasks.authentication.CachingTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'tasks.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+    'DEFAULT_FILTER_BACKENDS': [
+        'tasks.filters.WhitelistFilterBackend',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'tasks.throttling.TokenBucketThrottle',
+    ],
 }
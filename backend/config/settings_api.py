@@ -0,0 +1,56 @@
+"""
+Settings for API-only workers: ``DJANGO_SETTINGS_MODULE=config.settings_api``.
+
+Everything in ``config.settings``, minus what a token-authenticated JSON API
+never uses: the admin, sessions, messages and static files, their
+middleware, session authentication and translations. Workers import less
+and hold less per process; ``python -m benchmarks.startup`` compares the
+two. Run the admin, ``manage.py`` and the tests with ``config.settings``.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import REST_FRAMEWORK, TEMPLATES
+
+# DEBUG also keeps every query of a request in memory.
+DEBUG = os.environ.get('DJANGO_DEBUG') == '1'
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'rest_framework',
+    'rest_framework.authtoken',
+    'corsheaders',
+    'tasks',
+]
+
+MIDDLEWARE = [
+    'tasks.metrics.RequestMetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'config.urls_api'
+
+# For the browsable API, which only needs the request and user.
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'OPTIONS': {
+        'context_processors': [
+            'django.template.context_processors.request',
+            'django.contrib.auth.context_processors.auth',
+        ],
+    },
+}]
+
+# No CSRF to check without session authentication.
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'tasks.authentication.CachingTokenAuthentication',
+    ],
+}
+
+# Error messages in English only; skips loading the translation catalogs.
+USE_I18N = False
@@ -0,0 +1,9 @@
+"""URL configuration for ``config.settings_api``: ``config.urls`` without the admin."""
+from django.urls import path, include
+
+from tasks.metrics import metrics_view
+
+urlpatterns = [
+    path('api/', include('tasks.urls')),
+    path('metrics', metrics_view, name='metrics'),
+]
@@ -1,30 +1,131 @@
 from django.contrib import admin
-from .models import Company, Contact, Deal, Task
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from . import counts, pipeline
+from .models import ArchivedDeal, ArchivedTask, Company, Contact, Deal, Job, PipelineRollup, Task
+
+
+class EstimatedCountPaginator(Paginator):
+    """Pages through an estimated total past ``COUNTS['EXACT_THRESHOLD']`` rows; see ``tasks.counts``."""
+
+    @cached_property
+    def count(self):
+        return counts.count(self.object_list)[0]
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    # No COUNT(*) over the whole table for "N total", nor per filter choice.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
 
 
 @admin.register(Company)
-class CompanyAdmin(admin.ModelAdmin):
+class CompanyAdmin(LargeTableAdmin):
     list_display = ['name', 'industry', 'email', 'phone', 'created_at']
     list_filter = ['industry', 'created_at']
     search_fields = ['name', 'email', 'industry']
 
+    # Deals go with the company through the cascade; see DealAdmin.
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        pipeline.record_many(old=obj.deals.values(*pipeline.DEAL_FIELDS))
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        pipeline.record_many(old=Deal.objects.filter(company__in=queryset).values(*pipeline.DEAL_FIELDS))
+        super().delete_queryset(request, queryset)
+
 
 @admin.register(Contact)
-class ContactAdmin(admin.ModelAdmin):
+class ContactAdmin(LargeTableAdmin):
     list_display = ['full_name', 'email', 'phone', 'company', 'position', 'created_at']
     list_filter = ['company', 'created_at']
+    list_select_related = ['company']
     search_fields = ['first_name', 'last_name', 'email']
 
 
 @admin.register(Deal)
-class DealAdmin(admin.ModelAdmin):
+class DealAdmin(LargeTableAdmin):
     list_display = ['title', 'company', 'amount', 'stage', 'probability', 'expected_close_date', 'created_at']
     list_filter = ['stage', 'created_at']
+    list_select_related = ['company']
     search_fields = ['title', 'company__name']
 
+    # Writes keep the pipeline rollup in step, as the deal endpoints do.
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        old = pipeline.current_state(obj.pk) if change else None
+        super().save_model(request, obj, form, change)
+        pipeline.record(old=old, new=obj)
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        pipeline.record(old=pipeline.current_state(obj.pk))
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        pipeline.record_many(old=queryset.select_for_update().values(*pipeline.DEAL_FIELDS))
+        super().delete_queryset(request, queryset)
+
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
-    list_display = ['title', 'status', 'priority', 'due_date', 'assigned_to', 'created_at']
-    list_filter = ['status', 'priority', 'created_at']
+class TaskAdmin(LargeTableAdmin):
+    list_display = ['title', 'status', 'priority', 'due_date', 'is_overdue', 'assigned_to', 'created_at']
+    list_filter = ['status', 'priority', 'is_overdue', 'created_at']
+    list_select_related = ['assigned_to']
     search_fields = ['title', 'description']
+
+
+@admin.register(PipelineRollup)
+class PipelineRollupAdmin(admin.ModelAdmin):
+    list_display = ['stage', 'month', 'deal_count', 'total_amount', 'weighted_amount']
+    list_filter = ['stage']
+
+    # Maintained by the deal endpoints; fix drift with ``rebuild_pipeline``.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ArchiveAdmin(LargeTableAdmin):
+    # Written only by ``archive_closed``; the snapshot is what the API serves.
+    # Deleting rows would leave ArchiveTotal and the pipeline rollup counting them.
+    date_hierarchy = 'archived_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedDeal)
+class ArchivedDealAdmin(ArchiveAdmin):
+    list_display = ['id', 'stage', 'amount', 'company', 'expected_close_date', 'archived_at']
+    list_filter = ['stage']
+
+
+@admin.register(ArchivedTask)
+class ArchivedTaskAdmin(ArchiveAdmin):
+    list_display = ['id', 'status', 'priority', 'due_date', 'assigned_to', 'archived_at']
+    list_filter = ['priority']
+
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ['name', 'status', 'attempts', 'run_at', 'duration', 'worker', 'created_at']
+    list_filter = ['status', 'name']
+    readonly_fields = ['started_at', 'finished_at', 'duration', 'worker', 'last_error', 'result', 'output']
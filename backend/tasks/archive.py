@@ -0,0 +1,207 @@
+"""
+Moves closed deals and completed tasks out of the tables the API scans.
+
+``archive()`` is run by the ``archive_closed`` job and management command. It
+moves deals won or lost, and tasks completed, more than ``ARCHIVE['AFTER_DAYS']``
+ago into ``ArchivedDeal`` and ``ArchivedTask``. Each batch of
+``ARCHIVE['BATCH_SIZE']`` rows is moved in one transaction:
+
+- the rows are copied along with a snapshot of how the API renders them;
+- ``ArchiveTotal`` adds their counts and amounts, so dashboard totals
+  stay the same;
+- the originals are deleted, which the change log records as deletes.
+
+A deal is archived only once none of its tasks are left in ``Task``,
+because deleting it would cascade to them. The pipeline rollup keeps
+counting archived deals.
+
+Reads take ``?include_archived=1`` (``ArchiveMixin``). Archived rows are
+read-only, and search and exports don't include them.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef
+from django.http import Http404
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from . import changes, counts, versions
+from .models import ArchivedDeal, ArchivedTask, ArchiveTotal, Deal, Task
+from .rows import RowPlan
+from .serializers import DealSerializer, TaskSerializer
+
+# Tasks go first: archiving them frees their deals.
+ARCHIVES = {
+    Task: (ArchivedTask, TaskSerializer, 'status'),
+    Deal: (ArchivedDeal, DealSerializer, 'stage'),
+}
+
+
+def closed(model, cutoff):
+    # Deals with tasks left are skipped: deleting them would cascade.
+    if model is Task:
+        return Task.objects.filter(status='completed', updated_at__lt=cutoff)
+    return (Deal.objects.filter(stage__in=Deal.CLOSED_STAGES, updated_at__lt=cutoff)
+            .exclude(Exists(Task.objects.filter(deal=OuterRef('pk')))))
+
+
+def archive(days=None, batch_size=None, progress=None):
+    """Archive rows closed before ``days`` ago; ``{model name: rows moved}``."""
+    days = settings.ARCHIVE['AFTER_DAYS'] if days is None else days
+    batch_size = batch_size or settings.ARCHIVE['BATCH_SIZE']
+    cutoff = timezone.now() - timedelta(days=days)
+    moved = {}
+    for model in ARCHIVES:
+        name = model._meta.model_name
+        moved[name] = 0
+        while True:
+            n = archive_batch(model, cutoff, batch_size)
+            moved[name] += n
+            if progress is not None and n:
+                progress(name, moved[name])
+            if n < batch_size:
+                break
+    return moved
+
+
+@transaction.atomic
+def archive_batch(model, cutoff, batch_size):
+    archive_model, serializer_class, key = ARCHIVES[model]
+    columns = [field.name for field in archive_model._meta.concrete_fields
+               if field.name not in ('archived_at', 'snapshot')]
+    plan = RowPlan.compile(serializer_class)
+    # Rows another transaction is writing wait for the next run.
+    ids = list(closed(model, cutoff).select_for_update(skip_locked=True)
+               .values_list('pk', flat=True)[:batch_size])
+    if not ids:
+        return 0
+    queryset = model.objects.filter(pk__in=ids)
+    now = timezone.now()
+    rows = [
+        archive_model(**{column: row[column] for column in columns}, archived_at=now,
+                      snapshot=plan.to_representation(row))
+        for row in plan.values(queryset, *columns)
+    ]
+    archive_model.objects.bulk_create(rows)
+    add_totals(model._meta.model_name, key, rows)
+    # Nothing else points at these rows (see ``closed``), so one DELETE does;
+    # the collector would send signals and log a change per row.
+    queryset._raw_delete(queryset.db)
+    changes.record(model, ids, 'deleted')
+    versions.bump_on_commit(model, archive_model, ArchiveTotal)
+    return len(rows)
+
+
+def add_totals(name, key, rows):
+    totals = defaultdict(lambda: [0, Decimal(0)])
+    for row in rows:
+        total = totals[getattr(row, key)]
+        total[0] += 1
+        total[1] += getattr(row, 'amount', 0)
+    for value, (count, amount) in sorted(totals.items()):
+        added = {'count': F('count') + count, 'amount': F('amount') + amount}
+        if ArchiveTotal.objects.filter(model=name, key=value).update(**added):
+            continue
+        try:
+            with transaction.atomic():
+                ArchiveTotal.objects.create(model=name, key=value, count=count, amount=amount)
+        except IntegrityError:
+            # Another archiver created the row first; add onto theirs.
+            ArchiveTotal.objects.filter(model=name, key=value).update(**added)
+
+
+def totals():
+    """``{(model name, stage or status): (count, amount)}`` of archived rows."""
+    return {(model, key): (count, amount)
+            for model, key, count, amount in ArchiveTotal.objects.values_list('model', 'key', 'count', 'amount')}
+
+
+async def atotals():
+    return {(model, key): (count, amount)
+            async for model, key, count, amount in ArchiveTotal.objects.values_list('model', 'key', 'count', 'amount')}
+
+
+def is_archived(row):
+    return isinstance(row, dict) and 'snapshot' in row
+
+
+class ArchiveMixin:
+    """
+    ``?include_archived=1`` on list and retrieve adds the view's archived rows
+    (``archive_model``), rendered from their snapshots. Lists merge the two
+    tables page by page on the paginator's ordering.
+    """
+    archive_model = None
+    include_archived_query_param = 'include_archived'
+
+    @cached_property
+    def include_archived(self):
+        value = self.request.query_params.get(self.include_archived_query_param, '')
+        return self.action in ('list', 'retrieve') and value.lower() in ('1', 'true')
+
+    def get_cache_dependencies(self):
+        dependencies = super().get_cache_dependencies()
+        return (*dependencies, self.archive_model) if self.include_archived else dependencies
+
+    def list(self, request, *args, **kwargs):
+        if not self.include_archived:
+            return super().list(request, *args, **kwargs)
+        return self.conditional(self.list_with_archive, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        if not self.include_archived:
+            return await super().alist(request, *args, **kwargs)
+        return await self.aconditional(sync_to_async(self.list_with_archive), request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.include_archived:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional(self.retrieve_with_archive, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        if not self.include_archived:
+            return await super().aretrieve(request, *args, **kwargs)
+        return await self.aconditional(sync_to_async(self.retrieve_with_archive), request, *args, **kwargs)
+
+    def snapshot_data(self, snapshot):
+        if self.field_names is None:
+            return snapshot
+        return {name: value for name, value in snapshot.items() if name in self.field_names}
+
+    def list_with_archive(self, request, *args, **kwargs):
+        if self.expansions:
+            raise ValidationError({self.expand_query_param: ['Not available with include_archived.']})
+        paginator = self.paginator
+        queryset = self.filter_queryset(self.get_queryset())
+        archived = self.filter_queryset(self.archive_model.objects.all())
+        paginator.count = None
+        if paginator.wants_count(request):
+            (live, live_exact), (old, old_exact) = counts.count(queryset), counts.count(archived)
+            paginator.count = (live + old, live_exact and old_exact)
+
+        paginator.start_page(request, self)
+        page = paginator.set_page(paginator.merge_pages(
+            list(paginator.page_queryset(queryset)),
+            list(paginator.page_queryset(archived.values('id', paginator.field, 'snapshot'))),
+        ))
+        rendered = iter(self.get_serializer([row for row in page if not is_archived(row)], many=True).data)
+        return paginator.get_paginated_response([
+            self.snapshot_data(row['snapshot']) if is_archived(row) else next(rendered) for row in page
+        ])
+
+    def retrieve_with_archive(self, request, *args, **kwargs):
+        try:
+            instance = self.get_object()
+        except Http404:
+            lookup = {self.lookup_field: self.kwargs[self.lookup_url_kwarg or self.lookup_field]}
+            archived = get_object_or_404(self.archive_model.objects.only('snapshot'), **lookup)
+            return Response(self.snapshot_data(archived.snapshot))
+        return Response(self.get_serializer(instance).data)
@@ -0,0 +1,135 @@
+"""
+Async read path for ASGI deployments.
+
+DRF views are synchronous, so under an ASGI server every request holds a
+threadpool slot while it waits on the database. ``AsyncReadMixin`` gives a
+view async handlers (``alist``, ``aretrieve``, ``aget``) that run on the event
+loop using the async ORM. They reuse the view's own queryset planning,
+filtering, pagination, permissions and serializers. Any other method falls
+through to the regular sync view in a thread.
+
+Cache lookups (tokens, table versions, snapshots) are plain calls. They are
+in-process by default. With a network cache backend, each one blocks the
+loop for a round-trip.
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.template.response import SimpleTemplateResponse
+from django.urls import URLPattern
+from rest_framework.authentication import get_authorization_header
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.routers import DefaultRouter
+
+from .authentication import CachingTokenAuthentication, token_cache
+
+
+async def aauthenticate(request):
+    """
+    Resolve ``request.user`` on the loop when the token is cached, and in a
+    thread otherwise (cache misses, session auth).
+    """
+    auth = get_authorization_header(request).split()
+    authenticator = next((a for a in request.authenticators if isinstance(a, CachingTokenAuthentication)), None)
+    if authenticator is not None and len(auth) == 2 and auth[0].lower() == b'token':
+        try:
+            cached = token_cache.get(auth[1].decode())
+        except UnicodeError:
+            cached = None
+        if cached is not None:
+            request._authenticator = authenticator
+            request.user, request.auth = cached
+            return
+    await sync_to_async(request._authenticate)()
+
+
+async def plain_response(response):
+    # Rendered here, otherwise Django's async handler hops to a thread to
+    # call ``render()``.
+    if not isinstance(response, SimpleTemplateResponse):
+        return response
+    if isinstance(getattr(response, 'accepted_renderer', None), JSONRenderer):
+        response.render()
+    else:
+        # The browsable API queries related-field choices for its forms.
+        await sync_to_async(response.render)()
+    plain = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        plain[header] = value
+    return plain
+
+
+class AsyncReadMixin:
+    @classmethod
+    def as_async_view(cls, actions=None, **initkwargs):
+        if actions is None:
+            sync_view = cls.as_view(**initkwargs)
+        else:
+            sync_view = cls.as_view(actions, **initkwargs)
+
+        async def view(request, *args, **kwargs):
+            self = cls(**initkwargs)
+            if actions is not None:
+                self.action_map = actions
+                for method, action in actions.items():
+                    setattr(self, method, getattr(self, action))
+            name = actions.get(request.method.lower()) if actions is not None else request.method.lower()
+            handler = getattr(self, f'a{name}', None) if name else None
+            if handler is None:
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            return await self.adispatch(handler, request, *args, **kwargs)
+
+        view.cls = cls
+        view.initkwargs = initkwargs
+        view.actions = actions
+        view.csrf_exempt = True
+        return view
+
+    async def adispatch(self, handler, request, *args, **kwargs):
+        """``APIView.dispatch`` with an async handler."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await aauthenticate(request)
+            self.initial(request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        return await plain_response(self.finalize_response(request, response, *args, **kwargs))
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        return self.paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+
+class AsyncReadRouter(DefaultRouter):
+    """``DefaultRouter`` serving ``AsyncReadMixin`` viewsets through ``as_async_view``."""
+
+    def get_urls(self):
+        urls = []
+        for url in super().get_urls():
+            callback = getattr(url, 'callback', None)
+            cls = getattr(callback, 'cls', None)
+            if cls is not None and issubclass(cls, AsyncReadMixin):
+                url = URLPattern(url.pattern, cls.as_async_view(callback.actions, **callback.initkwargs),
+                                 url.default_args, url.name)
+            urls.append(url)
+        return urls
@@ -0,0 +1,122 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """
+    Bounded, thread-safe LRU of token key -> ``(user, token)`` with a TTL.
+
+    With ``USE_DJANGO_CACHE`` entries are also written to the default Django
+    cache so that workers sharing it (Redis, Memcached) warm each other up.
+    Local entries in other processes are only dropped by their TTL, which
+    bounds how long a deleted token or deactivated user keeps working there.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    @property
+    def options(self):
+        return settings.TOKEN_AUTH_CACHE
+
+    def _shared_key(self, key):
+        return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[2] > now:
+                    self._entries.move_to_end(key)
+                    return entry[0], entry[1]
+                self._forget(key)
+        if self.options['USE_DJANGO_CACHE']:
+            entry = cache.get(self._shared_key(key))
+            if entry is not None:
+                self._remember(key, *entry)
+                return entry
+        return None
+
+    def set(self, key, user, token):
+        self._remember(key, user, token)
+        if self.options['USE_DJANGO_CACHE']:
+            cache.set(self._shared_key(key), (user, token), timeout=self.options['TIMEOUT'])
+
+    def key_for_user(self, user_id):
+        with self._lock:
+            keys = self._keys_by_user.get(user_id)
+            return next(iter(keys)) if keys else None
+
+    def invalidate(self, key):
+        with self._lock:
+            self._forget(key)
+        if self.options['USE_DJANGO_CACHE']:
+            cache.delete(self._shared_key(key))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            keys = set(self._keys_by_user.get(user_id, ()))
+            for key in keys:
+                self._forget(key)
+        if self.options['USE_DJANGO_CACHE']:
+            keys.update(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+            cache.delete_many([self._shared_key(key) for key in keys])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _remember(self, key, user, token):
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = (user, token, time.monotonic() + self.options['TIMEOUT'])
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.options['MAX_ENTRIES']:
+                self._forget(next(iter(self._entries)))
+
+    def _forget(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[0].pk)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[entry[0].pk]
+
+
+token_cache = TokenCache()
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` that skips the Token/User query for recently seen tokens."""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
+
+
+def get_token(user):
+    """
+    The user's token, created on first login. Read from the database: another
+    worker may have deleted a token that is still in this one's cache.
+    """
+    token, _ = Token.objects.get_or_create(user=user)
+    if token_cache.key_for_user(user.pk) not in (None, token.key):
+        token_cache.invalidate_user(user.pk)
+    token_cache.set(token.key, user, token)
+    return token
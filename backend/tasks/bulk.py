@@ -0,0 +1,298 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.validators import UniqueValidator
+
+from . import changes, versions
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_pk(value):
+    """An id given as an int or a string of digits; None for anything else (floats included)."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        return int(value)
+    return None
+
+
+class PrefetchedQuerySet:
+    """
+    Stands in for a ``PrimaryKeyRelatedField`` queryset during bulk
+    validation, answering ``get(pk=...)`` from a single ``in_bulk`` lookup.
+    """
+
+    def __init__(self, queryset, pks):
+        self.model = queryset.model
+        pk_field = self.model._meta.pk
+        self.to_python = pk_field.to_python
+        keys = set()
+        for pk in pks:
+            try:
+                keys.add(self.to_python(pk))
+            except (DjangoValidationError, TypeError):
+                continue
+        self.objects = queryset.in_bulk(keys) if keys else {}
+
+    def get(self, pk):
+        try:
+            pk = self.to_python(pk)
+        except DjangoValidationError:
+            raise ValueError(pk)
+        try:
+            return self.objects[pk]
+        except KeyError:
+            raise self.model.DoesNotExist
+
+
+class BulkMixin:
+    """
+    ``POST/PATCH/DELETE .../bulk/`` taking JSON arrays.
+
+    Items are validated one by one through the viewset's serializer, but
+    related-object lookups and unique checks are answered from one ``IN``
+    query per field for the whole batch. Valid items are written with
+    ``bulk_create``/``bulk_update``/``delete`` in chunked transactions and
+    the response lists per-item errors by index.
+
+    Model signals don't fire for bulk creates and updates, so the table's
+    version is bumped here, and viewsets that maintain derived data override
+    ``bulk_created``, ``bulk_updated`` and ``bulk_deleting``; they run inside
+    each chunk's transaction.
+    """
+
+    def bulk_created(self, objs):
+        pass
+
+    def bulk_updated(self, old_states, objs):
+        pass
+
+    def bulk_deleting(self, queryset):
+        pass
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise serializers.ValidationError({'non_field_errors': ['Expected a list of items.']})
+        if len(items) > settings.BULK_MAX_ITEMS:
+            raise serializers.ValidationError({'non_field_errors': [
+                f'At most {settings.BULK_MAX_ITEMS} items per request.'
+            ]})
+
+        if request.method == 'POST':
+            done, errors = self.bulk_create_items(items)
+            result = {'created': done}
+        elif request.method == 'PATCH':
+            done, errors = self.bulk_update_items(items)
+            result = {'updated': done}
+        else:
+            done, errors = self.bulk_delete_items(items)
+            result = {'deleted': done}
+
+        result['errors'] = [{'index': index, 'errors': error} for index, error in sorted(errors.items())]
+        if errors and not done:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif request.method == 'POST':
+            response_status = status.HTTP_201_CREATED
+        else:
+            response_status = status.HTTP_200_OK
+        return Response(result, status=response_status)
+
+    # Validation
+
+    def get_bulk_serializer(self, items, partial=False):
+        serializer = self.get_serializer(partial=partial)
+        for name, field in serializer.fields.items():
+            if isinstance(field, serializers.PrimaryKeyRelatedField) and not field.read_only:
+                pks = [item.get(name) for item in items if isinstance(item, dict) and item.get(name) is not None]
+                field.queryset = PrefetchedQuerySet(field.queryset, pks)
+            field.validators = [v for v in field.validators if not isinstance(v, UniqueValidator)]
+        return serializer
+
+    def validate_items(self, serializer, items):
+        valid = {}
+        errors = {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors[index] = {'non_field_errors': ['Expected an object.']}
+                continue
+            try:
+                valid[index] = serializer.run_validation(item)
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+        return valid, errors
+
+    def check_unique(self, valid, errors, current_pks=None):
+        """Unique checks for the batch: one ``IN`` query per unique field."""
+        model = self.queryset.model
+        for field in model._meta.concrete_fields:
+            if not field.unique or field.primary_key:
+                continue
+            values = {}
+            for index, data in valid.items():
+                if field.name in data:
+                    values.setdefault(data[field.name], []).append(index)
+            if not values:
+                continue
+            taken = dict(model._default_manager.filter(**{f'{field.name}__in': list(values)})
+                         .values_list(field.name, 'pk'))
+            for value, indexes in values.items():
+                for position, index in enumerate(indexes):
+                    own_pk = current_pks.get(index) if current_pks else None
+                    duplicate = position > 0 or taken.get(value, own_pk) != own_pk
+                    if duplicate:
+                        errors[index] = {field.name: [
+                            f'{model._meta.verbose_name} with this {field.verbose_name} already exists.'
+                        ]}
+                        del valid[index]
+
+    # Writes
+
+    def bulk_create_items(self, items):
+        serializer = self.get_bulk_serializer(items)
+        valid, errors = self.validate_items(serializer, items)
+        self.check_unique(valid, errors)
+
+        model = self.queryset.model
+        created = []
+        for chunk in chunked(list(valid.items()), settings.BULK_CHUNK_SIZE):
+            objs = [model(**data, created_by=self.request.user) for _, data in chunk]
+            for obj in objs:
+                if hasattr(obj, 'sync_derived_fields'):
+                    obj.sync_derived_fields()
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create(objs)
+                    changes.record(model, [obj.pk for obj in objs])
+                    self.bulk_created(objs)
+            except IntegrityError as exc:
+                for index, _ in chunk:
+                    errors[index] = {'non_field_errors': [str(exc)]}
+                continue
+            created.extend(obj.pk for obj in objs)
+        if created:
+            versions.bump_on_commit(model)
+        return created, errors
+
+    def bulk_update_items(self, items):
+        model = self.queryset.model
+        errors = {}
+        pks = {}
+        for index, item in enumerate(items):
+            pk = item.get('id') if isinstance(item, dict) else None
+            if pk is None:
+                errors[index] = {'id': ['This field is required.']}
+            elif parse_pk(pk) is None:
+                errors[index] = {'id': [f'Invalid pk "{pk}".']}
+            else:
+                pks[index] = parse_pk(pk)
+        instances = PrefetchedQuerySet(model._default_manager.all(), pks.values())
+        seen = set()
+        for index, pk in list(pks.items()):
+            try:
+                pks[index] = instances.get(pk).pk
+            except (ValueError, model.DoesNotExist):
+                errors[index] = {'id': [f'Invalid pk "{pk}" - object does not exist.']}
+                del pks[index]
+                continue
+            # A second change to the same row would be written from stale old values.
+            if pks[index] in seen:
+                errors[index] = {'id': [f'Duplicate id "{pk}" in this request.']}
+                del pks[index]
+            else:
+                seen.add(pks[index])
+
+        serializer = self.get_bulk_serializer(items, partial=True)
+        valid, validation_errors = self.validate_items(serializer, [items[index] for index in pks])
+        # Map positions in the filtered list back to request indexes.
+        positions = list(pks)
+        valid = {positions[position]: data for position, data in valid.items()}
+        errors.update({positions[position]: error for position, error in validation_errors.items()})
+        self.check_unique(valid, errors, current_pks=pks)
+
+        updated = []
+        for chunk in chunked(list(valid.items()), settings.BULK_CHUNK_SIZE):
+            try:
+                with transaction.atomic():
+                    objs = self.bulk_update_chunk(chunk, pks, errors)
+            except IntegrityError as exc:
+                for index, _ in chunk:
+                    errors[index] = {'non_field_errors': [str(exc)]}
+                continue
+            updated.extend(obj.pk for obj in objs)
+        if updated:
+            versions.bump_on_commit(model)
+        return updated, errors
+
+    def bulk_update_chunk(self, chunk, pks, errors):
+        """
+        Write one chunk. Rows are re-read under a lock, as
+        ``pipeline.current_state`` does, so ``bulk_updated`` gets the values
+        stored now rather than those seen during validation.
+        """
+        model = self.queryset.model
+        current = model._default_manager.select_for_update().in_bulk([pks[index] for index, _ in chunk])
+        now = timezone.now()
+        old_states = []
+        objs = []
+        fields = {'updated_at'}
+        for index, data in chunk:
+            obj = current.get(pks[index])
+            if obj is None:
+                errors[index] = {'id': [f'Invalid pk "{pks[index]}" - object does not exist.']}
+                continue
+            old_states.append({f.attname: getattr(obj, f.attname) for f in model._meta.concrete_fields})
+            for name, value in data.items():
+                setattr(obj, name, value)
+            obj.updated_at = now
+            fields.update(data)
+            if hasattr(obj, 'sync_derived_fields'):
+                obj.sync_derived_fields(now)
+                fields.update(model.derived_fields)
+            objs.append(obj)
+        if objs:
+            model.objects.bulk_update(objs, sorted(fields))
+            changes.record(model, [obj.pk for obj in objs])
+            self.bulk_updated(old_states, objs)
+        return objs
+
+    def bulk_delete_items(self, items):
+        """Items are ids, or ``{"id": ...}`` objects as for PATCH."""
+        model = self.queryset.model
+        errors = {}
+        pks = {}
+        seen = set()
+        for index, item in enumerate(items):
+            value = item.get('id') if isinstance(item, dict) else item
+            pk = parse_pk(value)
+            if pk is None:
+                errors[index] = {'id': [f'Invalid pk "{value}".']}
+            elif pk in seen:
+                errors[index] = {'id': [f'Duplicate id "{value}" in this request.']}
+            else:
+                pks[index] = pk
+                seen.add(pk)
+        deleted = 0
+        for chunk in chunked(list(pks.items()), settings.BULK_CHUNK_SIZE):
+            with transaction.atomic():
+                found = set(model._default_manager.select_for_update()
+                            .filter(pk__in=[pk for _, pk in chunk]).values_list('pk', flat=True))
+                for index, pk in chunk:
+                    if pk not in found:
+                        errors[index] = {'id': [f'Invalid pk "{pk}" - object does not exist.']}
+                if not found:
+                    continue
+                queryset = model._default_manager.filter(pk__in=found)
+                self.bulk_deleting(queryset)
+                _, per_model = queryset.delete()
+            deleted += per_model.get(model._meta.label, 0)
+        return deleted, errors
@@ -0,0 +1,197 @@
+"""
+Append-only log of writes to companies, contacts, deals and tasks.
+
+Every save or delete adds a ``Change`` row in the writing transaction:
+
+- single-object writes through the model signals in ``tasks.signals``;
+- the bulk endpoints, imports and the overdue sweep through ``record``,
+  since they bypass signals.
+
+Clients sync from a cursor, the id of the last change they have seen.
+``GET /api/changes/?since=<cursor>`` returns the records changed after it.
+Under ASGI, ``/api/changes/stream/`` is a Server-Sent Events stream that
+announces new cursors. A single ``Broadcaster`` per process polls the log
+on behalf of all of its open streams.
+
+Rows written by ``seed_crm`` are not logged; clients pick them up on reload.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import SET_NULL, Max, Min
+from django.utils import timezone
+
+from .models import Change, Company, Contact, Deal, Task
+
+logger = logging.getLogger(__name__)
+
+TRACKED = (Company, Contact, Deal, Task)
+MODELS = {model._meta.model_name: model for model in TRACKED}
+
+
+def record(model, ids, action='saved'):
+    Change.objects.bulk_create([
+        Change(model=model._meta.model_name, object_id=pk, action=action) for pk in ids
+    ])
+
+
+def set_null_dependents(instance):
+    """Tracked rows whose foreign key to ``instance`` is nulled when it's deleted."""
+    for relation in instance._meta.related_objects:
+        if relation.related_model in TRACKED and relation.on_delete is SET_NULL:
+            ids = relation.related_model._default_manager.filter(**{relation.field.name: instance})
+            yield relation.related_model, ids.values_list('pk', flat=True)
+
+
+def settled():
+    """The part of the log that may be served (see ``CHANGES['SETTLE']``)."""
+    changes = Change.objects.order_by('id')
+    if settings.CHANGES['SETTLE']:
+        changes = changes.filter(created_at__lte=timezone.now() - timedelta(seconds=settings.CHANGES['SETTLE']))
+    return changes
+
+
+def latest_cursor():
+    return settled().order_by('-id').values_list('id', flat=True).first() or 0
+
+
+async def alatest_cursor():
+    return await settled().order_by('-id').values_list('id', flat=True).afirst() or 0
+
+
+def expired(cursor):
+    """
+    Whether the log can no longer bring ``cursor`` up to date: changes after
+    it were pruned (``prune_changes`` always keeps the newest row), or it
+    comes from another database.
+    """
+    bounds = Change.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return cursor != 0
+    return cursor < bounds['first'] - 1 or cursor > bounds['last']
+
+
+def since(cursor, models=None, limit=None):
+    """
+    ``(changes, cursor, more)``: the latest action per record changed after
+    ``cursor`` as ``(model, object_id, action)`` tuples, oldest first, the
+    cursor to resume from, and whether more changes are waiting.
+    """
+    limit = limit or settings.CHANGES['PAGE_SIZE']
+    rows = list(settled().filter(id__gt=cursor).values_list('id', 'model', 'object_id', 'action')[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    latest = {}
+    for change_id, model, object_id, action in rows:
+        if models is None or model in models:
+            latest.pop((model, object_id), None)
+            latest[model, object_id] = action
+    changes = [(model, object_id, action) for (model, object_id), action in latest.items()]
+    return changes, rows[-1][0] if rows else cursor, more
+
+
+class Broadcaster:
+    """
+    Checks the log every ``CHANGES['POLL_INTERVAL']`` seconds while any stream
+    in the process is open, and wakes the streams that are behind. A process
+    with a thousand open streams runs one query per interval, not a thousand.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.listeners = 0
+        self.cursor = None
+        self.changed = None
+        self.task = None
+        # (cursor before, cursor after, models changed) per poll that found changes.
+        self.ticks = deque(maxlen=256)
+
+    def subscribe(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            # Events and tasks belong to a loop; start over on a new one.
+            self.__init__()
+            self.loop = loop
+            self.changed = asyncio.Event()
+        self.listeners += 1
+        if self.task is None:
+            self.task = loop.create_task(self.poll())
+
+    def unsubscribe(self):
+        self.listeners -= 1
+
+    async def poll(self):
+        try:
+            while self.listeners:
+                try:
+                    await self.check()
+                except Exception:
+                    # Streams keep waiting; the next interval tries again.
+                    logger.exception('Polling the change log failed')
+                await asyncio.sleep(settings.CHANGES['POLL_INTERVAL'])
+        finally:
+            self.task = None
+
+    async def check(self):
+        if self.cursor is None:
+            self.cursor = await alatest_cursor()
+            return
+        rows = [row async for row in settled().filter(id__gt=self.cursor)
+                .values_list('id', 'model')[:settings.CHANGES['PAGE_SIZE']]]
+        if rows:
+            self.ticks.append((self.cursor, rows[-1][0], sorted({model for _, model in rows})))
+            self.cursor = rows[-1][0]
+            self.changed.set()
+            self.changed = asyncio.Event()
+
+    def models_since(self, cursor):
+        """Models changed after ``cursor``, or ``None`` if that's further back than the ticks kept."""
+        models = set()
+        for before, after, names in reversed(self.ticks):
+            if after <= cursor:
+                break
+            models.update(names)
+            if before <= cursor:
+                return sorted(models)
+        return None
+
+    async def wait(self, cursor, timeout):
+        """``(cursor, models)`` once the log moves past ``cursor``, or ``None`` after ``timeout``."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.cursor is None or self.cursor <= cursor:
+            try:
+                await asyncio.wait_for(self.changed.wait(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                return None
+        return self.cursor, self.models_since(cursor)
+
+
+broadcaster = Broadcaster()
+
+
+def event(name, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {name}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+
+async def event_stream(cursor):
+    """SSE text announcing each new cursor after ``cursor``, with the models that changed."""
+    yield 'retry: 3000\n\n'
+    broadcaster.subscribe()
+    try:
+        while True:
+            update = await broadcaster.wait(cursor, settings.CHANGES['KEEPALIVE'])
+            if update is None:
+                yield ': keepalive\n\n'
+                continue
+            cursor, models = update
+            yield event('changes', {'cursor': cursor, 'models': models}, event_id=cursor)
+    finally:
+        # Also runs when the client disconnects and the server cancels the stream.
+        broadcaster.unsubscribe()
@@ -0,0 +1,103 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from . import versions
+
+RESPONSE_KEY = 'response:{etag}'
+
+
+def set_validators(response, etag, modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified)
+    # Browsers may keep the body but must revalidate it, and never share it.
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization', 'Cookie'])
+    return response
+
+
+def not_modified(request, etag, modified=None):
+    """A 304 (or 412) if the request's preconditions say so, otherwise ``None``."""
+    response = set_validators(HttpResponse(), etag, modified or time.time())
+    response = get_conditional_response(request, etag=etag, last_modified=modified, response=response)
+    return response if response.status_code != 200 else None
+
+
+class ConditionalMixin:
+    """
+    Conditional GETs and a per-user response cache for list and retrieve.
+
+    The ETag hashes the user, the full URL and the versions of the tables in
+    ``cache_dependencies``, so it is known before any query runs: a matching
+    ``If-None-Match`` gets a 304 straight away, and otherwise the rendered
+    JSON is looked up under the same key. Writes to any dependency bump its
+    version, which retires both.
+    """
+    cache_dependencies = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aconditional(super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.aconditional(super().aretrieve, request, *args, **kwargs)
+
+    def get_cache_dependencies(self):
+        return self.cache_dependencies
+
+    def get_etag(self, request):
+        state = (request.user.pk, request.build_absolute_uri(), request.accepted_renderer.format,
+                 versions.get(*self.get_cache_dependencies()))
+        return '"%s"' % hashlib.sha1(repr(state).encode()).hexdigest()
+
+    def conditional(self, handler, request, *args, **kwargs):
+        # The browsable API embeds per-request forms and tokens.
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        response, etag = self.get_cached_response(request)
+        if response is not None:
+            return response
+        return self.cache_response(request, handler(request, *args, **kwargs), etag)
+
+    async def aconditional(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return await handler(request, *args, **kwargs)
+        response, etag = self.get_cached_response(request)
+        if response is not None:
+            return response
+        return self.cache_response(request, await handler(request, *args, **kwargs), etag)
+
+    def get_cached_response(self, request):
+        """A 304 or the cached response if there is one, and the ETag."""
+        etag = self.get_etag(request)
+        cached = cache.get(RESPONSE_KEY.format(etag=etag))
+        response = not_modified(request, etag, cached and cached['modified'])
+        if response is None and cached is not None:
+            response = HttpResponse(cached['content'], content_type=cached['content_type'])
+            set_validators(response, etag, cached['modified'])
+        return response, etag
+
+    def cache_response(self, request, response, etag):
+        if response.status_code != 200:
+            return response
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        response.render()
+        modified = int(time.time())
+        cache.set(RESPONSE_KEY.format(etag=etag), {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'modified': modified,
+        }, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+        return set_validators(response, etag, modified)
@@ -0,0 +1,86 @@
+"""
+Row counts that stay cheap on large tables.
+
+``count(queryset)`` counts exactly up to ``COUNTS['EXACT_THRESHOLD']`` rows,
+which costs at most a scan of that many index entries. Past it, the result
+is an estimate:
+
+- a whole table is estimated from the database's statistics
+  (``pg_class.reltuples``, or ``sqlite_stat1`` once ``ANALYZE`` has run);
+- a filtered query is estimated by the PostgreSQL planner.
+
+Where neither is available, an exact count is run and cached for
+``COUNTS['CACHE_TIMEOUT']`` seconds. A busy table then doesn't pay for a
+full count on every request.
+"""
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+KEY = 'count:{label}:{digest}'
+
+
+def count(queryset, threshold=None):
+    """``(count, exact)`` for ``queryset``."""
+    threshold = settings.COUNTS['EXACT_THRESHOLD'] if threshold is None else threshold
+    queryset = queryset.order_by().values('pk')
+    bounded = queryset[:threshold + 1].count()
+    if bounded <= threshold:
+        return bounded, True
+    return max(estimate(queryset), bounded), False
+
+
+async def acount(queryset, threshold=None):
+    return await sync_to_async(count)(queryset, threshold)
+
+
+def estimate(queryset):
+    rows = table_estimate(queryset) if not queryset.query.where else planner_estimate(queryset)
+    return rows if rows is not None else cached_count(queryset)
+
+
+def table_estimate(queryset):
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)', [table])
+            elif connection.vendor == 'sqlite':
+                # The first number of an index's stat is the table's row count.
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        # sqlite_stat1 doesn't exist until the first ANALYZE.
+        return None
+    if row is None:
+        return None
+    rows = int(float(str(row[0]).split()[0]))
+    # A never-analysed PostgreSQL table reports -1.
+    return rows if rows >= 0 else None
+
+
+def planner_estimate(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def cached_count(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.sha1(f'{sql}{params!r}'.encode()).hexdigest()
+    key = KEY.format(label=queryset.model._meta.label_lower, digest=digest)
+    return cache.get_or_set(key, queryset.count, settings.COUNTS['CACHE_TIMEOUT'])
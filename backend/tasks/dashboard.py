@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import archive, versions
+from .models import ArchiveTotal, Company, Contact, Deal, Task
+
+# Writes to any of these retire the cached snapshot.
+TABLES = (Company, Contact, Deal, Task, ArchiveTotal)
+
+SNAPSHOT_KEY = 'dashboard:stats:{versions}'
+
+
+def deal_totals():
+    stage_counts = {
+        f'stage_{stage}': Count('id', filter=Q(stage=stage))
+        for stage, _ in Deal.STAGE_CHOICES
+    }
+    return {
+        'total': Count('id'),
+        'total_value': Sum('amount'),
+        'won_value': Sum('amount', filter=Q(stage='won')),
+        **stage_counts,
+    }
+
+
+def task_totals():
+    return {
+        'total': Count('id'),
+        'pending': Count('id', filter=Q(status='pending')),
+        # Maintained by the overdue sweep job rather than compared to the clock here.
+        'overdue': Count('id', filter=Q(is_overdue=True)),
+    }
+
+
+def add_archived(deals, tasks, archived):
+    """Add the archive's totals onto the live ``deal_totals()`` and ``task_totals()``."""
+    deals, tasks = dict(deals), dict(tasks)
+    for (model, key), (count, amount) in archived.items():
+        if model == 'deal':
+            deals['total'] += count
+            deals[f'stage_{key}'] += count
+            deals['total_value'] = (deals['total_value'] or 0) + amount
+            if key == 'won':
+                deals['won_value'] = (deals['won_value'] or 0) + amount
+        elif model == 'task':
+            # Only completed tasks are archived, so pending and overdue stand.
+            tasks['total'] += count
+    return deals, tasks
+
+
+def build_stats(deals, tasks, contacts, companies, archived):
+    deals, tasks = add_archived(deals, tasks, archived)
+    return {
+        'total_contacts': contacts,
+        'total_companies': companies,
+        'total_deals': deals['total'],
+        'total_tasks': tasks['total'],
+        'deals_by_stage': [
+            {'stage': stage, 'count': deals[f'stage_{stage}']}
+            for stage, _ in Deal.STAGE_CHOICES
+            if deals[f'stage_{stage}']
+        ],
+        'total_deal_value': deals['total_value'] or 0,
+        'won_deals_value': deals['won_value'] or 0,
+        'pending_tasks': tasks['pending'],
+        'overdue_tasks': tasks['overdue'],
+    }
+
+
+def compute_stats():
+    """Dashboard figures with at most one aggregate query per table."""
+    return build_stats(
+        Deal.objects.order_by().aggregate(**deal_totals()),
+        Task.objects.order_by().aggregate(**task_totals()),
+        Contact.objects.count(),
+        Company.objects.count(),
+        archive.totals(),
+    )
+
+
+async def acompute_stats():
+    """``compute_stats`` with the five queries in flight together."""
+    return build_stats(*await asyncio.gather(
+        Deal.objects.order_by().aaggregate(**deal_totals()),
+        Task.objects.order_by().aaggregate(**task_totals()),
+        Contact.objects.acount(),
+        Company.objects.acount(),
+        archive.atotals(),
+    ))
+
+
+def snapshot_key():
+    return SNAPSHOT_KEY.format(versions='.'.join(map(str, versions.get(*TABLES))))
+
+
+def make_snapshot(stats):
+    etag = hashlib.sha1(json.dumps(stats, cls=JSONEncoder, sort_keys=True).encode()).hexdigest()
+    return {'stats': stats, 'etag': f'"{etag}"', 'modified': int(time.time())}
+
+
+def get_snapshot():
+    """
+    Cached ``{'stats', 'etag', 'modified'}`` for the dashboard.
+
+    Snapshots are keyed by the versions of the tables they're computed from,
+    so a snapshot computed concurrently with a write is stored under the old
+    versions and never served. The ETag is a hash of the figures themselves,
+    so a snapshot recomputed after a write that changed none of them still
+    revalidates.
+    """
+    key = snapshot_key()
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = make_snapshot(compute_stats())
+        cache.set(key, snapshot, timeout=settings.DASHBOARD_CACHE_TIMEOUT)
+    return snapshot
+
+
+async def aget_snapshot():
+    key = snapshot_key()
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = make_snapshot(await acompute_stats())
+        cache.set(key, snapshot, timeout=settings.DASHBOARD_CACHE_TIMEOUT)
+    return snapshot
+
+
+def get_stats():
+    return get_snapshot()['stats']
@@ -0,0 +1,195 @@
+import csv
+import datetime
+import json
+import uuid
+from decimal import Decimal
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Case, CharField, F, Value, When
+from django.db.models.functions import Concat
+from django.http import HttpRequest, QueryDict, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .serializers import JobSerializer
+
+
+class StreamRenderer(BaseRenderer):
+    """
+    Lets DRF's content negotiation (and ``?format=``) pick an export format.
+    The export action streams its own bytes, so ``render`` only ever sees
+    error payloads.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=JSONEncoder).encode()
+
+
+class CSVStreamRenderer(StreamRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONStreamRenderer(StreamRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class ExportEncoder(JSONEncoder):
+    # Decimals as strings, like the API's serializers, rather than floats.
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return str(obj)
+        return super().default(obj)
+
+
+def full_name(prefix):
+    """SQL for ``Contact.full_name`` across a nullable relation."""
+    return Case(
+        When(**{f'{prefix}__isnull': False}, then=Concat(
+            F(f'{prefix}__first_name'), Value(' '), F(f'{prefix}__last_name'),
+            output_field=CharField(),
+        )),
+        default=None,
+        output_field=CharField(),
+    )
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    encoder = ExportEncoder()
+
+    def cell(value):
+        if value is None:
+            return ''
+        if isinstance(value, (datetime.date, Decimal)):
+            return encoder.default(value)
+        return value
+
+    yield writer.writerow(columns).encode()
+    for row in rows:
+        yield writer.writerow([cell(row[column]) for column in columns]).encode()
+
+
+def stream_ndjson(columns, rows):
+    encoder = ExportEncoder(ensure_ascii=False, separators=(',', ':'))
+    for row in rows:
+        yield (encoder.encode({column: row[column] for column in columns}) + '\n').encode()
+
+
+STREAMS = {'csv': stream_csv, 'ndjson': stream_ndjson}
+
+
+def streaming_content(request, chunks, batch):
+    """
+    ``chunks`` as a ``StreamingHttpResponse`` body. Under ASGI, Django reads a
+    sync iterator to the end before sending it, so ASGI requests get an
+    async iterator that pulls ``batch`` chunks at a time in a thread.
+    """
+    if not isinstance(request, ASGIRequest):
+        return chunks
+    take = sync_to_async(lambda: b''.join(islice(chunks, batch)))
+
+    async def pull():
+        while chunk := await take():
+            yield chunk
+    return pull()
+
+
+def write_export(view, fmt, query):
+    """
+    Write the export of viewset ``view`` (a dotted path) filtered by the
+    query string ``query`` to ``EXPORT_DIR``; returns the path and a summary.
+    """
+    request = HttpRequest()
+    request.method = 'GET'
+    request.GET = QueryDict(query)
+    viewset = import_string(view)(request=Request(request), format_kwarg=None, action='export', args=(), kwargs={})
+
+    settings.EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    path = settings.EXPORT_DIR / f'{uuid.uuid4().hex}.{fmt}'
+    counted = {'rows': 0}
+
+    def rows():
+        for row in viewset.get_export_queryset().iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+            counted['rows'] += 1
+            yield row
+
+    with open(path, 'wb') as f:
+        for chunk in STREAMS[fmt](viewset.export_columns, rows()):
+            f.write(chunk)
+    return str(path), {'filename': viewset.export_filename(fmt), 'rows': counted['rows'], 'bytes': path.stat().st_size}
+
+
+class ExportMixin:
+    """
+    ``GET .../export/?format=csv|ndjson`` streaming the whole (filtered) table.
+
+    Rows come from ``values()`` through ``.iterator()`` with related names
+    joined in SQL, so memory stays flat however large the table is. Columns
+    are the viewset's ``export_fields``: a plain name is a column, anything
+    else maps the output column to an ORM lookup or expression.
+
+    With ``?background=1`` the file is written by the job worker instead:
+    the response is a 202 with the job, which links to the download once
+    it has finished.
+    """
+    export_fields = ()
+
+    def get_export_queryset(self):
+        queryset = self.filter_queryset(self.queryset.model._default_manager.all())
+        plain = []
+        expressions = {}
+        for field in self.export_fields:
+            if isinstance(field, str):
+                plain.append(field)
+            else:
+                name, expression = field
+                expressions[name] = F(expression) if isinstance(expression, str) else expression
+        return queryset.order_by('-created_at', 'id').values(*plain, **expressions)
+
+    @property
+    def export_columns(self):
+        return [field if isinstance(field, str) else field[0] for field in self.export_fields]
+
+    def export_filename(self, fmt):
+        return f'{self.queryset.model._meta.verbose_name_plural.lower()}.{fmt}'
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVStreamRenderer, NDJSONStreamRenderer])
+    def export(self, request):
+        fmt = request.accepted_renderer.format
+        if request.query_params.get('background') in ('1', 'true'):
+            return self.export_in_background(request, fmt)
+        rows = self.get_export_queryset().iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+        response = StreamingHttpResponse(
+            streaming_content(request._request, STREAMS[fmt](self.export_columns, rows), settings.EXPORT_CHUNK_SIZE),
+            content_type=request.accepted_renderer.media_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.export_filename(fmt)}"'
+        return response
+
+    def export_in_background(self, request, fmt):
+        from .jobs import enqueue  # tasks.jobs imports this module
+
+        # Filters are checked now rather than failing in the worker.
+        self.get_export_queryset()
+        view = f'{type(self).__module__}.{type(self).__qualname__}'
+        job = enqueue('export', {'view': view, 'format': fmt, 'query': request.GET.urlencode()},
+                      created_by=request.user)
+        data = JobSerializer(job, context={'request': request}).data
+        return Response(data, status=status.HTTP_202_ACCEPTED, content_type='application/json',
+                        headers={'Location': data['url']})
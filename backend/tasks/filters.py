@@ -0,0 +1,54 @@
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db import models
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class WhitelistFilterBackend(BaseFilterBackend):
+    """
+    Applies the query parameters named in the view's ``filter_fields`` as ORM
+    lookups, e.g. ``{'stage': 'stage', 'due_date_after': 'due_date__gte'}``.
+
+    Values are converted with the model field's ``to_python`` so bad input is
+    a 400, not a database error, and everything ends up in the SQL WHERE.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        filter_fields = getattr(view, 'filter_fields', {})
+        lookups = {}
+        errors = {}
+        for param, lookup in filter_fields.items():
+            value = request.query_params.get(param)
+            if value in (None, ''):
+                continue
+            try:
+                lookups[lookup] = self.to_python(queryset.model, lookup, value)
+            except DjangoValidationError as exc:
+                errors[param] = exc.messages
+        if errors:
+            raise ValidationError(errors)
+        return queryset.filter(**lookups) if lookups else queryset
+
+    def to_python(self, model, lookup, value):
+        field = None
+        for part in lookup.split('__'):
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                break
+            if field.is_relation:
+                model = field.related_model
+        if field is None:
+            return value
+        if field.is_relation:
+            field = field.target_field
+        if isinstance(field, models.BooleanField):
+            # The ORM only takes 'True'/'False' spelt like Python.
+            value = {'true': True, 'false': False}.get(value.lower(), value)
+        value = field.to_python(value)
+        if field.choices:
+            field.validate(value, None)
+        if isinstance(field, models.DateTimeField) and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
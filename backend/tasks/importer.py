@@ -0,0 +1,182 @@
+import csv
+import itertools
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import F
+
+from . import changes, versions
+from .models import Company, Contact, ImportJob
+
+logger = logging.getLogger(__name__)
+
+COMPANY_COLUMNS = ['name', 'industry', 'website', 'phone', 'email', 'address', 'notes']
+CONTACT_COLUMNS = ['first_name', 'last_name', 'email', 'phone', 'position', 'notes']
+
+# Errors kept on the job; the rest are only counted as skipped.
+MAX_RECORDED_ERRORS = 100
+
+
+def read_rows(path):
+    """Yield CSV rows as dicts with stripped values, one at a time."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            yield {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def field_error(model, values):
+    """
+    The first field constraint (length, URL or email format) ``values`` break.
+
+    Checked per row so one bad value is reported instead of failing the whole
+    chunk's ``bulk_create`` with a DataError on backends that enforce lengths.
+    """
+    for name, value in values.items():
+        try:
+            model._meta.get_field(name).clean(value, None)
+        except ValidationError as exc:
+            return f'{name}: {exc.messages[0]}'
+    return None
+
+
+class CompanyCache:
+    """Company name -> id, filled from the database one ``IN`` query per chunk."""
+
+    def __init__(self, user=None):
+        self.ids = {}
+        self.user = user
+
+    def resolve(self, names, create=False):
+        missing = {name for name in names if name and name not in self.ids}
+        if missing:
+            for pk, name in Company.objects.filter(name__in=missing).order_by('pk').values_list('pk', 'name'):
+                self.ids.setdefault(name, pk)
+        if create:
+            new = [Company(name=name, created_by=self.user) for name in sorted(missing - self.ids.keys())]
+            Company.objects.bulk_create(new)
+            changes.record(Company, [company.pk for company in new])
+            self.ids.update((company.name, company.pk) for company in new)
+        return self.ids
+
+
+class Importer:
+    """
+    Streams a CSV file into Company or Contact rows.
+
+    Rows are read lazily and written with ``bulk_create`` in chunks; each
+    chunk commits together with the job's ``rows_processed`` counter, so a
+    crashed import resumes from the last committed chunk without duplicates.
+    """
+
+    def __init__(self, job, chunk_size=None, progress=None):
+        self.job = job
+        self.chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+        self.progress = progress
+        self.model = Company if job.kind == 'companies' else Contact
+        self.companies = CompanyCache(user=job.created_by)
+        self.recorded_errors = len(job.errors)
+
+    def run(self):
+        job = self.job
+        ImportJob.objects.filter(pk=job.pk).update(status='running')
+        try:
+            rows = itertools.islice(read_rows(job.source), job.rows_processed, None)
+            for chunk in batched(rows, self.chunk_size):
+                self.import_chunk(chunk)
+        except Exception as exc:
+            logger.exception('Import %s failed', job.pk)
+            ImportJob.objects.filter(pk=job.pk).update(status='failed', errors=job.errors + [{'error': str(exc)}])
+            raise
+        ImportJob.objects.filter(pk=job.pk).update(status='completed')
+        job.refresh_from_db()
+        return job
+
+    def import_chunk(self, chunk):
+        job = self.job
+        start = job.rows_processed
+        with transaction.atomic():
+            if self.model is Company:
+                objs, errors = self.build_companies(chunk, start)
+            else:
+                objs, errors = self.build_contacts(chunk, start)
+            self.model.objects.bulk_create(objs)
+            changes.record(self.model, [obj.pk for obj in objs])
+            new_errors = errors[:max(0, MAX_RECORDED_ERRORS - self.recorded_errors)]
+            self.recorded_errors += len(new_errors)
+            job.errors = job.errors + new_errors
+            ImportJob.objects.filter(pk=job.pk).update(
+                rows_processed=F('rows_processed') + len(chunk),
+                created_count=F('created_count') + len(objs),
+                skipped_count=F('skipped_count') + len(chunk) - len(objs),
+                errors=job.errors,
+            )
+            # Contact imports can create companies too.
+            versions.bump_on_commit(Company, Contact)
+        job.rows_processed += len(chunk)
+        job.created_count += len(objs)
+        job.skipped_count += len(chunk) - len(objs)
+        if self.progress:
+            self.progress(job)
+
+    def build_companies(self, chunk, start):
+        known = self.companies.resolve({row.get('name', '') for row in chunk})
+        objs, errors, seen = [], [], set()
+        for offset, row in enumerate(chunk):
+            name = row.get('name', '')
+            values = {column: row.get(column, '') for column in COMPANY_COLUMNS}
+            if not name:
+                errors.append({'row': start + offset + 1, 'error': 'name is required'})
+            elif error := field_error(Company, values):
+                errors.append({'row': start + offset + 1, 'error': error})
+            elif name not in known and name not in seen:
+                seen.add(name)
+                objs.append(Company(created_by=self.job.created_by, **values))
+        return objs, errors
+
+    def build_contacts(self, chunk, start):
+        valid = []
+        errors = []
+        for offset, row in enumerate(chunk):
+            line = start + offset + 1
+            email = row.get('email', '')
+            if not row.get('first_name') or not row.get('last_name') or not email:
+                errors.append({'row': line, 'error': 'first_name, last_name and email are required'})
+                continue
+            try:
+                validate_email(email)
+            except ValidationError:
+                errors.append({'row': line, 'error': f'invalid email {email!r}'})
+                continue
+            error = field_error(Contact, {column: row.get(column, '') for column in CONTACT_COLUMNS})
+            if error is None and row.get('company'):
+                error = field_error(Company, {'name': row['company']})
+            if error:
+                errors.append({'row': line, 'error': error})
+                continue
+            valid.append((line, email, row))
+
+        existing = set(Contact.objects.filter(email__in=[email for _, email, _ in valid])
+                       .values_list('email', flat=True))
+        companies = self.companies.resolve({row.get('company', '') for _, _, row in valid}, create=True)
+
+        objs = []
+        for line, email, row in valid:
+            if email in existing:
+                continue
+            existing.add(email)
+            objs.append(Contact(
+                first_name=row['first_name'], last_name=row['last_name'], email=email,
+                phone=row.get('phone', ''), position=row.get('position', ''), notes=row.get('notes', ''),
+                company_id=companies.get(row.get('company', '')), created_by=self.job.created_by,
+            ))
+        return objs, errors
+
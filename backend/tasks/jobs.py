@@ -0,0 +1,233 @@
+"""
+A small job queue kept in the database.
+
+Jobs are ``Job`` rows. ``manage.py run_worker`` claims the due ones, calls
+the function registered under the job's name with the job and its payload,
+and records the result, timing and any error. Failures are retried with
+exponential backoff up to ``max_attempts``. Functions registered with
+``every=`` are scheduled by the workers themselves: ``unique_key`` allows
+one queued or running copy at a time, so several workers don't pile up
+runs.
+"""
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Avg, Count, F, Max, Q, Sum
+from django.utils import timezone
+
+from . import archive, changes, export, importer, versions
+from .bulk import chunked
+from .models import Change, ImportJob, Job, Task
+
+logger = logging.getLogger(__name__)
+
+# name -> Registered, filled by @job as this module is imported.
+registry = {}
+
+
+class Registered:
+    def __init__(self, func, max_attempts, every):
+        self.func = func
+        self.max_attempts = max_attempts
+        self.every = every
+
+
+def job(name, max_attempts=None, every=None):
+    """Register ``func(job, **payload)`` as the job ``name``, optionally run every ``every`` seconds."""
+    def register(func):
+        registry[name] = Registered(func, max_attempts or settings.JOBS['MAX_ATTEMPTS'], every)
+        return func
+    return register
+
+
+def enqueue(name, payload=None, run_at=None, unique_key='', created_by=None):
+    """
+    Queue ``name`` to run at ``run_at`` (now by default). Returns the job, or
+    ``None`` if one with the same ``unique_key`` is already queued or running.
+    The row is written in the caller's transaction, so workers only see it
+    once that commits.
+    """
+    if name not in registry:
+        raise ValueError(f'No job registered as {name!r}.')
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                name=name, payload=payload or {}, run_at=run_at or timezone.now(), unique_key=unique_key,
+                max_attempts=registry[name].max_attempts, created_by=created_by,
+            )
+    except IntegrityError:
+        if not unique_key:
+            raise
+        return None
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.JOBS['RETRY_DELAY'] * 2 ** (attempts - 1))
+
+
+def metrics():
+    """Per job name: how many are in each state, and timings of finished attempts."""
+    finished = Q(status__in=['succeeded', 'failed'])
+    rows = Job.objects.order_by().values('name').annotate(
+        queued=Count('id', filter=Q(status='queued')),
+        running=Count('id', filter=Q(status='running')),
+        succeeded=Count('id', filter=Q(status='succeeded')),
+        failed=Count('id', filter=Q(status='failed')),
+        retries=Sum(F('attempts') - 1, filter=Q(attempts__gt=1), default=0),
+        avg_duration=Avg('duration', filter=finished),
+        max_duration=Max('duration', filter=finished),
+    )
+    return {row.pop('name'): row for row in rows}
+
+
+class Worker:
+    def __init__(self, name=None):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        self.next_housekeeping = 0
+
+    def schedule_periodic(self):
+        for name, registered in registry.items():
+            if registered.every is None:
+                continue
+            key = f'periodic:{name}'
+            if Job.objects.filter(unique_key=key, status__in=Job.ACTIVE_STATUSES).exists():
+                continue
+            last = (Job.objects.filter(unique_key=key).exclude(finished_at=None)
+                    .order_by('-finished_at').values_list('finished_at', flat=True).first())
+            run_at = last + timedelta(seconds=registered.every) if last else None
+            enqueue(name, run_at=run_at, unique_key=key)
+
+    def requeue_stale(self):
+        """Hand back jobs whose worker died mid-run, or fail them if they're out of attempts."""
+        now = timezone.now()
+        stale = Job.objects.filter(status='running', started_at__lt=now - timedelta(seconds=settings.JOBS['TIMEOUT']))
+        stale.filter(attempts__lt=F('max_attempts')).update(
+            status='queued', run_at=now, last_error='Timed out', updated_at=now)
+        stale.update(status='failed', finished_at=now, last_error='Timed out', updated_at=now)
+
+    def claim(self):
+        """Mark the next due job as running under this worker and return it."""
+        now = timezone.now()
+        due = Job.objects.filter(status='queued', run_at__lte=now).order_by('run_at', 'id')
+        for pk in due.values_list('pk', flat=True)[:10]:
+            # Whoever flips the status first owns the job.
+            claimed = Job.objects.filter(pk=pk, status='queued').update(
+                status='running', attempts=F('attempts') + 1, started_at=now, worker=self.name, updated_at=now,
+            )
+            if claimed:
+                return Job.objects.get(pk=pk)
+        return None
+
+    def run(self, job):
+        start = time.perf_counter()
+        try:
+            registered = registry.get(job.name)
+            if registered is None:
+                raise LookupError(f'No job registered as {job.name!r}.')
+            job.result = registered.func(job, **job.payload)
+        except Exception as exc:
+            logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.name, job.attempts)
+            job.last_error = f'{type(exc).__name__}: {exc}'
+            if job.attempts < job.max_attempts:
+                job.status = 'queued'
+                job.run_at = timezone.now() + retry_delay(job.attempts)
+            else:
+                job.status = 'failed'
+        else:
+            job.status = 'succeeded'
+            job.last_error = ''
+        job.duration = time.perf_counter() - start
+        if job.status != 'queued':
+            job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'result', 'output', 'last_error', 'run_at', 'duration',
+                                'finished_at', 'updated_at'])
+        logger.info('Job %s (%s) %s in %.3fs', job.pk, job.name, job.status, job.duration)
+        return job
+
+    def run_once(self):
+        """Run at most one due job; returns it, or ``None`` if nothing was due."""
+        try:
+            # Between jobs of a backlog, at most once per poll interval.
+            if time.monotonic() >= self.next_housekeeping:
+                self.requeue_stale()
+                self.schedule_periodic()
+                self.next_housekeeping = time.monotonic() + settings.JOBS['POLL_INTERVAL']
+            job = self.claim()
+            return self.run(job) if job is not None else None
+        finally:
+            close_old_connections()
+
+    def work(self, burst=False):
+        """Run jobs until stopped, or with ``burst`` until none are due."""
+        while not self.stopping:
+            if self.run_once() is None:
+                if burst:
+                    return
+                time.sleep(settings.JOBS['POLL_INTERVAL'])
+
+
+@job('sweep_overdue_tasks', every=settings.JOBS['OVERDUE_SWEEP_INTERVAL'])
+def sweep_overdue_tasks(job=None):
+    """Bring ``Task.is_overdue``, and the work queue order, up to date with the clock."""
+    now = timezone.now()
+    with transaction.atomic():
+        # Ids first, for the change log; the sweep only sees what changed since its last run.
+        flagged = list(Task.objects.filter(is_overdue=False, status__in=Task.OPEN_STATUSES, due_date__lt=now)
+                       .values_list('pk', flat=True))
+        cleared = list(Task.objects.filter(is_overdue=True)
+                       .exclude(status__in=Task.OPEN_STATUSES, due_date__lt=now)
+                       .values_list('pk', flat=True))
+        for ids, overdue in ((flagged, True), (cleared, False)):
+            for chunk in chunked(ids, settings.BULK_CHUNK_SIZE):
+                Task.objects.filter(pk__in=chunk).update(is_overdue=overdue,
+                                                         priority_rank=Task.rank_expression(overdue))
+        if flagged or cleared:
+            changes.record(Task, flagged + cleared)
+            versions.bump_on_commit(Task)
+    return {'flagged': len(flagged), 'cleared': len(cleared)}
+
+
+@job('prune_jobs', every=3600)
+def prune_jobs(job=None):
+    """Delete finished jobs, and the files they wrote, after ``JOBS['KEEP_DAYS']``."""
+    old = Job.objects.filter(finished_at__lt=timezone.now() - timedelta(days=settings.JOBS['KEEP_DAYS']))
+    for path in old.exclude(output='').values_list('output', flat=True):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    deleted, _ = old.delete()
+    return {'deleted': deleted}
+
+
+@job('prune_changes', every=3600)
+def prune_changes(job=None):
+    """Delete changes older than ``CHANGES['KEEP_DAYS']``, always keeping the newest."""
+    cutoff = timezone.now() - timedelta(days=settings.CHANGES['KEEP_DAYS'])
+    newest = Change.objects.order_by('-id').values_list('id', flat=True).first()
+    deleted, _ = Change.objects.filter(created_at__lt=cutoff, id__lt=newest or 0).delete()
+    return {'deleted': deleted}
+
+
+@job('archive_closed', every=settings.ARCHIVE['INTERVAL'])
+def archive_closed(job=None):
+    return archive.archive()
+
+
+@job('import_csv')
+def import_csv(job, import_job):
+    # Imports resume from their last committed chunk, so a retry picks up
+    # where the failed attempt stopped.
+    importer.Importer(ImportJob.objects.get(pk=import_job)).run()
+
+
+@job('export', max_attempts=1)
+def export_file(job, view, format, query):
+    job.output, job.result = export.write_export(view, format, query)
+    return job.result
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks import archive
+
+
+class Command(BaseCommand):
+    help = 'Move deals won or lost and tasks completed long ago into the archive tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE['AFTER_DAYS'],
+                            help='Archive rows closed more than this many days ago.')
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE['BATCH_SIZE'],
+                            help='Rows moved per transaction.')
+
+    def handle(self, *args, **options):
+        def progress(name, moved):
+            self.stdout.write(f'  {name}: {moved} archived')
+
+        moved = archive.archive(options['days'], options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            'Done: ' + ', '.join(f'{count} {name}s' for name, count in moved.items()) + ' archived.'
+        ))
@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.importer import Importer
+from tasks.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = 'Import companies or contacts from a CSV file, resuming interrupted imports.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='CSV file with a header row.')
+        parser.add_argument('--kind', choices=['companies', 'contacts'], default='contacts')
+        parser.add_argument('--chunk-size', type=int, help='Rows per transaction.')
+        parser.add_argument('--user', help='Username recorded as created_by.')
+        parser.add_argument('--resume', type=int, metavar='JOB_ID',
+                            help='Continue an earlier import from its last committed chunk.')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                job = ImportJob.objects.get(pk=options['resume'])
+            except ImportJob.DoesNotExist:
+                raise CommandError(f'No import job {options["resume"]}.')
+            if job.status == 'completed':
+                raise CommandError(f'Import job {job.pk} already completed.')
+        elif options['path']:
+            user = None
+            if options['user']:
+                user = User.objects.filter(username=options['user']).first()
+                if user is None:
+                    raise CommandError(f'No user {options["user"]!r}.')
+            job = ImportJob.objects.create(kind=options['kind'], source=options['path'], created_by=user)
+        else:
+            raise CommandError('Give a CSV path or --resume JOB_ID.')
+
+        self.stdout.write(f'Import job {job.pk}: {job.kind} from {job.source}')
+
+        def progress(job):
+            self.stdout.write(f'  {job.rows_processed} rows, {job.created_count} created, '
+                              f'{job.skipped_count} skipped')
+
+        job = Importer(job, chunk_size=options['chunk_size'], progress=progress).run()
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {job.created_count} created, {job.skipped_count} skipped.'
+        ))
+        for error in job.errors[:10]:
+            self.stdout.write(f'  row {error.get("row", "?")}: {error["error"]}')
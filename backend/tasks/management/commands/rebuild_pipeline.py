@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks import pipeline
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the deal pipeline rollup from the Deal table, or verify it against the table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only compare the rollup with the Deal table; exit non-zero on drift.',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            drift = pipeline.verify()
+            for (stage, month), (stored, expected) in sorted(drift.items()):
+                self.stderr.write(f'{stage} {month or "-"}: stored {stored}, expected {expected}')
+            if drift:
+                raise CommandError(f'Pipeline rollup differs from deals in {len(drift)} bucket(s).')
+            self.stdout.write(self.style.SUCCESS('Pipeline rollup matches deals.'))
+            return
+
+        pipeline.rebuild()
+        self.stdout.write(self.style.SUCCESS('Pipeline rollup rebuilt.'))
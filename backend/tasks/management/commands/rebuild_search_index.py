@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from tasks import search
+
+
+class Command(BaseCommand):
+    help = ('Recreate the full-text search index and its triggers, and repopulate it. '
+            'Run after migrations that rebuild the contact, company or deal tables on SQLite, '
+            'which drops their triggers.')
+
+    def handle(self, *args, **options):
+        search.install()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
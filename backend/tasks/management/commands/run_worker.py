@@ -0,0 +1,39 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from tasks import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued and periodic background jobs until stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no job is due instead of waiting for more.')
+        parser.add_argument('--stats', action='store_true',
+                            help='Print job counts and timings per job name, then exit.')
+        parser.add_argument('--name', help='Worker name recorded on claimed jobs; defaults to host:pid.')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for name, row in sorted(jobs.metrics().items()):
+                avg = '-' if row['avg_duration'] is None else f'{row["avg_duration"]:.3f}s'
+                worst = '-' if row['max_duration'] is None else f'{row["max_duration"]:.3f}s'
+                self.stdout.write(
+                    f'{name}: {row["queued"]} queued, {row["running"]} running, {row["succeeded"]} succeeded, '
+                    f'{row["failed"]} failed, {row["retries"]} retries; avg {avg}, max {worst}'
+                )
+            return
+
+        worker = jobs.Worker(name=options['name'])
+
+        def stop(signum, frame):
+            # Finish the job in hand, then exit.
+            worker.stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.stdout.write(f'Worker {worker.name} started; jobs: {", ".join(sorted(jobs.registry))}')
+        worker.work(burst=options['burst'])
+        self.stdout.write('Worker stopped.')
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic companies, contacts, deals and tasks with realistically skewed relationships.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=100)
+        parser.add_argument('--contacts', type=int, default=1000)
+        parser.add_argument('--deals', type=int, default=500)
+        parser.add_argument('--tasks', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=20, help='Users to own and be assigned the rows.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert.')
+
+    def handle(self, *args, **options):
+        counts = {name: options[name] for name in ('companies', 'contacts', 'deals', 'tasks', 'users')}
+        if any(count < 0 for count in counts.values()):
+            raise CommandError('Counts must not be negative.')
+        if options['deals'] and not options['companies']:
+            raise CommandError('Deals need at least one company.')
+        if (options['companies'] or options['contacts'] or options['deals'] or options['tasks']) \
+                and not options['users']:
+            raise CommandError('Give at least one user to own the rows.')
+
+        inserted = {}
+
+        def progress(model, count):
+            name = model._meta.verbose_name_plural
+            inserted[name] = inserted.get(name, 0) + count
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  {inserted[name]} {name}')
+
+        start = time.perf_counter()
+        seeder = Seeder(seed=options['seed'], users=options['users'], batch_size=options['batch_size'],
+                        progress=progress)
+        created = seeder.run(options['companies'], options['contacts'], options['deals'], options['tasks'])
+        self.stdout.write(self.style.SUCCESS(
+            'Created ' + ', '.join(f'{count} {name}' for name, count in created.items())
+            + f' in {time.perf_counter() - start:.1f}s.'
+        ))
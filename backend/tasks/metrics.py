@@ -0,0 +1,239 @@
+"""
+Per-request timings, labelled by DRF view and action.
+
+``RequestMetricsMiddleware`` tracks, for each request: wall time, the number
+of ORM queries and the time spent in them, and the time serializers spend
+building ``.data``. Queries are counted by a wrapper that ``install_wrapper``
+adds to ``connection.execute_wrappers`` on every new database connection.
+The wrapper finds the current request through a context variable, so it
+also sees queries that async views run in a worker thread.
+
+The figures go out in three ways:
+
+- as ``Server-Timing`` headers, if ``METRICS['SERVER_TIMING']`` is set;
+- as Prometheus histograms at ``/metrics``, to the client addresses in
+  ``METRICS['ALLOWED_IPS']``;
+- as warnings, when a request goes over ``METRICS['QUERY_BUDGET']`` or runs
+  the same SELECT ``METRICS['DUPLICATE_QUERIES']`` times or more (the usual
+  sign of an N+1).
+
+Histograms live in process memory, so each worker process exports its own.
+"""
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """A Prometheus histogram with a fixed set of labels."""
+
+    def __init__(self, name, help, buckets, labels=('view', 'action')):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then sum and count.
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0, 0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+        for labels, values in sorted(series.items()):
+            label_text = ','.join(f'{key}="{escape(value)}"' for key, value in zip(self.labels, labels))
+            cumulative = 0
+            for bound, count in zip([*self.buckets, '+Inf'], values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {values[-2]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {values[-1]}')
+        return lines
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+REQUEST_DURATION = Histogram('crm_request_duration_seconds', 'Time to produce the response.', LATENCY_BUCKETS)
+DB_QUERIES = Histogram('crm_request_db_queries', 'ORM queries per request.', QUERY_BUCKETS)
+DB_DURATION = Histogram('crm_request_db_duration_seconds', 'Time spent in ORM queries.', LATENCY_BUCKETS)
+SERIALIZER_DURATION = Histogram('crm_request_serializer_duration_seconds',
+                                'Time spent building serializer output.', LATENCY_BUCKETS)
+HISTOGRAMS = (REQUEST_DURATION, DB_QUERIES, DB_DURATION, SERIALIZER_DURATION)
+
+
+class RequestStats:
+    def __init__(self):
+        self.view = 'unresolved'
+        self.action = ''
+        self.queries = Counter()
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_queries = 0
+        self.serializing = False
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - start
+        stats.queries[sql] += 1
+        if stats.serializing:
+            stats.serializer_queries += 1
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """``connection_created`` receiver: count this connection's queries."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed_serialization(func, *args):
+    """``func(*args)``, counted as serializer time unless it's nested in another serializer."""
+    stats = _current.get()
+    if stats is None or stats.serializing:
+        return func(*args)
+    stats.serializing = True
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        stats.serializer_time += time.perf_counter() - start
+        stats.serializing = False
+
+
+class TimedSerializerMixin:
+    """Counts a serializer's ``to_representation`` towards the request's serializer time."""
+
+    def to_representation(self, instance):
+        return timed_serialization(super().to_representation, instance)
+
+
+def view_labels(view_func, method):
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', type(view_func).__name__), method
+    actions = getattr(view_func, 'actions', None) or {}
+    return cls.__name__, actions.get(method, method)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django would otherwise run the sync hook in a thread.
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - start)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.label_view(request, view_func)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        # process_view is this method in async mode, so don't call through it.
+        self.label_view(request, view_func)
+
+    def label_view(self, request, view_func):
+        stats = _current.get()
+        if stats is not None:
+            stats.view, stats.action = view_labels(view_func, request.method.lower())
+
+    def finish(self, request, response, stats, elapsed):
+        labels = (stats.view, stats.action)
+        REQUEST_DURATION.observe(labels, elapsed)
+        DB_QUERIES.observe(labels, stats.query_count)
+        DB_DURATION.observe(labels, stats.db_time)
+        SERIALIZER_DURATION.observe(labels, stats.serializer_time)
+
+        if settings.METRICS['SERVER_TIMING']:
+            response['Server-Timing'] = ', '.join([
+                f'app;dur={elapsed * 1000:.1f}',
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.query_count} queries"',
+                f'serialize;dur={stats.serializer_time * 1000:.1f}',
+            ])
+        self.check_queries(request, stats)
+        return response
+
+    def check_queries(self, request, stats):
+        budget = settings.METRICS['QUERY_BUDGET']
+        if stats.query_count > budget:
+            logger.warning('%s %s (%s.%s) ran %s queries, over the budget of %s; %s of them while serializing',
+                           request.method, request.path, stats.view, stats.action, stats.query_count, budget,
+                           stats.serializer_queries)
+        repeated = [(sql, count) for sql, count in stats.queries.most_common()
+                    if count >= settings.METRICS['DUPLICATE_QUERIES'] and sql.lstrip().upper().startswith('SELECT')]
+        for sql, count in repeated:
+            logger.warning('%s %s (%s.%s) ran the same query %s times, likely an N+1: %s',
+                           request.method, request.path, stats.view, stats.action, count, sql)
+
+
+def metrics_view(request):
+    """Prometheus text exposition of this process's request histograms."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS['ALLOWED_IPS']:
+        raise Http404
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 00:31
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def build_rollup(apps, schema_editor):
+    Deal = apps.get_model('tasks', 'Deal')
+    PipelineRollup = apps.get_model('tasks', 'PipelineRollup')
+    totals = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    deals = Deal.objects.order_by().values_list('stage', 'amount', 'probability', 'expected_close_date')
+    for stage, amount, probability, close in deals.iterator():
+        row = totals[(stage, close.strftime('%Y-%m') if close else '')]
+        row[0] += 1
+        row[1] += amount
+        row[2] += (amount * probability / 100).quantize(Decimal('0.01'))
+    PipelineRollup.objects.bulk_create([
+        PipelineRollup(stage=stage, month=month, deal_count=count,
+                       total_amount=amount, weighted_amount=weighted)
+        for (stage, month), (count, amount, weighted) in totals.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0003_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('lead', 'Lead'), ('qualified', 'Qualified'), ('proposal', 'Proposal'), ('negotiation', 'Negotiation'), ('won', 'Won'), ('lost', 'Lost')], max_length=20)),
+                ('month', models.CharField(blank=True, help_text='YYYY-MM of expected_close_date, blank if unset', max_length=7)),
+                ('deal_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('weighted_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'ordering': ['stage', 'month'],
+                'constraints': [models.UniqueConstraint(fields=('stage', 'month'), name='pipeline_rollup_stage_month_uniq')],
+            },
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+from django.db import migrations
+
+# The DDL is spelled out here rather than taken from ``tasks.search`` so that
+# this migration keeps creating the index it was written for as that module
+# changes. ``rebuild_search_index`` installs the current definition.
+
+CONTACT_TITLE = "coalesce(new.first_name, '') || ' ' || coalesce(new.last_name, '')"
+CONTACT_BODY = "coalesce(new.email, '') || ' ' || coalesce(new.position, '') || ' ' || coalesce(new.notes, '')"
+COMPANY_TITLE = "coalesce(new.name, '')"
+COMPANY_BODY = "coalesce(new.industry, '') || ' ' || coalesce(new.notes, '')"
+DEAL_TITLE = "coalesce(new.title, '')"
+DEAL_BODY = "coalesce(new.notes, '')"
+
+SQLITE_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_search USING fts5("
+    "title, body, tokenize = 'unicode61 remove_diacritics 2')",
+
+    f"CREATE TRIGGER tasks_contact_search_ai AFTER INSERT ON tasks_contact BEGIN "
+    f"INSERT INTO tasks_search(rowid, title, body) VALUES (new.id * 4 + 1, {CONTACT_TITLE}, {CONTACT_BODY}); END",
+    f"CREATE TRIGGER tasks_contact_search_au AFTER UPDATE OF first_name, last_name, email, position, notes "
+    f"ON tasks_contact BEGIN DELETE FROM tasks_search WHERE rowid = old.id * 4 + 1; "
+    f"INSERT INTO tasks_search(rowid, title, body) VALUES (new.id * 4 + 1, {CONTACT_TITLE}, {CONTACT_BODY}); END",
+    "CREATE TRIGGER tasks_contact_search_ad AFTER DELETE ON tasks_contact BEGIN "
+    "DELETE FROM tasks_search WHERE rowid = old.id * 4 + 1; END",
+
+    f"CREATE TRIGGER tasks_company_search_ai AFTER INSERT ON tasks_company BEGIN "
+    f"INSERT INTO tasks_search(rowid, title, body) VALUES (new.id * 4 + 2, {COMPANY_TITLE}, {COMPANY_BODY}); END",
+    f"CREATE TRIGGER tasks_company_search_au AFTER UPDATE OF name, industry, notes "
+    f"ON tasks_company BEGIN DELETE FROM tasks_search WHERE rowid = old.id * 4 + 2; "
+    f"INSERT INTO tasks_search(rowid, title, body) VALUES (new.id * 4 + 2, {COMPANY_TITLE}, {COMPANY_BODY}); END",
+    "CREATE TRIGGER tasks_company_search_ad AFTER DELETE ON tasks_company BEGIN "
+    "DELETE FROM tasks_search WHERE rowid = old.id * 4 + 2; END",
+
+    f"CREATE TRIGGER tasks_deal_search_ai AFTER INSERT ON tasks_deal BEGIN "
+    f"INSERT INTO tasks_search(rowid, title, body) VALUES (new.id * 4 + 3, {DEAL_TITLE}, {DEAL_BODY}); END",
+    f"CREATE TRIGGER tasks_deal_search_au AFTER UPDATE OF title, notes "
+    f"ON tasks_deal BEGIN DELETE FROM tasks_search WHERE rowid = old.id * 4 + 3; "
+    f"INSERT INTO tasks_search(rowid, title, body) VALUES (new.id * 4 + 3, {DEAL_TITLE}, {DEAL_BODY}); END",
+    "CREATE TRIGGER tasks_deal_search_ad AFTER DELETE ON tasks_deal BEGIN "
+    "DELETE FROM tasks_search WHERE rowid = old.id * 4 + 3; END",
+
+    "INSERT INTO tasks_search(rowid, title, body) SELECT id * 4 + 1, "
+    f"{CONTACT_TITLE.replace('new.', '')}, {CONTACT_BODY.replace('new.', '')} FROM tasks_contact",
+    "INSERT INTO tasks_search(rowid, title, body) SELECT id * 4 + 2, "
+    f"{COMPANY_TITLE.replace('new.', '')}, {COMPANY_BODY.replace('new.', '')} FROM tasks_company",
+    "INSERT INTO tasks_search(rowid, title, body) SELECT id * 4 + 3, "
+    f"{DEAL_TITLE.replace('new.', '')}, {DEAL_BODY.replace('new.', '')} FROM tasks_deal",
+]
+
+SQLITE_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {table}_search_{suffix}"
+    for table in ('tasks_contact', 'tasks_company', 'tasks_deal') for suffix in ('ai', 'au', 'ad')
+] + ["DROP TABLE IF EXISTS tasks_search"]
+
+POSTGRES_INSTALL = [
+    "CREATE INDEX IF NOT EXISTS tasks_contact_search_idx ON tasks_contact USING GIN ((to_tsvector('simple', "
+    "coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || coalesce(email, '') || ' ' || "
+    "coalesce(position, '') || ' ' || coalesce(notes, ''))))",
+    "CREATE INDEX IF NOT EXISTS tasks_company_search_idx ON tasks_company USING GIN ((to_tsvector('simple', "
+    "coalesce(name, '') || ' ' || coalesce(industry, '') || ' ' || coalesce(notes, ''))))",
+    "CREATE INDEX IF NOT EXISTS tasks_deal_search_idx ON tasks_deal USING GIN ((to_tsvector('simple', "
+    "coalesce(title, '') || ' ' || coalesce(notes, ''))))",
+]
+
+POSTGRES_UNINSTALL = [
+    f"DROP INDEX IF EXISTS {table}_search_idx" for table in ('tasks_contact', 'tasks_company', 'tasks_deal')
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement, params=None)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_import_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_INSTALL, 'postgresql': POSTGRES_INSTALL}),
+            run({'sqlite': SQLITE_UNINSTALL, 'postgresql': POSTGRES_UNINSTALL}),
+        ),
+    ]
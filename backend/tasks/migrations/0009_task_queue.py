@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+PRIORITY_RANKS = {'high': 0, 'medium': 1, 'low': 2}
+
+
+def rank_open_tasks(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    open_tasks = Task.objects.filter(status__in=['pending', 'in_progress'])
+    groups = [
+        open_tasks.filter(is_overdue=True),
+        open_tasks.filter(is_overdue=False, due_date__isnull=False),
+        open_tasks.filter(due_date__isnull=True),
+    ]
+    for group, tasks in enumerate(groups):
+        for priority, rank in PRIORITY_RANKS.items():
+            tasks.filter(priority=priority).update(priority_rank=group * len(PRIORITY_RANKS) + rank)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_change_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='priority_rank',
+            field=models.SmallIntegerField(editable=False, help_text="Place in the assignee's work queue; null once completed", null=True),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assigned_to', 'priority_rank', 'due_date', 'status', 'id'], name='task_queue_idx'),
+        ),
+        migrations.RunPython(rank_open_tasks, migrations.RunPython.noop),
+    ]
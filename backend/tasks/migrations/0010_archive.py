@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_task_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDeal',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('stage', models.CharField(choices=[('lead', 'Lead'), ('qualified', 'Qualified'), ('proposal', 'Proposal'), ('negotiation', 'Negotiation'), ('won', 'Won'), ('lost', 'Lost')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('probability', models.IntegerField()),
+                ('expected_close_date', models.DateField(null=True)),
+                ('company', models.BigIntegerField()),
+                ('contact', models.BigIntegerField(null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('snapshot', models.JSONField()),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at', 'id'], name='archived_deal_created_id_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_progress', 'In Progress'), ('completed', 'Completed')], max_length=20)),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], max_length=10)),
+                ('due_date', models.DateTimeField(null=True)),
+                ('contact', models.BigIntegerField(null=True)),
+                ('deal', models.BigIntegerField(null=True)),
+                ('assigned_to', models.BigIntegerField(null=True)),
+                ('is_overdue', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('snapshot', models.JSONField()),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at', 'id'], name='archived_task_created_id_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchiveTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=20)),
+                ('key', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'ordering': ['model', 'key'],
+                'constraints': [models.UniqueConstraint(fields=('model', 'key'), name='archive_total_model_key_uniq')],
+            },
+        ),
+    ]
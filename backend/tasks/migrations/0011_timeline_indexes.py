@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['company', '-updated_at', 'id'], name='contact_company_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(fields=['company', '-updated_at', 'id'], name='deal_company_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(fields=['contact', '-updated_at', 'id'], name='deal_contact_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['contact', '-updated_at', 'id'], name='task_contact_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['deal', '-updated_at', 'id'], name='task_deal_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0011_timeline_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archiveddeal',
+            index=models.Index(fields=['company', '-updated_at', 'id'], name='archived_deal_company_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archiveddeal',
+            index=models.Index(fields=['contact', '-updated_at', 'id'], name='archived_deal_contact_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['contact', '-updated_at', 'id'], name='archived_task_contact_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['deal', '-updated_at', 'id'], name='archived_task_deal_idx'),
+        ),
+    ]
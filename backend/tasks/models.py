@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class Company(models.Model):
@@ -17,6 +18,9 @@ class Company(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Companies'
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='company_created_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -34,8 +38,16 @@ class Contact(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='contacts')
 
+    # Columns each property reads, so querysets can load just these.
+    property_fields = {'full_name': ('first_name', 'last_name')}
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='contact_created_id_idx'),
+            # Company timelines (tasks.timeline).
+            models.Index(fields=['company', '-updated_at', 'id'], name='contact_company_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -55,6 +67,8 @@ class Deal(models.Model):
         ('lost', 'Lost'),
     ]
 
+    CLOSED_STAGES = ['won', 'lost']
+
     title = models.CharField(max_length=200)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default='lead')
@@ -69,6 +83,13 @@ class Deal(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='deal_created_id_idx'),
+            models.Index(fields=['stage', 'amount'], name='deal_stage_amount_idx'),
+            # Company and contact timelines (tasks.timeline).
+            models.Index(fields=['company', '-updated_at', 'id'], name='deal_company_updated_idx'),
+            models.Index(fields=['contact', '-updated_at', 'id'], name='deal_contact_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -87,6 +108,11 @@ class Task(models.Model):
         ('high', 'High'),
     ]
 
+    OPEN_STATUSES = ['pending', 'in_progress']
+    # Work queue order: overdue, then due, then undated; by priority within each.
+    PRIORITY_RANKS = {'high': 0, 'medium': 1, 'low': 2}
+    QUEUE_ORDERING = ['priority_rank', 'due_date', 'status', 'id']
+
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -98,9 +124,253 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_tasks')
+    is_overdue = models.BooleanField(default=False, editable=False,
+                                     help_text='Open and past due; kept current by the overdue sweep job')
+    priority_rank = models.SmallIntegerField(null=True, editable=False,
+                                             help_text="Place in the assignee's work queue; null once completed")
+
+    # Columns computed from the others; see sync_derived_fields.
+    derived_fields = ('is_overdue', 'priority_rank')
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='task_created_id_idx'),
+            # Not partial: SQLite only picks a partial index when the query's
+            # WHERE matches it literally, and the ORM always binds parameters.
+            # is_overdue makes it cover the dashboard's task counts.
+            models.Index(fields=['status', 'due_date', 'is_overdue'], name='task_status_due_overdue_idx'),
+            # /api/tasks/mine/ reads an assignee's queue in this order, and
+            # their counts by status, from this index alone.
+            models.Index(fields=['assigned_to', 'priority_rank', 'due_date', 'status', 'id'], name='task_queue_idx'),
+            # Company and contact timelines (tasks.timeline).
+            models.Index(fields=['contact', '-updated_at', 'id'], name='task_contact_updated_idx'),
+            models.Index(fields=['deal', '-updated_at', 'id'], name='task_deal_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+    def sync_derived_fields(self, now=None):
+        self.is_overdue = (self.status in self.OPEN_STATUSES and self.due_date is not None
+                           and self.due_date < (now or timezone.now()))
+        self.priority_rank = self.rank(self.status, self.priority, self.due_date, self.is_overdue)
+
+    @classmethod
+    def rank(cls, status, priority, due_date, is_overdue):
+        if status not in cls.OPEN_STATUSES:
+            return None
+        group = 0 if is_overdue else 1 if due_date is not None else 2
+        return group * len(cls.PRIORITY_RANKS) + cls.PRIORITY_RANKS[priority]
+
+    @classmethod
+    def rank_expression(cls, is_overdue):
+        """``rank()`` as SQL, for updates that set ``is_overdue`` in the database."""
+        return models.Case(
+            *[models.When(status__in=cls.OPEN_STATUSES, priority=priority, due_date__isnull=False,
+                          then=cls.rank('pending', priority, True, is_overdue))
+              for priority in cls.PRIORITY_RANKS],
+            *[models.When(status__in=cls.OPEN_STATUSES, priority=priority,
+                          then=cls.rank('pending', priority, None, False))
+              for priority in cls.PRIORITY_RANKS],
+            default=None,
+        )
+
+    def save(self, *args, **kwargs):
+        self.sync_derived_fields()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], *self.derived_fields}
+        super().save(*args, **kwargs)
+
+
+class PipelineRollup(models.Model):
+    """Deal totals per stage and expected-close month, maintained on write."""
+    stage = models.CharField(max_length=20, choices=Deal.STAGE_CHOICES)
+    month = models.CharField(max_length=7, blank=True, help_text='YYYY-MM of expected_close_date, blank if unset')
+    deal_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    weighted_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['stage', 'month']
+        constraints = [
+            models.UniqueConstraint(fields=['stage', 'month'], name='pipeline_rollup_stage_month_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.stage} {self.month or '-'}"
+
+
+class ImportJob(models.Model):
+    KIND_CHOICES = [
+        ('companies', 'Companies'),
+        ('contacts', 'Contacts'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    source = models.CharField(max_length=500, help_text='Path of the CSV file on the server')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    rows_processed = models.IntegerField(default=0, help_text='Rows read and committed; imports resume from here')
+    created_count = models.IntegerField(default=0)
+    skipped_count = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='import_jobs')
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.kind} import {self.pk}"
+
+
+class Job(models.Model):
+    """A unit of deferred work, run by ``manage.py run_worker`` (see ``tasks.jobs``)."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    ACTIVE_STATUSES = ['queued', 'running']
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    unique_key = models.CharField(max_length=200, blank=True,
+                                  help_text='At most one queued or running job per key')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True, help_text='Seconds taken by the last attempt')
+    worker = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)
+    output = models.CharField(max_length=500, blank=True, help_text='Path of a file the job wrote')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['unique_key'],
+                condition=models.Q(status__in=['queued', 'running']) & ~models.Q(unique_key=''),
+                name='job_unique_active_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} job {self.pk}"
+
+
+class Change(models.Model):
+    """
+    One write to a CRM record, appended in the writing transaction. The id is
+    the cursor clients sync from (see ``tasks.changes``).
+    """
+    ACTION_CHOICES = [
+        ('saved', 'Saved'),
+        ('deleted', 'Deleted'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} {self.action}"
+
+
+class ArchivedDeal(models.Model):
+    """
+    A won or lost deal moved out of ``Deal`` by ``tasks.archive``. ``snapshot``
+    is the deal as the API rendered it then. Related ids are plain columns
+    named like the ``Deal`` foreign keys, so the same filters apply, and
+    deleting a company or contact later leaves the history alone.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    stage = models.CharField(max_length=20, choices=Deal.STAGE_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    probability = models.IntegerField()
+    expected_close_date = models.DateField(null=True)
+    company = models.BigIntegerField()
+    contact = models.BigIntegerField(null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    snapshot = models.JSONField()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='archived_deal_created_id_idx'),
+            models.Index(fields=['company', '-updated_at', 'id'], name='archived_deal_company_idx'),
+            models.Index(fields=['contact', '-updated_at', 'id'], name='archived_deal_contact_idx'),
+        ]
+
+    def __str__(self):
+        return self.snapshot.get('title', str(self.pk))
+
+
+class ArchivedTask(models.Model):
+    """A completed task moved out of ``Task`` by ``tasks.archive``; see ``ArchivedDeal``."""
+    id = models.BigIntegerField(primary_key=True)
+    status = models.CharField(max_length=20, choices=Task.STATUS_CHOICES)
+    priority = models.CharField(max_length=10, choices=Task.PRIORITY_CHOICES)
+    due_date = models.DateTimeField(null=True)
+    contact = models.BigIntegerField(null=True)
+    deal = models.BigIntegerField(null=True)
+    assigned_to = models.BigIntegerField(null=True)
+    is_overdue = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    snapshot = models.JSONField()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='archived_task_created_id_idx'),
+            models.Index(fields=['contact', '-updated_at', 'id'], name='archived_task_contact_idx'),
+            models.Index(fields=['deal', '-updated_at', 'id'], name='archived_task_deal_idx'),
+        ]
+
+    def __str__(self):
+        return self.snapshot.get('title', str(self.pk))
+
+
+class ArchiveTotal(models.Model):
+    """Counts and amounts of archived rows per deal stage or task status, for the dashboard."""
+    model = models.CharField(max_length=20)
+    key = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['model', 'key']
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'key'], name='archive_total_model_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.key}"
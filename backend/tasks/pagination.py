@@ -0,0 +1,195 @@
+import heapq
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import counts
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination ordered on ``(<ordering field>, id)``, with
+    ``id`` breaking ties in the opposite direction to the ordering field.
+
+    The cursor carries the ordering value and id of the row at the page
+    boundary, so fetching page N is a single indexed range scan of
+    ``page_size + 1`` rows however deep the client has scrolled. Ordering
+    defaults to ``-created_at`` and may be switched with ``?ordering=`` to any
+    non-null column listed in the view's ``ordering_fields``.
+
+    Pages carry no total unless asked for with ``?count=1``, which adds
+    ``count`` and ``count_exact``; see ``tasks.counts``.
+    """
+    page_size = api_settings.PAGE_SIZE or 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    count_query_param = 'count'
+    default_ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = counts.count(queryset) if self.wants_count(request) else None
+        return self.set_page(list(self.get_page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.count = await counts.acount(queryset) if self.wants_count(request) else None
+        return self.set_page([row async for row in self.get_page_queryset(queryset, request, view)])
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true')
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """The unevaluated query for the page, plus one row to detect more."""
+        self.start_page(request, view)
+        return self.page_queryset(queryset)
+
+    def start_page(self, request, view=None):
+        """Read the page size, ordering and cursor off ``request``."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, view)
+        self.cursor = self.decode_cursor(request, view)
+        self.reverse = self.cursor is not None and self.cursor['r']
+
+    def page_queryset(self, queryset):
+        """``queryset`` from the cursor on, in page order, cut to the page plus one row."""
+        if self.cursor is not None:
+            queryset = queryset.filter(self.seek_filter(self.cursor['v'], self.cursor['id']))
+        return queryset.order_by(*self.order_by())[:self.page_size + 1]
+
+    def merge_pages(self, *pages):
+        """
+        Rows of several evaluated ``page_queryset()`` results interleaved in
+        page order, cut to the page plus one row. Ids must not repeat across them.
+        """
+        def key(row):
+            value, pk = self.position(row)
+            return value, -pk
+        return list(heapq.merge(*pages, key=key, reverse=self.descending))[:self.page_size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        self.page = rows
+        if self.reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, request, view):
+        ordering = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        allowed = getattr(view, 'ordering_fields', [self.default_ordering.lstrip('-')])
+        if ordering.lstrip('-') not in allowed:
+            raise ValidationError({self.ordering_query_param: [
+                f'Unsupported ordering. Choose from: {", ".join(allowed)}.'
+            ]})
+        return ordering
+
+    @property
+    def field(self):
+        return self.ordering.lstrip('-')
+
+    @property
+    def descending(self):
+        # Walking backwards through a descending ordering is an ascending scan.
+        return self.ordering.startswith('-') != self.reverse
+
+    def order_by(self):
+        # ``id`` runs against the ordering field so that a single
+        # (-created_at, id) index can be scanned in either direction.
+        if self.descending:
+            return ['-' + self.field, 'id']
+        return [self.field, '-id']
+
+    def seek_filter(self, value, pk):
+        if self.descending:
+            return Q(**{f'{self.field}__lt': value}) | Q(**{self.field: value, 'id__gt': pk})
+        return Q(**{f'{self.field}__gt': value}) | Q(**{self.field: value, 'id__lt': pk})
+
+    def position(self, row):
+        """``(ordering value, id)`` of a row or instance."""
+        if isinstance(row, dict):
+            return row[self.field], row['id']
+        return getattr(row, self.field), row.pk
+
+    def encode_cursor(self, row, reverse):
+        value, pk = self.position(row)
+        payload = {'o': self.ordering, 'r': reverse, 'v': str(value), 'id': pk}
+        cursor = urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, view=None):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            cursor = {'o': str(cursor['o']), 'r': bool(cursor['r']),
+                      'v': str(cursor['v']), 'id': int(cursor['id'])}
+            queryset = getattr(view, 'queryset', None)
+            if queryset is not None:
+                # Checked here, or a bad value fails as a database error.
+                cursor['v'] = queryset.model._meta.get_field(self.field).to_python(cursor['v'])
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor['o'] != self.ordering:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        fields = OrderedDict()
+        if self.count is not None:
+            fields['count'], fields['count_exact'] = self.count
+        fields['next'] = self.get_next_link()
+        fields['previous'] = self.get_previous_link()
+        fields['results'] = data
+        return Response(fields)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer', 'description': 'Only with ?count=1.'},
+                'count_exact': {'type': 'boolean', 'description': 'False when count is an estimate.'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
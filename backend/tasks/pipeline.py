@@ -0,0 +1,143 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import ArchivedDeal, Deal, PipelineRollup
+
+CENT = Decimal('0.01')
+DEAL_FIELDS = ('stage', 'amount', 'probability', 'expected_close_date')
+
+
+def _month(date):
+    return date.strftime('%Y-%m') if date else ''
+
+
+def _weighted(amount, probability):
+    return (Decimal(amount) * probability / 100).quantize(CENT)
+
+
+def contribution(deal):
+    """``((stage, month), amount, weighted)`` a deal adds to the rollup."""
+    if isinstance(deal, dict):
+        stage, amount, probability, close = (deal[name] for name in DEAL_FIELDS)
+    else:
+        stage, amount, probability, close = (getattr(deal, name) for name in DEAL_FIELDS)
+    return (stage, _month(close)), Decimal(amount), _weighted(amount, probability)
+
+
+def _apply(key, count, amount, weighted):
+    stage, month = key
+    changes = {
+        'deal_count': F('deal_count') + count,
+        'total_amount': F('total_amount') + amount,
+        'weighted_amount': F('weighted_amount') + weighted,
+    }
+    if PipelineRollup.objects.filter(stage=stage, month=month).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            PipelineRollup.objects.create(
+                stage=stage, month=month, deal_count=count,
+                total_amount=amount, weighted_amount=weighted,
+            )
+    except IntegrityError:
+        # Another writer created the row first; add onto theirs.
+        PipelineRollup.objects.filter(stage=stage, month=month).update(**changes)
+
+
+def record(old=None, new=None):
+    """
+    Move a deal's contribution from ``old`` to ``new`` (either may be None).
+
+    Must run in the same transaction as the write to the deal itself.
+    """
+    old = contribution(old) if old is not None else None
+    new = contribution(new) if new is not None else None
+    if old == new:
+        return
+    if old is not None:
+        key, amount, weighted = old
+        _apply(key, -1, -amount, -weighted)
+    if new is not None:
+        key, amount, weighted = new
+        _apply(key, 1, amount, weighted)
+
+
+def record_many(old=(), new=()):
+    """``record`` for a batch, with one UPDATE per touched (stage, month)."""
+    deltas = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    for deals, sign in ((old, -1), (new, 1)):
+        for deal in deals:
+            key, amount, weighted = contribution(deal)
+            delta = deltas[key]
+            delta[0] += sign
+            delta[1] += sign * amount
+            delta[2] += sign * weighted
+    for key, (count, amount, weighted) in sorted(deltas.items()):
+        if count or amount or weighted:
+            _apply(key, count, amount, weighted)
+
+
+def current_state(deal_pk):
+    """The stored values ``record`` needs, read under a row lock."""
+    return Deal.objects.select_for_update().values(*DEAL_FIELDS).get(pk=deal_pk)
+
+
+def compute_totals():
+    """Rollup rows recomputed from ``Deal`` and ``ArchivedDeal``, keyed by (stage, month)."""
+    totals = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    for model in (Deal, ArchivedDeal):
+        for deal in model.objects.order_by().values(*DEAL_FIELDS).iterator(chunk_size=2000):
+            key, amount, weighted = contribution(deal)
+            row = totals[key]
+            row[0] += 1
+            row[1] += amount
+            row[2] += weighted
+    return {key: tuple(row) for key, row in totals.items()}
+
+
+def verify():
+    """Return ``{(stage, month): (stored, expected)}`` for every mismatching row."""
+    expected = compute_totals()
+    stored = {
+        (row.stage, row.month): (row.deal_count, row.total_amount, row.weighted_amount)
+        for row in PipelineRollup.objects.all()
+        if row.deal_count or row.total_amount or row.weighted_amount
+    }
+    return {
+        key: (stored.get(key), expected.get(key))
+        for key in stored.keys() | expected.keys()
+        if stored.get(key) != expected.get(key)
+    }
+
+
+@transaction.atomic
+def rebuild():
+    PipelineRollup.objects.all().delete()
+    PipelineRollup.objects.bulk_create([
+        PipelineRollup(stage=stage, month=month, deal_count=count,
+                       total_amount=amount, weighted_amount=weighted)
+        for (stage, month), (count, amount, weighted) in compute_totals().items()
+    ])
+
+
+def summary():
+    """Pipeline totals by stage and by month, read from the rollup only."""
+    by_stage = {stage: [0, Decimal(0), Decimal(0)] for stage, _ in Deal.STAGE_CHOICES}
+    by_month = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    for row in PipelineRollup.objects.all():
+        for bucket in (by_stage.setdefault(row.stage, [0, Decimal(0), Decimal(0)]), by_month[row.month]):
+            bucket[0] += row.deal_count
+            bucket[1] += row.total_amount
+            bucket[2] += row.weighted_amount
+
+    def entry(label, name, values):
+        return {label: name, 'count': values[0], 'total_amount': values[1], 'weighted_amount': values[2]}
+
+    return {
+        'by_stage': [entry('stage', stage, values) for stage, values in by_stage.items()],
+        'by_month': [entry('month', month or None, values) for month, values in sorted(by_month.items())
+                     if values[0]],
+    }
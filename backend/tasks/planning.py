@@ -0,0 +1,109 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _concrete_field(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if getattr(field, 'concrete', False) else None
+
+
+def _columns_for(model, attr, prefix=''):
+    """Columns of ``model`` needed to read ``attr``, either a field or a declared property."""
+    field = _concrete_field(model, attr)
+    if field is not None:
+        return [prefix + field.name]
+    derived = getattr(model, 'property_fields', {}).get(attr)
+    if derived is not None:
+        return [prefix + name for name in derived]
+    return None
+
+
+def count_subquery(model, relation_name):
+    """``COUNT(*)`` of a reverse relation as a correlated subquery."""
+    relation = model._meta.get_field(relation_name)
+    fk_name = relation.field.name
+    counts = (
+        relation.related_model._default_manager
+        .filter(**{fk_name: OuterRef('pk')})
+        .order_by()
+        .values(fk_name)
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def plan_queryset(queryset, serializer, field_names=None, extra=()):
+    """
+    Shape ``queryset`` so rendering it through ``serializer`` never goes back
+    to the database per row.
+
+    Forward relations read through dotted sources (``company.name``) are
+    joined with ``select_related``, ``Meta.count_fields`` are annotated as
+    correlated ``COUNT`` subqueries and the column list is narrowed with
+    ``only()`` to what the serializer actually renders, or to ``field_names``
+    of it, plus the ``extra`` columns the caller reads itself. Subqueries
+    rather than ``Count()`` over joins keep the outer query free of GROUP BY,
+    so ordered pages can be read straight off an index.
+    """
+    model = queryset.model
+    meta = getattr(serializer, 'Meta', None)
+    count_fields = getattr(meta, 'count_fields', {})
+
+    related = []
+    columns = ['pk', *extra]
+    counts = {}
+    complete = True
+
+    for name, field in serializer.fields.items():
+        if field_names is not None and name not in field_names:
+            continue
+        if name in count_fields:
+            counts[name] = count_subquery(model, count_fields[name])
+            continue
+        if field.source == '*':
+            complete = False
+            continue
+
+        attrs = field.source.split('.')
+        if len(attrs) == 1:
+            needed = _columns_for(model, attrs[0])
+        elif len(attrs) == 2:
+            relation = _concrete_field(model, attrs[0])
+            needed = None
+            if relation is not None and relation.many_to_one:
+                needed = _columns_for(relation.related_model, attrs[1], prefix=attrs[0] + '__')
+                if needed is not None:
+                    related.append(attrs[0])
+                    needed.append(attrs[0])
+        else:
+            needed = None
+
+        if needed is None:
+            # Something we can't see through; keep every column rather than
+            # risk a deferred load per row.
+            complete = False
+            continue
+        columns.extend(needed)
+
+    if related:
+        queryset = queryset.select_related(*related)
+    if counts:
+        queryset = queryset.annotate(**counts)
+    if complete:
+        queryset = queryset.only(*dict.fromkeys(columns))
+    return queryset
+
+
+def prefetch_expansion(model, name, serializer):
+    """
+    ``Prefetch`` of the reverse relation ``name`` of ``model``, planned for
+    rendering through ``serializer``: one query for the whole page.
+    """
+    relation = model._meta.get_field(name)
+    queryset = relation.related_model._default_manager.all()
+    return Prefetch(name, queryset=plan_queryset(queryset, serializer, extra=[relation.field.name]))
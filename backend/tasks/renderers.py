@@ -0,0 +1,38 @@
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` output produced by orjson when it's installed.
+
+    Compact, unescaped UTF-8 with U+2028/U+2029 escaped is exactly what
+    ``JSONRenderer`` emits for strings, ints and nulls. Anything orjson
+    doesn't know goes through DRF's encoder, but floats may be formatted
+    differently (``1e16`` rather than ``1e+16``). Use it where payloads
+    carry no floats, and where the client hasn't asked for indentation.
+    """
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        content = orjson.dumps(data, default=self._encoder.default)
+        return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Errors for clients that only accept ``text/event-stream``, as an ``error`` event."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f'event: error\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n'.encode()
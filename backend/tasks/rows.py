@@ -0,0 +1,156 @@
+"""
+Read-only serialization straight from ``values()`` rows.
+
+A ``RowPlan`` compiles a ``ModelSerializer`` into the columns it needs
+(related names joined, ``Meta.count_fields`` as subqueries) and one small
+function per field. Rendering a row then skips model instantiation and
+DRF's per-field attribute walking. The output matches the serializer's:
+types that need formatting (decimals, dates) go through the field's own
+``to_representation``, and ISO 8601 datetimes are formatted the same way
+against a timezone looked up once per page. A null relation drops the
+fields read through it, just as DRF does.
+"""
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .metrics import timed_serialization
+from .planning import _concrete_field, count_subquery
+
+# Fields whose representation of a database value is the value itself.
+PASSTHROUGH_FIELDS = (
+    serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+    serializers.ChoiceField, serializers.PrimaryKeyRelatedField, serializers.ReadOnlyField,
+)
+
+
+# (serializer class, field names) -> RowPlan or None, filled on first use.
+_plans = {}
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _converter(field):
+    """``convert(value, tz)`` for non-null values of ``field``, or ``None`` to pass them through."""
+    if isinstance(field, PASSTHROUGH_FIELDS):
+        return None
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if (isinstance(field, serializers.DateTimeField) and not hasattr(field, 'timezone')
+            and output_format and output_format.lower() == ISO_8601):
+        # DRF's own formatting, minus looking up the current timezone per value.
+        def convert(value, tz):
+            if tz is None:
+                return field.to_representation(value)
+            value = value.astimezone(tz).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+    return lambda value, tz: field.to_representation(value)
+
+
+def _reader(model, attr, prefix):
+    """``(lookups, read(row))`` for ``attr`` of ``model``, a field or a declared property."""
+    field = _concrete_field(model, attr)
+    if field is not None:
+        lookup = prefix + field.name
+        return [lookup], lambda row: row[lookup]
+    columns = getattr(model, 'property_fields', {}).get(attr)
+    if columns is None:
+        raise Unsupported(attr)
+    getter = getattr(model, attr).fget
+    lookups = {column: prefix + column for column in columns}
+    return list(lookups.values()), lambda row: getter(
+        SimpleNamespace(**{column: row[lookup] for column, lookup in lookups.items()})
+    )
+
+
+def _writer(name, read, convert, present=None):
+    def write(row, out, tz):
+        if present is not None and row[present] is None:
+            return
+        value = read(row)
+        out[name] = None if value is None else (convert(value, tz) if convert else value)
+    return write
+
+
+class RowPlan:
+    """The ``values()`` lookups and per-field writers for rendering a serializer from rows."""
+
+    def __init__(self, serializer, field_names=None):
+        model = serializer.Meta.model
+        count_fields = getattr(serializer.Meta, 'count_fields', {})
+        self.lookups = ['id']
+        self.annotations = {}
+        self.writers = []
+
+        for name, field in serializer.fields.items():
+            if field_names is not None and name not in field_names:
+                continue
+            if name in count_fields:
+                self.annotations[name] = count_subquery(model, count_fields[name])
+                self.writers.append(_writer(name, lambda row, name=name: row[name], None))
+                continue
+            if field.write_only or field.source == '*':
+                raise Unsupported(name)
+
+            attrs = field.source.split('.')
+            if len(attrs) == 1:
+                lookups, read = _reader(model, attrs[0], '')
+                self.writers.append(_writer(name, read, _converter(field)))
+            elif len(attrs) == 2:
+                relation = _concrete_field(model, attrs[0])
+                if relation is None or not relation.many_to_one:
+                    raise Unsupported(name)
+                lookups, read = _reader(relation.related_model, attrs[1], attrs[0] + '__')
+                lookups.append(attrs[0])
+                self.writers.append(_writer(name, read, _converter(field), present=attrs[0]))
+            else:
+                raise Unsupported(name)
+            self.lookups.extend(lookups)
+        self.lookups = list(dict.fromkeys(self.lookups))
+
+    @classmethod
+    def compile(cls, serializer_class, field_names=None):
+        """The plan for ``serializer_class``, or ``None`` if a field can't be read from rows."""
+        key = (serializer_class, field_names)
+        if key not in _plans:
+            try:
+                _plans[key] = cls(serializer_class(), field_names)
+            except Unsupported:
+                _plans[key] = None
+        return _plans[key]
+
+    def values(self, queryset, *extra):
+        """``queryset`` as rows for this plan, plus ``extra`` columns the caller reads itself."""
+        return queryset.values(*dict.fromkeys([*self.lookups, *extra]), **self.annotations)
+
+    def to_representation(self, row, tz=None):
+        out = {}
+        if tz is None and settings.USE_TZ:
+            tz = timezone.get_current_timezone()
+        for write in self.writers:
+            write(row, out, tz)
+        return out
+
+    def to_representation_many(self, rows):
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        return [self.to_representation(row, tz) for row in rows]
+
+
+class RowSerializer:
+    """Stands in for the serializer on read actions: ``.data`` for one row or a page of rows."""
+
+    def __init__(self, plan, instance, many=False):
+        self.plan = plan
+        self.instance = instance
+        self.many = many
+
+    @property
+    def data(self):
+        if self.many:
+            return timed_serialization(self.plan.to_representation_many, self.instance)
+        return timed_serialization(self.plan.to_representation, self.instance)
@@ -0,0 +1,195 @@
+"""
+Full-text search over contacts, companies and deals.
+
+On SQLite the documents live in an FTS5 table, ``tasks_search``, kept in
+sync by triggers on the base tables so that bulk writes are indexed too. Its
+rowid encodes the source row as ``id * 4 + kind``, which makes trigger
+updates a rowid lookup rather than a scan. On PostgreSQL the same documents
+are GIN-indexed ``tsvector`` expressions on the base tables. Other backends
+fall back to ``icontains`` filters.
+
+SQLite cannot alter most columns in place: Django recreates the table and
+copies the rows over, and dropping the old table drops its triggers with it.
+After a migration that alters a field on Contact, Company or Deal, run
+``rebuild_search_index`` to put them back; until then writes to that table
+are not indexed.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Company, Contact, Deal
+
+KINDS = {
+    'contact': {
+        'code': 1,
+        'table': 'tasks_contact',
+        'title': ['first_name', 'last_name'],
+        'body': ['email', 'position', 'notes'],
+        'model': Contact,
+    },
+    'company': {
+        'code': 2,
+        'table': 'tasks_company',
+        'title': ['name'],
+        'body': ['industry', 'notes'],
+        'model': Company,
+    },
+    'deal': {
+        'code': 3,
+        'table': 'tasks_deal',
+        'title': ['title'],
+        'body': ['notes'],
+        'model': Deal,
+    },
+}
+KIND_BY_CODE = {spec['code']: kind for kind, spec in KINDS.items()}
+
+# Title matches count ten times as much as body matches.
+SQLITE_RANK = 'bm25(tasks_search, 10.0, 1.0)'
+POSTGRES_CONFIG = 'simple'
+
+
+def _concat(columns, prefix=''):
+    return " || ' ' || ".join(f"coalesce({prefix}{column}, '')" for column in columns)
+
+
+def _sqlite_statements():
+    yield ("CREATE VIRTUAL TABLE IF NOT EXISTS tasks_search USING fts5("
+           "title, body, tokenize = 'unicode61 remove_diacritics 2')")
+    for kind, spec in KINDS.items():
+        table, code = spec['table'], spec['code']
+        columns = ', '.join(spec['title'] + spec['body'])
+        insert = (f"INSERT INTO tasks_search(rowid, title, body) VALUES "
+                  f"(new.id * 4 + {code}, {_concat(spec['title'], 'new.')}, {_concat(spec['body'], 'new.')});")
+        delete = f"DELETE FROM tasks_search WHERE rowid = old.id * 4 + {code};"
+        yield f"DROP TRIGGER IF EXISTS {table}_search_ai"
+        yield f"DROP TRIGGER IF EXISTS {table}_search_au"
+        yield f"DROP TRIGGER IF EXISTS {table}_search_ad"
+        yield f"CREATE TRIGGER {table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END"
+        yield f"CREATE TRIGGER {table}_search_au AFTER UPDATE OF {columns} ON {table} BEGIN {delete} {insert} END"
+        yield f"CREATE TRIGGER {table}_search_ad AFTER DELETE ON {table} BEGIN {delete} END"
+    yield "DELETE FROM tasks_search"
+    for kind, spec in KINDS.items():
+        yield (f"INSERT INTO tasks_search(rowid, title, body) "
+               f"SELECT id * 4 + {spec['code']}, {_concat(spec['title'])}, {_concat(spec['body'])} "
+               f"FROM {spec['table']}")
+
+
+def _postgres_document(spec):
+    return f"to_tsvector('{POSTGRES_CONFIG}', {_concat(spec['title'] + spec['body'])})"
+
+
+def _postgres_statements():
+    for kind, spec in KINDS.items():
+        yield (f"CREATE INDEX IF NOT EXISTS {spec['table']}_search_idx ON {spec['table']} "
+               f"USING GIN (({_postgres_document(spec)}))")
+
+
+def install(conn=connection):
+    """Create (or recreate and repopulate) the search index for ``conn``'s backend."""
+    if conn.vendor == 'sqlite':
+        statements = _sqlite_statements()
+    elif conn.vendor == 'postgresql':
+        statements = _postgres_statements()
+    else:
+        return
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def uninstall(conn=connection):
+    with conn.cursor() as cursor:
+        for spec in KINDS.values():
+            table = spec['table']
+            if conn.vendor == 'sqlite':
+                for suffix in ('ai', 'au', 'ad'):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {table}_search_{suffix}")
+            elif conn.vendor == 'postgresql':
+                cursor.execute(f"DROP INDEX IF EXISTS {table}_search_idx")
+        if conn.vendor == 'sqlite':
+            cursor.execute("DROP TABLE IF EXISTS tasks_search")
+
+
+def terms(query):
+    return re.findall(r'\w+', query)[:16]
+
+
+def search(query, kinds=None, limit=20, offset=0):
+    """
+    Ranked matches for every word of ``query`` (as prefixes), best first.
+
+    Returns ``limit`` dicts with ``type``, ``id``, ``title``, ``snippet`` and
+    ``rank``; pass ``limit + 1`` to find out whether there are more.
+    """
+    words = terms(query)
+    kinds = list(kinds or KINDS)
+    unknown = set(kinds).difference(KINDS)
+    if unknown:
+        raise ValueError(f'Unknown search types: {", ".join(sorted(unknown))}')
+    if not words:
+        return []
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(words, kinds, limit, offset)
+    if connection.vendor == 'postgresql':
+        return _search_postgres(words, kinds, limit, offset)
+    return _search_fallback(words, kinds, limit, offset)
+
+
+def _search_sqlite(words, kinds, limit, offset):
+    match = ' '.join(f'"{word}"*' for word in words)
+    codes = ', '.join(str(KINDS[kind]['code']) for kind in kinds)
+    sql = (
+        f"SELECT rowid, title, snippet(tasks_search, 1, '[', ']', '…', 12), {SQLITE_RANK} AS rank "
+        f"FROM tasks_search WHERE tasks_search MATCH %s AND rowid %% 4 IN ({codes}) "
+        f"ORDER BY rank LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, limit, offset])
+        rows = cursor.fetchall()
+    return [
+        {'type': KIND_BY_CODE[rowid % 4], 'id': rowid // 4, 'title': title,
+         'snippet': snippet, 'rank': -rank}
+        for rowid, title, snippet, rank in rows
+    ]
+
+
+def _search_postgres(words, kinds, limit, offset):
+    tsquery = ' & '.join(f"{word}:*" for word in words)
+    parts = []
+    params = []
+    for kind in kinds:
+        spec = KINDS[kind]
+        document = _postgres_document(spec)
+        parts.append(
+            f"SELECT '{kind}' AS type, id, {_concat(spec['title'])} AS title, "
+            f"ts_headline('{POSTGRES_CONFIG}', {_concat(spec['body'])}, q, "
+            f"'StartSel=[, StopSel=], MaxFragments=1, MaxWords=12, MinWords=3') AS snippet, "
+            f"ts_rank({document}, q) AS rank "
+            f"FROM {spec['table']}, to_tsquery('{POSTGRES_CONFIG}', %s) q WHERE {document} @@ q"
+        )
+        params.append(tsquery)
+    sql = ' UNION ALL '.join(parts) + ' ORDER BY rank DESC, id LIMIT %s OFFSET %s'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit, offset])
+        rows = cursor.fetchall()
+    return [
+        {'type': kind, 'id': pk, 'title': title, 'snippet': snippet, 'rank': rank}
+        for kind, pk, title, snippet, rank in rows
+    ]
+
+
+def _search_fallback(words, kinds, limit, offset):
+    results = []
+    for kind in kinds:
+        spec = KINDS[kind]
+        condition = Q()
+        for word in words:
+            condition &= Q(*[Q(**{f'{column}__icontains': word}) for column in spec['title'] + spec['body']],
+                           _connector=Q.OR)
+        for row in spec['model'].objects.filter(condition).values('id', *spec['title'])[:offset + limit]:
+            title = ' '.join(row[column] for column in spec['title'])
+            results.append({'type': kind, 'id': row['id'], 'title': title, 'snippet': '', 'rank': 0})
+    return results[offset:offset + limit]
@@ -0,0 +1,205 @@
+"""
+Synthetic CRM data for benchmarks and local load testing.
+
+Relationships are skewed the way real CRMs are: a few large accounts hold
+most of the contacts and deals, a few users are assigned most of the tasks,
+and most deals are still early in the pipeline. Picks use ``n * u ** skew``
+for a uniform ``u``, which puts that weight on the low indexes without
+building a weight table per row. Rows are written with ``bulk_create`` in
+batches. Derived data (pipeline rollup, overdue flags, cache versions,
+table statistics) is brought up to date at the end. The search index
+follows through its triggers.
+"""
+import contextlib
+import random
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import pipeline, versions
+from .models import Company, Contact, Deal, Task
+
+FIRST_NAMES = ['Ada', 'Alan', 'Grace', 'Linus', 'Margaret', 'Dennis', 'Barbara', 'Ken', 'Frances', 'John',
+               'Radia', 'Edsger', 'Katherine', 'Donald', 'Hedy', 'Tim', 'Sophie', 'Guido', 'Anita', 'Bjarne']
+LAST_NAMES = ['Lovelace', 'Turing', 'Hopper', 'Torvalds', 'Hamilton', 'Ritchie', 'Liskov', 'Thompson',
+              'Allen', 'McCarthy', 'Perlman', 'Dijkstra', 'Johnson', 'Knuth', 'Lamarr', 'Berners-Lee',
+              'Wilson', 'van Rossum', 'Borg', 'Stroustrup']
+INDUSTRIES = ['Software', 'Finance', 'Healthcare', 'Retail', 'Manufacturing', 'Logistics', 'Education',
+              'Media', 'Energy', 'Hospitality']
+POSITIONS = ['CEO', 'CTO', 'VP Sales', 'Head of Operations', 'Engineer', 'Buyer', 'Office Manager', '']
+WORDS = ['renewal', 'pilot', 'expansion', 'migration', 'licence', 'support', 'onboarding', 'integration',
+         'upgrade', 'audit', 'rollout', 'training']
+# Most deals are early in the pipeline.
+STAGE_WEIGHTS = {'lead': 35, 'qualified': 25, 'proposal': 15, 'negotiation': 10, 'won': 10, 'lost': 5}
+UNUSABLE = make_password(None)
+STAGE_PROBABILITY = {'lead': 10, 'qualified': 25, 'proposal': 50, 'negotiation': 75, 'won': 100, 'lost': 0}
+
+
+def skewed(rng, n, skew=3.0):
+    """An index in ``range(n)``, heavily favouring the low ones."""
+    return min(int(n * rng.random() ** skew), n - 1)
+
+
+@contextlib.contextmanager
+def explicit_timestamps(*models):
+    """Let ``created_at``/``updated_at`` be set by the caller, for a spread of dates."""
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Seeder:
+    def __init__(self, seed=0, users=20, days=730, batch_size=5000, progress=None):
+        self.rng = random.Random(seed)
+        self.user_count = users
+        self.days = days
+        self.batch_size = batch_size
+        self.progress = progress
+        self.now = timezone.now()
+
+    def timestamp(self):
+        # Newer rows are more common, as in a growing business.
+        return self.now - timedelta(seconds=int(self.days * 86400 * self.rng.random() ** 2))
+
+    def insert(self, model, objs):
+        ids = array('q')
+        batch = []
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                ids.extend(self.write(model, batch))
+                batch = []
+        if batch:
+            ids.extend(self.write(model, batch))
+        return ids
+
+    def write(self, model, batch):
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+        if self.progress:
+            self.progress(model, len(batch))
+        return [obj.pk for obj in batch]
+
+    def users(self):
+        existing = list(User.objects.filter(username__startswith='seed-user-').values_list('pk', flat=True))
+        new = [User(username=f'seed-user-{i}', first_name=FIRST_NAMES[i % len(FIRST_NAMES)], password=UNUSABLE)
+               for i in range(len(existing), self.user_count)]
+        User.objects.bulk_create(new)
+        return existing + [user.pk for user in new]
+
+    def run(self, companies, contacts, deals, tasks):
+        users = self.users()
+        with explicit_timestamps(Company, Contact, Deal, Task):
+            company_ids = self.insert(Company, self.companies(companies, users))
+            contact_ids, contact_companies = self.contacts(contacts, company_ids, users)
+            deal_ids, deal_contacts = self.deals(deals, company_ids, contact_ids, contact_companies, users)
+            self.insert(Task, self.tasks(tasks, contact_ids, deal_ids, deal_contacts, users))
+        pipeline.rebuild()
+        versions.bump_on_commit(Company, Contact, Deal, Task, User)
+        # Fresh statistics for the planner and for estimated counts.
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return {'companies': len(company_ids), 'contacts': len(contact_ids), 'deals': len(deal_ids), 'tasks': tasks}
+
+    def companies(self, n, users):
+        rng = self.rng
+        for i in range(n):
+            created = self.timestamp()
+            word = rng.choice(WORDS).title()
+            yield Company(
+                name=f'{rng.choice(LAST_NAMES)} {word} {i}', industry=rng.choice(INDUSTRIES),
+                website=f'https://company{i}.example.com', email=f'info@company{i}.example.com',
+                phone=f'+1 555 {rng.randrange(10 ** 7):07d}', notes=' '.join(rng.choices(WORDS, k=8)),
+                created_at=created, updated_at=created, created_by_id=rng.choice(users),
+            )
+
+    def contacts(self, n, company_ids, users):
+        rng = self.rng
+        # Emails are unique; number them past whatever is already there.
+        offset = (Contact.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        companies = array('q')
+
+        def build():
+            for i in range(n):
+                # One in ten contacts isn't linked to a company.
+                company = company_ids[skewed(rng, len(company_ids))] if company_ids and rng.random() > 0.1 else 0
+                companies.append(company)
+                created = self.timestamp()
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                yield Contact(
+                    first_name=first, last_name=last, email=f'{first}.{i + offset}@example.com'.lower(),
+                    phone=f'+1 555 {rng.randrange(10 ** 7):07d}', position=rng.choice(POSITIONS),
+                    company_id=company or None, notes=' '.join(rng.choices(WORDS, k=rng.randrange(0, 20))),
+                    created_at=created, updated_at=created, created_by_id=rng.choice(users),
+                )
+
+        return self.insert(Contact, build()), companies
+
+    def deals(self, n, company_ids, contact_ids, contact_companies, users):
+        rng = self.rng
+        contacts = array('q')
+        stages = list(STAGE_WEIGHTS)
+        weights = list(STAGE_WEIGHTS.values())
+
+        def build():
+            for _ in range(n):
+                # Deals follow the busiest contacts, and so their companies.
+                index = skewed(rng, len(contact_ids)) if contact_ids else None
+                company = contact_companies[index] if index is not None else 0
+                contact = contact_ids[index] if company and rng.random() > 0.2 else 0
+                if not company:
+                    company = company_ids[skewed(rng, len(company_ids))]
+                contacts.append(contact)
+                stage = rng.choices(stages, weights)[0]
+                created = self.timestamp()
+                yield Deal(
+                    title=f'{rng.choice(WORDS).title()} {rng.choice(WORDS)}',
+                    amount=Decimal(int(rng.lognormvariate(9, 1.2) * 100)) / 100,
+                    stage=stage, probability=STAGE_PROBABILITY[stage],
+                    expected_close_date=(created + timedelta(days=rng.randrange(7, 180))).date(),
+                    company_id=company, contact_id=contact or None,
+                    notes=' '.join(rng.choices(WORDS, k=rng.randrange(0, 12))),
+                    created_at=created, updated_at=created, created_by_id=rng.choice(users),
+                )
+
+        return self.insert(Deal, build()), contacts
+
+    def tasks(self, n, contact_ids, deal_ids, deal_contacts, users):
+        rng = self.rng
+        statuses = ['pending', 'in_progress', 'completed']
+        recent = self.now - timedelta(days=60)
+        for _ in range(n):
+            deal = contact = None
+            if deal_ids and rng.random() < 0.7:
+                index = skewed(rng, len(deal_ids))
+                deal, contact = deal_ids[index], deal_contacts[index] or None
+            elif contact_ids:
+                contact = contact_ids[skewed(rng, len(contact_ids))]
+            created = self.timestamp()
+            # Older tasks have mostly been dealt with.
+            status_weights = [40, 15, 45] if created > recent else [5, 5, 90]
+            task = Task(
+                title=f'{rng.choice(["Call", "Email", "Meet", "Send proposal to", "Follow up with"])} '
+                      f'{rng.choice(FIRST_NAMES)}',
+                status=rng.choices(statuses, status_weights)[0],
+                priority=rng.choices(['low', 'medium', 'high'], [30, 50, 20])[0],
+                due_date=created + timedelta(days=rng.randrange(-5, 30)) if rng.random() < 0.9 else None,
+                contact_id=contact, deal_id=deal,
+                assigned_to_id=users[skewed(rng, len(users), skew=2.0)] if rng.random() < 0.95 else None,
+                created_at=created, updated_at=created, created_by_id=rng.choice(users),
+            )
+            task.sync_derived_fields(self.now)
+            yield task
@@ -1,16 +1,18 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Company, Contact, Deal, Task
+from django.urls import reverse
+from .metrics import TimedSerializerMixin
+from .models import Company, Contact, Deal, ImportJob, Job, Task
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
         read_only_fields = ['id']
 
 
-class CompanySerializer(serializers.ModelSerializer):
+class CompanySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
     contacts_count = serializers.SerializerMethodField()
     deals_count = serializers.SerializerMethodField()
@@ -21,15 +23,22 @@ class CompanySerializer(serializers.ModelSerializer):
                   'notes', 'created_at', 'updated_at', 'created_by', 'created_by_name',
                   'contacts_count', 'deals_count']
         read_only_fields = ['id', 'created_at', 'updated_at', 'created_by']
+        count_fields = {'contacts_count': 'contacts', 'deals_count': 'deals'}
 
+    # Querysets planned by the viewset carry these as annotations; freshly
+    # created instances don't, so fall back to counting.
     def get_contacts_count(self, obj):
+        if hasattr(obj, 'contacts_count'):
+            return obj.contacts_count
         return obj.contacts.count()
 
     def get_deals_count(self, obj):
+        if hasattr(obj, 'deals_count'):
+            return obj.deals_count
         return obj.deals.count()
 
 
-class ContactSerializer(serializers.ModelSerializer):
+class ContactSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     full_name = serializers.ReadOnlyField()
     company_name = serializers.CharField(source='company.name', read_only=True)
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
@@ -42,7 +51,7 @@ class ContactSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'created_by', 'full_name']
 
 
-class DealSerializer(serializers.ModelSerializer):
+class DealSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     company_name = serializers.CharField(source='company.name', read_only=True)
     contact_name = serializers.CharField(source='contact.full_name', read_only=True)
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
@@ -55,7 +64,7 @@ class DealSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'created_by']
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     contact_name = serializers.CharField(source='contact.full_name', read_only=True)
     deal_title = serializers.CharField(source='deal.title', read_only=True)
     assigned_to_name = serializers.CharField(source='assigned_to.username', read_only=True)
@@ -65,6 +74,41 @@ class TaskSerializer(serializers.ModelSerializer):
         model = Task
         fields = ['id', 'title', 'description', 'status', 'priority', 'due_date',
                   'contact', 'contact_name', 'deal', 'deal_title', 'assigned_to',
-                  'assigned_to_name', 'created_at', 'updated_at', 'created_by',
+                  'assigned_to_name', 'is_overdue', 'created_at', 'updated_at', 'created_by',
                   'created_by_name']
-        read_only_fields = ['id', 'created_at', 'updated_at', 'created_by']
+        read_only_fields = ['id', 'is_overdue', 'created_at', 'updated_at', 'created_by']
+
+
+class ImportJobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    file = serializers.FileField(write_only=True)
+
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'kind', 'file', 'status', 'rows_processed', 'created_count',
+                  'skipped_count', 'errors', 'created_at', 'updated_at', 'created_by']
+        read_only_fields = ['id', 'status', 'rows_processed', 'created_count', 'skipped_count',
+                            'errors', 'created_at', 'updated_at', 'created_by']
+
+
+class JobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Plain URLs: DRF's reverse() would carry an export's ?format=csv over.
+    url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ['id', 'url', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'started_at',
+                  'finished_at', 'duration', 'last_error', 'result', 'download_url', 'created_at']
+        read_only_fields = fields
+
+    def absolute_url(self, path):
+        request = self.context.get('request')
+        return request.build_absolute_uri(path) if request is not None else path
+
+    def get_url(self, obj):
+        return self.absolute_url(reverse('job-detail', args=[obj.pk]))
+
+    def get_download_url(self, obj):
+        if obj.status != 'succeeded' or not obj.output:
+            return None
+        return self.absolute_url(reverse('job-download', args=[obj.pk]))
@@ -0,0 +1,55 @@
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from rest_framework.authtoken.models import Token
+
+from . import changes, versions
+from .authentication import token_cache
+from .models import Company, Contact, Deal, Task
+
+# User is here for the usernames the CRM serializers render.
+VERSIONED_MODELS = (Company, Contact, Deal, Task, User)
+
+
+def _bump_version(sender, **kwargs):
+    versions.bump_on_commit(sender)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(_bump_version, sender=model, dispatch_uid=f'version-save-{model.__name__}')
+    post_delete.connect(_bump_version, sender=model, dispatch_uid=f'version-delete-{model.__name__}')
+
+
+def _log_save(sender, instance, **kwargs):
+    changes.record(sender, [instance.pk])
+
+
+def _log_delete(sender, instance, **kwargs):
+    changes.record(sender, [instance.pk], 'deleted')
+
+
+def _log_set_null(sender, instance, **kwargs):
+    # The collector nulls these foreign keys with an UPDATE, which sends no signals.
+    for model, ids in changes.set_null_dependents(instance):
+        changes.record(model, ids)
+
+
+for model in changes.TRACKED:
+    post_save.connect(_log_save, sender=model, dispatch_uid=f'change-save-{model.__name__}')
+    post_delete.connect(_log_delete, sender=model, dispatch_uid=f'change-delete-{model.__name__}')
+    pre_delete.connect(_log_set_null, sender=model, dispatch_uid=f'change-set-null-{model.__name__}')
+
+
+def _invalidate_user_tokens(sender, instance, **kwargs):
+    # Cached users would otherwise keep their old is_active for the TTL.
+    transaction.on_commit(partial(token_cache.invalidate_user, instance.pk))
+
+
+def _invalidate_token(sender, instance, **kwargs):
+    transaction.on_commit(partial(token_cache.invalidate, instance.key))
+
+
+post_save.connect(_invalidate_user_tokens, sender=User, dispatch_uid='token-cache-user-save')
+post_delete.connect(_invalidate_token, sender=Token, dispatch_uid='token-cache-token-delete')
@@ -1,3 +1,1660 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import re
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection, models
+from django.db.models import Count, F, Min
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import archive, changes, counts, jobs, metrics, pipeline, search, throttling
+from .authentication import token_cache
+from .importer import Importer
+from .models import ArchivedDeal, ArchivedTask, Change, Company, Contact, Deal, ImportJob, Job, PipelineRollup, Task
+from .rows import RowPlan
+from .serializers import CompanySerializer, ContactSerializer, DealSerializer, TaskSerializer
+from .urls import api_urlpatterns
+
+# The async routing that config/asgi.py switches on, for AsyncReadTests.
+urlpatterns = [path('api/', include(api_urlpatterns(async_views=True)))]
+
+
+class CRMTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttling.buckets.clear()
+        self.user = User.objects.create_user('demo', password='demo123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.counter = 0
+
+    def make_rows(self, n):
+        """Create ``n`` fully-linked rows in every table."""
+        for _ in range(n):
+            self.counter += 1
+            i = self.counter
+            company = Company.objects.create(name=f'Company {i}', created_by=self.user)
+            contact = Contact.objects.create(
+                first_name='First', last_name=f'Last {i}', email=f'contact{i}@example.com',
+                company=company, created_by=self.user,
+            )
+            deal = Deal.objects.create(
+                title=f'Deal {i}', amount=Decimal('1000.00'), company=company,
+                contact=contact, created_by=self.user,
+            )
+            Task.objects.create(
+                title=f'Task {i}', contact=contact, deal=deal, assigned_to=self.user,
+                due_date=timezone.now(), created_by=self.user,
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx.captured_queries)
+
+
+class SeedCrmTests(CRMTestCase):
+    def seed(self, **options):
+        counts = {'companies': 20, 'contacts': 200, 'deals': 100, 'tasks': 400, 'users': 5, **options}
+        call_command('seed_crm', stdout=StringIO(), **counts)
+
+    def test_counts_and_derived_data(self):
+        self.seed()
+        self.assertEqual((Company.objects.count(), Contact.objects.count(), Deal.objects.count(),
+                          Task.objects.count()), (20, 200, 100, 400))
+        self.assertEqual(pipeline.verify(), {})
+        for task in Task.objects.all():
+            self.assertEqual(task.is_overdue, task.status in Task.OPEN_STATUSES and task.due_date is not None
+                             and task.due_date < timezone.now(), task.pk)
+        # A deal's contact, when it has one, works at the deal's company.
+        self.assertFalse(Deal.objects.exclude(contact=None).exclude(contact__company=F('company')).exists())
+        # Timestamps are spread out rather than all "now".
+        self.assertLess(Contact.objects.aggregate(first=Min('created_at'))['first'],
+                        timezone.now() - timedelta(days=30))
+
+    def test_relationships_are_skewed(self):
+        self.seed()
+        sizes = sorted(Company.objects.annotate(n=Count('contacts')).values_list('n', flat=True), reverse=True)
+        # The biggest account holds far more than an even share.
+        self.assertGreater(sizes[0], 5 * sum(sizes) / len(sizes))
+
+    def test_same_seed_same_data(self):
+        def deals():
+            return list(Deal.objects.order_by('pk').values_list('title', 'amount', 'stage', 'created_at__date'))
+
+        self.seed(seed=7)
+        first = deals()
+        for model in (Task, Deal, Contact, Company):
+            model.objects.all().delete()
+        self.seed(seed=7)
+        self.assertEqual(deals(), first)
+
+    def test_reruns_add_rows(self):
+        self.seed()
+        self.seed()
+        self.assertEqual(Contact.objects.count(), 400)
+        self.assertEqual(User.objects.filter(username__startswith='seed-user-').count(), 5)
+
+    def test_rejects_deals_without_companies(self):
+        with self.assertRaises(CommandError):
+            self.seed(companies=0)
+
+
+class ListQueryCountTests(CRMTestCase):
+    endpoints = ['/api/companies/', '/api/contacts/', '/api/deals/', '/api/tasks/']
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        self.make_rows(2)
+        small = {url: self.count_queries(url) for url in self.endpoints}
+        self.make_rows(10)
+        for url in self.endpoints:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), small[url])
+
+    def test_list_output_matches_related_rows(self):
+        self.make_rows(1)
+        company = self.client.get('/api/companies/').data['results'][0]
+        self.assertEqual(company['contacts_count'], 1)
+        self.assertEqual(company['deals_count'], 1)
+        self.assertEqual(company['created_by_name'], 'demo')
+
+        task = self.client.get('/api/tasks/').data['results'][0]
+        self.assertEqual(task['contact_name'], 'First Last 1')
+        self.assertEqual(task['deal_title'], 'Deal 1')
+        self.assertEqual(task['assigned_to_name'], 'demo')
+
+    def test_create_reports_counts_without_annotation(self):
+        response = self.client.post('/api/companies/', {'name': 'Fresh'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['contacts_count'], 0)
+
+    def test_company_list_keeps_default_ordering(self):
+        self.make_rows(3)
+        names = [row['name'] for row in self.client.get('/api/companies/').data['results']]
+        self.assertEqual(names, ['Company 3', 'Company 2', 'Company 1'])
+
+
+class PaginationTests(CRMTestCase):
+    def walk(self, url):
+        titles = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            titles.extend(row['title'] for row in response.data['results'])
+            url = response.data['next']
+        return titles
+
+    def test_cursor_walks_every_row_once_in_order(self):
+        self.make_rows(7)
+        titles = self.walk('/api/deals/?page_size=3')
+        self.assertEqual(titles, [f'Deal {i}' for i in range(7, 0, -1)])
+
+    def test_ties_on_created_at_are_broken_by_id(self):
+        self.make_rows(5)
+        Deal.objects.update(created_at=timezone.now())
+        titles = self.walk('/api/deals/?page_size=2')
+        self.assertEqual(titles, [f'Deal {i}' for i in range(1, 6)])
+
+    def test_previous_link_returns_preceding_page(self):
+        self.make_rows(5)
+        first = self.client.get('/api/deals/?page_size=2').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+
+    def test_ordering_whitelist(self):
+        self.make_rows(3)
+        Deal.objects.filter(title='Deal 2').update(amount=Decimal('5.00'))
+        response = self.client.get('/api/deals/?ordering=amount&page_size=1')
+        self.assertEqual(response.data['results'][0]['title'], 'Deal 2')
+        response = self.client.get('/api/deals/?ordering=notes')
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/api/deals/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def test_wrongly_typed_cursor_value_is_not_found(self):
+        self.make_rows(1)
+        company = Company.objects.get()
+
+        def cursor(ordering, value):
+            payload = json.dumps({'o': ordering, 'r': False, 'v': value, 'id': 1}).encode()
+            return urlsafe_b64encode(payload).decode()
+
+        for url in [f'/api/deals/?cursor={cursor("-created_at", "abc")}',
+                    f'/api/deals/?ordering=amount&cursor={cursor("amount", "abc")}',
+                    f'/api/companies/{company.pk}/timeline/?cursor={cursor("-updated_at", "abc")}']:
+            cache.clear()
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+        cache.clear()
+        url = f'/api/deals/?ordering=amount&cursor={cursor("amount", "5.00")}'
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class FilterTests(CRMTestCase):
+    def test_deal_stage_filter(self):
+        self.make_rows(3)
+        Deal.objects.filter(title='Deal 1').update(stage='won')
+        response = self.client.get('/api/deals/?stage=won')
+        self.assertEqual([row['title'] for row in response.data['results']], ['Deal 1'])
+
+    def test_task_due_date_range(self):
+        self.make_rows(3)
+        now = timezone.now()
+        Task.objects.filter(title='Task 1').update(due_date=now - timedelta(days=10))
+        response = self.client.get('/api/tasks/', {'due_date_before': (now - timedelta(days=1)).isoformat()})
+        self.assertEqual([row['title'] for row in response.data['results']], ['Task 1'])
+
+    def test_contact_company_filter(self):
+        self.make_rows(2)
+        company = Company.objects.get(name='Company 2')
+        response = self.client.get(f'/api/contacts/?company={company.pk}')
+        self.assertEqual([row['company'] for row in response.data['results']], [company.pk])
+
+    def test_invalid_filter_values_are_rejected(self):
+        self.assertEqual(self.client.get('/api/deals/?stage=bogus').status_code, 400)
+        self.assertEqual(self.client.get('/api/tasks/?assigned_to=abc').status_code, 400)
+        self.assertEqual(self.client.get('/api/tasks/?due_date_after=tomorrow').status_code, 400)
+
+
+class WorkQueueTests(CRMTestCase):
+    def make_task(self, title, **kwargs):
+        return Task.objects.create(title=title, assigned_to=self.user, **kwargs)
+
+    def test_orders_open_tasks_by_urgency(self):
+        now = timezone.now()
+        self.make_task('undated high', priority='high')
+        self.make_task('soon low', priority='low', due_date=now + timedelta(days=1))
+        self.make_task('later high', priority='high', due_date=now + timedelta(days=5))
+        self.make_task('soon high', priority='high', due_date=now + timedelta(days=1))
+        self.make_task('overdue low', priority='low', due_date=now - timedelta(days=1))
+        self.make_task('overdue high', priority='high', due_date=now - timedelta(hours=1))
+        self.make_task('done', priority='high', status='completed', due_date=now - timedelta(days=1))
+        Task.objects.create(title='not mine', priority='high', due_date=now - timedelta(days=2))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/tasks/mine/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual([task['title'] for task in json.loads(response.content)['results']], [
+            'overdue high', 'overdue low', 'soon high', 'later high', 'soon low', 'undated high',
+        ])
+        self.assertEqual(response.data['counts'],
+                         {'pending': 6, 'in_progress': 0, 'completed': 1, 'overdue': 2})
+        self.assertEqual(list(response.data), ['counts', 'results'])
+
+        response = self.client.get('/api/tasks/mine/?page_size=2&priority=high&fields=id,title')
+        self.assertEqual(response.data['results'], [
+            {'id': Task.objects.get(title=title).pk, 'title': title} for title in ['overdue high', 'soon high']
+        ])
+
+    def test_rank_follows_writes_and_sweep(self):
+        task = self.make_task('t', priority='low', due_date=timezone.now() + timedelta(days=1))
+        self.assertEqual(task.priority_rank, 5)
+        self.client.patch(f'/api/tasks/{task.pk}/', {'priority': 'high'}, format='json')
+        self.assertEqual(Task.objects.get(pk=task.pk).priority_rank, 3)
+        self.client.patch('/api/tasks/bulk/', [{'id': task.pk, 'due_date': None}], format='json')
+        self.assertEqual(Task.objects.get(pk=task.pk).priority_rank, 6)
+
+        Task.objects.filter(pk=task.pk).update(due_date=timezone.now() - timedelta(minutes=1))
+        jobs.sweep_overdue_tasks()
+        self.assertEqual(Task.objects.get(pk=task.pk).priority_rank, 0)
+        Task.objects.filter(pk=task.pk).update(due_date=timezone.now() + timedelta(days=1))
+        jobs.sweep_overdue_tasks()
+        self.assertEqual(Task.objects.get(pk=task.pk).priority_rank, 3)
+
+        self.client.patch(f'/api/tasks/{task.pk}/', {'status': 'completed'}, format='json')
+        self.assertIsNone(Task.objects.get(pk=task.pk).priority_rank)
+        self.assertEqual(self.client.get('/api/tasks/mine/').data['results'], [])
+
+
+class CountTests(CRMTestCase):
+    def test_list_count_is_opt_in(self):
+        self.make_rows(3)
+        self.assertNotIn('count', self.client.get('/api/tasks/').data)
+        data = self.client.get('/api/tasks/?count=1&page_size=2').data
+        self.assertEqual((data['count'], data['count_exact'], len(data['results'])), (3, True, 2))
+        Task.objects.filter(title='Task 2').update(status='completed')
+        data = self.client.get('/api/tasks/?count=true&status=completed').data
+        self.assertEqual(data['count'], 1)
+
+    @override_settings(COUNTS={'EXACT_THRESHOLD': 2, 'CACHE_TIMEOUT': 60})
+    def test_large_counts_are_estimated(self):
+        self.make_rows(4)
+        # No statistics yet: an exact count, cached.
+        self.assertEqual(counts.count(Task.objects.all()), (4, False))
+        self.make_rows(1)
+        self.assertEqual(counts.count(Task.objects.all()), (4, False))
+        self.assertEqual(counts.count(Task.objects.filter(priority='medium')), (5, False))
+        self.assertEqual(counts.count(Task.objects.filter(title='Task 1')), (1, True))
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.make_rows(1)
+        # Table statistics lag behind writes until the next ANALYZE.
+        self.assertEqual(counts.count(Task.objects.all()), (5, False))
+        data = self.client.get('/api/tasks/?count=1').data
+        self.assertEqual((data['count'], data['count_exact']), (5, False))
+
+    @override_settings(COUNTS={'EXACT_THRESHOLD': 5, 'CACHE_TIMEOUT': 60})
+    def test_admin_changelists_skip_full_counts(self):
+        admin_user = User.objects.create_superuser('admin', password='admin123')
+        self.client.force_login(admin_user)
+        self.make_rows(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        query_counts = {}
+        for rows in (3, 12):
+            self.make_rows(rows - Task.objects.count())
+            for url in ('/admin/tasks/task/', '/admin/tasks/contact/', '/admin/tasks/deal/'):
+                cache.clear()
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                queries = [q['sql'] for q in ctx.captured_queries]
+                self.assertFalse([sql for sql in queries
+                                  if re.match(r'SELECT COUNT\(\*\) AS "__count" FROM "tasks_\w+"$', sql)])
+                query_counts.setdefault(url, set()).add(
+                    len([sql for sql in queries if 'COUNT(' not in sql and 'sqlite_stat1' not in sql]))
+        # Related columns are joined, not fetched per row.
+        for url, seen in query_counts.items():
+            self.assertEqual(len(seen), 1, url)
+
+
+class DashboardTests(CRMTestCase):
+    def test_stats(self):
+        self.make_rows(3)
+        Deal.objects.filter(title='Deal 1').update(stage='won', amount=Decimal('250.00'))
+        Task.objects.update(due_date=timezone.now() + timedelta(days=1))
+        Task.objects.filter(title='Task 1').update(due_date=timezone.now() - timedelta(days=1))
+        Task.objects.filter(title='Task 2').update(status='completed')
+        # Raw updates skip Task.save(), so the flag waits for the sweep.
+        jobs.sweep_overdue_tasks()
+
+        stats = self.client.get('/api/dashboard/stats/').data
+        self.assertEqual(stats['total_companies'], 3)
+        self.assertEqual(stats['total_deals'], 3)
+        self.assertEqual(stats['deals_by_stage'], [{'stage': 'lead', 'count': 2}, {'stage': 'won', 'count': 1}])
+        self.assertEqual(stats['total_deal_value'], Decimal('2250.00'))
+        self.assertEqual(stats['won_deals_value'], Decimal('250.00'))
+        self.assertEqual(stats['pending_tasks'], 2)
+        self.assertEqual(stats['overdue_tasks'], 1)
+
+    def test_one_query_per_table_then_cached(self):
+        self.make_rows(2)
+        # Plus one for the archive totals.
+        self.assertLessEqual(self.count_queries('/api/dashboard/stats/'), 5)
+        self.assertEqual(self.count_queries('/api/dashboard/stats/'), 0)
+
+    def test_writes_invalidate_snapshot(self):
+        self.assertEqual(self.client.get('/api/dashboard/stats/').data['total_companies'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_rows(1)
+        self.assertEqual(self.client.get('/api/dashboard/stats/').data['total_companies'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Company.objects.all().delete()
+        self.assertEqual(self.client.get('/api/dashboard/stats/').data['total_companies'], 0)
+
+
+class PipelineRollupTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.company = Company.objects.create(name='Acme')
+
+    def create_deal(self, **data):
+        data = {'title': 'Deal', 'amount': '1000.00', 'probability': 50,
+                'company': self.company.pk, **data}
+        response = self.client.post('/api/deals/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.data['id']
+
+    def test_writes_keep_rollup_in_sync(self):
+        deal_id = self.create_deal(expected_close_date='2026-03-15')
+        self.create_deal(amount='500.00', probability=20)
+        self.client.patch(f'/api/deals/{deal_id}/', {'stage': 'won', 'probability': 100}, format='json')
+        self.assertEqual(pipeline.verify(), {})
+
+        row = PipelineRollup.objects.get(stage='won', month='2026-03')
+        self.assertEqual((row.deal_count, row.total_amount, row.weighted_amount),
+                         (1, Decimal('1000.00'), Decimal('1000.00')))
+        self.assertEqual(PipelineRollup.objects.get(stage='lead', month='2026-03').deal_count, 0)
+
+        self.client.delete(f'/api/deals/{deal_id}/')
+        self.client.delete(f'/api/companies/{self.company.pk}/')
+        self.assertEqual(pipeline.verify(), {})
+        self.assertFalse(PipelineRollup.objects.exclude(deal_count=0).exists())
+
+    def test_admin_writes_keep_rollup_in_sync(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin123'))
+        form = {'title': 'Admin deal', 'amount': '400.00', 'stage': 'lead', 'probability': 25,
+                'company': self.company.pk, 'created_by': self.user.pk}
+        response = self.client.post('/admin/tasks/deal/add/', form)
+        self.assertEqual(response.status_code, 302, response.content)
+        deal = Deal.objects.get(title='Admin deal')
+        self.client.post(f'/admin/tasks/deal/{deal.pk}/change/', {**form, 'stage': 'won', 'probability': 100})
+        self.assertEqual(Deal.objects.get(pk=deal.pk).stage, 'won')
+        self.assertEqual(PipelineRollup.objects.get(stage='won').total_amount, Decimal('400.00'))
+        self.assertEqual(pipeline.verify(), {})
+
+        self.client.post(f'/admin/tasks/deal/{deal.pk}/delete/', {'post': 'yes'})
+        self.create_deal()
+        self.client.post('/admin/tasks/deal/', {'action': 'delete_selected', 'post': 'yes',
+                                                '_selected_action': list(Deal.objects.values_list('pk', flat=True))})
+        self.assertFalse(Deal.objects.exists())
+        self.assertEqual(pipeline.verify(), {})
+
+        self.create_deal()
+        self.client.post(f'/admin/tasks/company/{self.company.pk}/delete/', {'post': 'yes'})
+        self.assertFalse(Deal.objects.exists())
+        self.assertEqual(pipeline.verify(), {})
+
+    def test_summary_endpoint(self):
+        self.create_deal(expected_close_date='2026-03-15')
+        self.create_deal(stage='proposal', amount='300.00', probability=10)
+        response = self.client.get('/api/dashboard/pipeline/')
+        by_stage = {row['stage']: row for row in response.data['by_stage']}
+        self.assertEqual(by_stage['lead']['weighted_amount'], Decimal('500.00'))
+        self.assertEqual(by_stage['proposal']['count'], 1)
+        self.assertEqual([row['month'] for row in response.data['by_month']], [None, '2026-03'])
+
+    def test_rebuild_and_verify_command(self):
+        self.create_deal()
+        PipelineRollup.objects.update(deal_count=7)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_pipeline', '--verify', stderr=StringIO())
+        call_command('rebuild_pipeline', stdout=StringIO())
+        call_command('rebuild_pipeline', '--verify', stdout=StringIO())
+
+
+class BulkTests(CRMTestCase):
+    def test_bulk_create_validates_in_batch(self):
+        company = Company.objects.create(name='Acme')
+        Contact.objects.create(first_name='Old', last_name='Timer', email='taken@example.com')
+        items = [
+            {'first_name': f'F{i}', 'last_name': 'L', 'email': f'c{i}@example.com', 'company': company.pk}
+            for i in range(20)
+        ] + [
+            {'first_name': 'Dup', 'last_name': 'L', 'email': 'taken@example.com'},
+            {'first_name': 'Twin', 'last_name': 'L', 'email': 'c0@example.com'},
+            {'first_name': 'Bad', 'last_name': 'L', 'email': 'bad@example.com', 'company': 999},
+            {'last_name': 'L', 'email': 'missing@example.com'},
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/contacts/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(response.data['created']), 20)
+        self.assertEqual([error['index'] for error in response.data['errors']], [20, 21, 22, 23])
+        self.assertIn('email', response.data['errors'][0]['errors'])
+        self.assertIn('company', response.data['errors'][2]['errors'])
+        self.assertLess(len(ctx.captured_queries), 10)
+        self.assertEqual(Contact.objects.filter(created_by=self.user).count(), 20)
+
+    def test_bulk_update_and_delete(self):
+        self.make_rows(3)
+        deals = list(Deal.objects.order_by('pk'))
+        response = self.client.patch('/api/deals/bulk/', [
+            {'id': deals[0].pk, 'stage': 'won'},
+            {'id': deals[1].pk, 'amount': '10.00'},
+            {'id': 0, 'stage': 'won'},
+            {'id': deals[2].pk, 'stage': 'bogus'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(sorted(response.data['updated']), [deals[0].pk, deals[1].pk])
+        self.assertEqual([error['index'] for error in response.data['errors']], [2, 3])
+        self.assertEqual(Deal.objects.get(pk=deals[0].pk).stage, 'won')
+        self.assertEqual(Deal.objects.get(pk=deals[1].pk).amount, Decimal('10.00'))
+
+        response = self.client.delete('/api/deals/bulk/', [deals[0].pk, deals[1].pk, 'x'], format='json')
+        self.assertEqual(response.data['deleted'], 2)
+        self.assertEqual(Deal.objects.count(), 1)
+
+    def test_bulk_deal_writes_maintain_pipeline(self):
+        company = Company.objects.create(name='Acme')
+        response = self.client.post('/api/deals/bulk/', [
+            {'title': f'D{i}', 'amount': '100.00', 'probability': 30, 'company': company.pk}
+            for i in range(5)
+        ], format='json')
+        ids = response.data['created']
+        self.client.patch('/api/deals/bulk/', [{'id': ids[0], 'stage': 'lost'}], format='json')
+        self.client.delete('/api/deals/bulk/', ids[1:2], format='json')
+        self.client.delete('/api/companies/bulk/', [company.pk], format='json')
+        self.assertEqual(pipeline.verify(), {})
+
+    def test_bulk_delete_takes_only_whole_ids(self):
+        self.make_rows(3)
+        first, second, third = Deal.objects.order_by('pk').values_list('pk', flat=True)
+        response = self.client.delete('/api/deals/bulk/', [
+            first + 0.5, None, True, 'x', '-1', 999999, str(first), {'id': second}, second,
+        ], format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['deleted'], 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [0, 1, 2, 3, 4, 5, 8])
+        self.assertIn('does not exist', str(response.data['errors'][5]['errors']))
+        self.assertEqual(list(Deal.objects.values_list('pk', flat=True)), [third])
+
+        response = self.client.patch('/api/deals/bulk/', [{'id': third + 0.5, 'stage': 'won'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Deal.objects.get().stage, 'lead')
+
+    def test_bulk_update_rejects_repeated_ids(self):
+        company = Company.objects.create(name='Acme')
+        deal = Deal.objects.create(title='Deal', amount=Decimal('100.00'), probability=50, company=company)
+        pipeline.rebuild()
+        response = self.client.patch('/api/deals/bulk/', [
+            {'id': deal.pk, 'amount': '200.00'},
+            {'id': deal.pk, 'stage': 'won'},
+        ], format='json')
+        self.assertEqual(response.data['updated'], [deal.pk])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        self.assertIn('id', response.data['errors'][0]['errors'])
+        deal.refresh_from_db()
+        self.assertEqual((deal.amount, deal.stage), (Decimal('200.00'), 'lead'))
+        self.assertEqual(pipeline.verify(), {})
+
+    def test_rejects_non_list_and_all_invalid(self):
+        self.assertEqual(self.client.post('/api/tasks/bulk/', {'title': 'x'}, format='json').status_code, 400)
+        response = self.client.post('/api/tasks/bulk/', [{'status': 'bogus'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], [])
+
+
+class TimelineTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_rows(2)
+        self.company, other = Company.objects.order_by('id')
+        self.contact = self.company.contacts.get()
+        deal = self.company.deals.get()
+        other_deal = other.deals.get()
+        # One task per way into the company's timeline, and one into neither.
+        Task.objects.create(title='On their deal, other contact', deal=deal, contact=other.contacts.get())
+        Task.objects.create(title='On their contact, other deal', deal=other_deal, contact=self.contact)
+        Task.objects.create(title='Unrelated', deal=other_deal)
+        # Space out updated_at so the expected order is unambiguous.
+        start = timezone.now() - timedelta(days=30)
+        for i, model in enumerate([Company, Contact, Deal, Task]):
+            for j, pk in enumerate(model.objects.order_by('id').values_list('pk', flat=True)):
+                created = start + timedelta(hours=i * 10 + j)
+                model.objects.filter(pk=pk).update(created_at=created, updated_at=created)
+        Deal.objects.filter(pk=deal.pk).update(updated_at=timezone.now())
+
+    def timeline(self, url):
+        items = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            page = json.loads(response.content)
+            items += page['results']
+            url = page['next']
+        return items
+
+    def test_company_timeline(self):
+        items = self.timeline(f'/api/companies/{self.company.pk}/timeline/')
+        expected = [
+            ('deal', 'Deal 1', 'updated'),
+            ('task', 'On their contact, other deal', 'created'),
+            ('task', 'On their deal, other contact', 'created'),
+            ('task', 'Task 1', 'created'),
+            ('contact', 'Last 1', 'created'),
+            ('company', 'Company 1', 'created'),
+        ]
+        self.assertEqual([(item['model'], item['data'].get('title') or item['data'].get('last_name')
+                           or item['data']['name'], item['event']) for item in items], expected)
+        # Records render as their list endpoints do.
+        deal = json.loads(self.client.get(f'/api/deals/?company={self.company.pk}').content)['results'][0]
+        self.assertEqual(items[0]['data'], deal)
+
+        paged = self.timeline(f'/api/companies/{self.company.pk}/timeline/?page_size=4')
+        self.assertEqual(paged, items)
+        page = json.loads(self.client.get(f'/api/companies/{self.company.pk}/timeline/?page_size=4').content)
+        page = json.loads(self.client.get(page['next']).content)
+        previous = json.loads(self.client.get(page['previous']).content)
+        self.assertEqual(previous['results'], items[:4])
+
+    def test_contact_timeline(self):
+        items = self.timeline(f'/api/contacts/{self.contact.pk}/timeline/?page_size=1')
+        self.assertEqual([(item['model'], item['id']) for item in items], [
+            ('deal', self.company.deals.get().pk),
+            ('task', Task.objects.get(title='On their contact, other deal').pk),
+            ('task', Task.objects.get(title='Task 1').pk),
+            ('contact', self.contact.pk),
+        ])
+        self.assertEqual(self.client.get('/api/contacts/999/timeline/').status_code, 404)
+
+    def test_includes_archived_records(self):
+        Deal.objects.update(stage='won')
+        Task.objects.update(status='completed', is_overdue=False, priority_rank=None)
+        urls = [f'/api/companies/{self.company.pk}/timeline/', f'/api/contacts/{self.contact.pk}/timeline/']
+        before = [self.timeline(url) for url in urls]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive.archive(days=0), {'task': 5, 'deal': 2})
+        for url, expected in zip(urls, before):
+            items = self.timeline(url)
+            self.assertEqual([(item['model'], item['id']) for item in items],
+                             [(item['model'], item['id']) for item in expected])
+            # The company's own deal count drops; archived records render as before.
+            archived = [item for item in expected if item['model'] in ('deal', 'task')]
+            self.assertEqual([item for item in items if item['model'] in ('deal', 'task')], archived)
+
+    def test_queries_do_not_grow_with_related_records(self):
+        url = f'/api/companies/{self.company.pk}/timeline/?page_size=3'
+        before = self.count_queries(url)
+        for i in range(10):
+            deal = Deal.objects.create(title=f'More {i}', amount=1, company=self.company, contact=self.contact)
+            Task.objects.create(title=f'More {i}', deal=deal, contact=self.contact)
+        cache.clear()
+        self.assertEqual(self.count_queries(url), before)
+        # Writes to any table in the timeline retire its cached pages.
+        response = self.client.get(url)
+        Task.objects.filter(title='More 9').update(title='Renamed')
+        Task.objects.get(title='Renamed').save()
+        self.assertNotEqual(self.client.get(url).content, response.content)
+
+
+class ArchiveTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_rows(6)
+        old = timezone.now() - timedelta(days=400)
+        # Deals 1-3 closed long ago, 4 closed recently; tasks 1, 2 and 4 completed long ago.
+        Deal.objects.filter(title__in=['Deal 1', 'Deal 2']).update(stage='won', updated_at=old)
+        Deal.objects.filter(title__in=['Deal 3', 'Deal 4']).update(stage='lost', updated_at=old)
+        Deal.objects.filter(title='Deal 4').update(updated_at=timezone.now())
+        Task.objects.filter(title__in=['Task 1', 'Task 2', 'Task 4']).update(
+            status='completed', is_overdue=False, priority_rank=None, updated_at=old)
+        pipeline.rebuild()
+
+    def get_json(self, url):
+        cache.clear()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return json.loads(response.content)
+
+    def test_moves_old_closed_rows(self):
+        before = {url: self.get_json(url) for url in [
+            '/api/deals/', '/api/tasks/', '/api/deals/?ordering=amount&stage=won', '/api/dashboard/stats/',
+        ]}
+        deal = Deal.objects.get(title='Deal 1')
+        detail = self.get_json(f'/api/deals/{deal.pk}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # Deal 3 keeps its open task, so it stays.
+            self.assertEqual(archive.archive(batch_size=2), {'task': 3, 'deal': 2})
+        self.assertEqual(sorted(ArchivedDeal.objects.values_list('snapshot__title', flat=True)), ['Deal 1', 'Deal 2'])
+        self.assertEqual(ArchivedTask.objects.count(), 3)
+        self.assertEqual(Deal.objects.count(), 4)
+        self.assertEqual(Change.objects.filter(action='deleted').count(), 5)
+        self.assertEqual(pipeline.verify(), {})
+        self.assertEqual(archive.archive(), {'task': 0, 'deal': 0})
+
+        self.assertEqual(len(self.get_json('/api/deals/')['results']), 4)
+        self.assertEqual(self.client.get(f'/api/deals/{deal.pk}/').status_code, 404)
+        for url, expected in before.items():
+            archived_url = url if 'dashboard' in url else url + ('&' if '?' in url else '?') + 'include_archived=1'
+            self.assertEqual(self.get_json(archived_url), expected, url)
+        self.assertEqual(self.get_json(f'/api/deals/{deal.pk}/?include_archived=1'), detail)
+        self.assertEqual(self.get_json(f'/api/deals/{deal.pk}/?include_archived=1&fields=id,title'),
+                         {'id': deal.pk, 'title': 'Deal 1'})
+
+    def test_pages_and_counts_span_both_tables(self):
+        expected = [task['id'] for task in self.get_json('/api/tasks/?ordering=updated_at')['results']]
+        archive.archive()
+        ids = []
+        url = '/api/tasks/?ordering=updated_at&page_size=2&include_archived=1&count=1'
+        while url:
+            page = self.get_json(url)
+            self.assertEqual((page['count'], page['count_exact']), (6, True))
+            ids += [task['id'] for task in page['results']]
+            url = page['next']
+        self.assertEqual(ids, expected)
+        previous = self.get_json(page['previous'])
+        self.assertEqual([task['id'] for task in previous['results']], expected[2:4])
+
+        page = self.get_json('/api/tasks/?include_archived=1&status=completed&fields=id,status')
+        self.assertEqual(page['results'], [{'id': pk, 'status': 'completed'} for pk in sorted(
+            ArchivedTask.objects.values_list('id', flat=True), reverse=True)])
+        self.assertEqual(self.client.get('/api/deals/?include_archived=1&expand=tasks').status_code, 400)
+
+    @override_settings(ROOT_URLCONF='tasks.tests')
+    def test_async_reads_include_archived(self):
+        archive.archive()
+        for url in ['/api/tasks/?include_archived=1', f'/api/tasks/{ArchivedTask.objects.first().pk}/?include_archived=1']:
+            response = self.client.get(url)
+            cache.clear()
+            with override_settings(ROOT_URLCONF='config.urls'):
+                expected = self.client.get(url)
+            self.assertEqual(response.content, expected.content, url)
+
+    def test_admin_cannot_delete_archived_rows(self):
+        archive.archive()
+        self.client.force_login(User.objects.create_superuser('admin', password='admin123'))
+        deal = ArchivedDeal.objects.first()
+        self.assertEqual(self.client.get(f'/admin/tasks/archiveddeal/{deal.pk}/delete/').status_code, 403)
+        self.client.post('/admin/tasks/archiveddeal/', {'action': 'delete_selected', 'post': 'yes',
+                                                       '_selected_action': [deal.pk]})
+        self.assertEqual(ArchivedDeal.objects.count(), 2)
+        rollup = PipelineRollup.objects.first()
+        self.assertEqual(self.client.get(f'/admin/tasks/pipelinerollup/{rollup.pk}/delete/').status_code, 403)
+        self.assertEqual(pipeline.verify(), {})
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_closed', days=30, stdout=out)
+        self.assertIn('Done: 3 tasks, 2 deals archived.', out.getvalue())
+
+
+THROTTLE = {**settings.THROTTLE, 'RATE': 1, 'BURST': 10, 'COSTS': {'list': 5},
+            'ENDPOINTS': {'login': (0.5, 2)}}
+
+
+@override_settings(THROTTLE=THROTTLE)
+class ThrottleTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_rows(1)
+        self.now = 1000.0
+        clock = mock.patch('tasks.throttling.time.time', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def get(self, url, client=None):
+        cache.clear()
+        return (client or self.client).get(url)
+
+    def test_spends_cost_per_endpoint(self):
+        self.assertEqual(self.get('/api/contacts/').status_code, 200)
+        self.assertEqual(self.get('/api/contacts/').status_code, 200)
+        response = self.get('/api/contacts/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '5')
+
+        self.now += 1
+        contact = Contact.objects.get()
+        self.assertEqual(self.get(f'/api/contacts/{contact.pk}/').status_code, 200)
+        self.assertEqual(self.get('/api/contacts/').status_code, 429)
+        self.now += 5
+        self.assertEqual(self.get('/api/contacts/').status_code, 200)
+
+        # Other callers have budgets of their own.
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other'))
+        self.assertEqual(self.get('/api/contacts/', other).status_code, 200)
+
+    @override_settings(ROOT_URLCONF='tasks.tests')
+    def test_async_reads_are_throttled(self):
+        for status in (200, 200, 429):
+            self.assertEqual(self.get('/api/deals/').status_code, status)
+
+    def test_endpoint_limit(self):
+        client = APIClient()
+        credentials = {'username': 'demo', 'password': 'wrong'}
+        for status in (401, 401, 429):
+            self.assertEqual(client.post('/api/auth/login/', credentials).status_code, status)
+        self.now += 2
+        self.assertEqual(client.post('/api/auth/login/', credentials).status_code, 401)
+
+    @override_settings(THROTTLE={**THROTTLE, 'CACHE': 'default'})
+    def test_shared_cache(self):
+        for status in (200, 200):
+            self.assertEqual(self.client.get('/api/contacts/').status_code, status)
+        throttling.buckets.clear()
+        self.assertEqual(self.client.get('/api/contacts/').status_code, 429)
+
+    @override_settings(THROTTLE=settings.THROTTLE)
+    def test_defaults_cover_loading_whole_lists(self):
+        # TasksView pages through tasks, deals and contacts at 500 rows a page.
+        for _ in range(260):
+            self.assertEqual(self.get('/api/tasks/?page_size=500').status_code, 200)
+
+    @override_settings(THROTTLE={**THROTTLE, 'ENABLED': False})
+    def test_disabled(self):
+        for _ in range(5):
+            self.assertEqual(self.get('/api/contacts/').status_code, 200)
+
+
+class ApiProfileTests(CRMTestCase):
+    def test_api_only_settings_serve_the_api(self):
+        from config import settings_api
+
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.make_rows(1)
+        with override_settings(ROOT_URLCONF=settings_api.ROOT_URLCONF, MIDDLEWARE=settings_api.MIDDLEWARE):
+            self.assertEqual(client.get('/api/contacts/').status_code, 200)
+            self.assertEqual(client.post('/api/companies/', {'name': 'No CSRF'}).status_code, 201)
+            self.assertEqual(client.get('/admin/').status_code, 404)
+        self.assertNotIn('django.contrib.sessions', settings_api.INSTALLED_APPS)
+
+    def test_preload(self):
+        from config.preload import preload
+
+        # Not in the test's own connection and process, which carry on.
+        with mock.patch('gc.freeze') as freeze, mock.patch('django.db.connections.close_all') as close_all:
+            preload()
+        freeze.assert_called_once_with()
+        close_all.assert_called_once_with()
+        self.assertIsNotNone(RowPlan.compile(ContactSerializer))
+
+
+class ExportTests(CRMTestCase):
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_includes_joined_names(self):
+        self.make_rows(2)
+        Deal.objects.create(title='Orphan', amount=Decimal('1.50'), company=Company.objects.first())
+        rows = list(csv.DictReader(self.export('/api/deals/export/?format=csv').splitlines()))
+        self.assertEqual([row['title'] for row in rows], ['Orphan', 'Deal 2', 'Deal 1'])
+        self.assertEqual(rows[0]['contact_name'], '')
+        self.assertEqual(rows[0]['amount'], '1.50')
+        self.assertEqual(rows[1]['contact_name'], 'First Last 2')
+        self.assertEqual(rows[1]['company_name'], 'Company 2')
+
+    def test_ndjson_export_applies_list_filters(self):
+        self.make_rows(3)
+        Task.objects.filter(title='Task 2').update(status='completed')
+        lines = self.export('/api/tasks/export/?format=ndjson&status=completed').splitlines()
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual(row['title'], 'Task 2')
+        self.assertEqual(row['assigned_to_name'], 'demo')
+        self.assertEqual(row['deal_title'], 'Deal 2')
+
+    def test_export_query_count_is_constant(self):
+        self.make_rows(3)
+        with CaptureQueriesContext(connection) as ctx:
+            self.export('/api/contacts/export/?format=csv')
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_unknown_format_is_not_found(self):
+        self.assertEqual(self.client.get('/api/contacts/export/?format=xml').status_code, 404)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    async def test_asgi_streams_in_batches(self):
+        await sync_to_async(self.make_rows)(5)
+        token = await Token.objects.acreate(user=self.user)
+        headers = {'Authorization': f'Token {token.key}'}
+        response = await self.async_client.get('/api/contacts/export/?format=csv', headers=headers)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        # The header and five rows, two lines at a time.
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b''.join(chunks).decode(), await sync_to_async(self.export)('/api/contacts/export/?format=csv'))
+
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'contacts.csv'
+            path.write_bytes(b''.join(chunks))
+            job = await Job.objects.acreate(name='export', status='succeeded', output=str(path),
+                                            result={'filename': 'contacts.csv'}, created_by=self.user)
+            response = await self.async_client.get(f'/api/jobs/{job.pk}/download/', headers=headers)
+            self.assertTrue(response.is_async)
+            self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), path.read_bytes())
+
+
+class JobQueueTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.calls = []
+
+        def flaky(job, fail_times):
+            self.calls.append(job.attempts)
+            if job.attempts <= fail_times:
+                raise RuntimeError('boom')
+            return {'attempts': job.attempts}
+
+        patcher = mock.patch.dict(jobs.registry, {'flaky': jobs.Registered(flaky, 3, None)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_with_backoff_then_succeeds(self):
+        job = jobs.enqueue('flaky', {'fail_times': 1})
+        worker = jobs.Worker(name='test')
+        with self.assertLogs('tasks.jobs', 'ERROR'):
+            self.assertEqual(worker.run(worker.claim()).status, 'queued')
+        job.refresh_from_db()
+        self.assertEqual(job.last_error, 'RuntimeError: boom')
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+        self.assertIsNone(worker.claim())
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        job = worker.run(worker.claim())
+        self.assertEqual((job.status, job.result, job.worker), ('succeeded', {'attempts': 2}, 'test'))
+        self.assertIsNotNone(job.duration)
+        self.assertEqual(self.calls, [1, 2])
+
+    def test_gives_up_after_max_attempts(self):
+        job = jobs.enqueue('flaky', {'fail_times': 5})
+        worker = jobs.Worker()
+        for _ in range(3):
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            with self.assertLogs('tasks.jobs', 'ERROR'):
+                worker.run(worker.claim())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.assertEqual(jobs.metrics()['flaky']['retries'], 2)
+
+    def test_scheduled_jobs_wait_and_stale_ones_are_requeued(self):
+        jobs.enqueue('flaky', {'fail_times': 0}, run_at=timezone.now() + timedelta(minutes=5))
+        worker = jobs.Worker()
+        self.assertIsNone(worker.claim())
+        job = jobs.enqueue('flaky', {'fail_times': 0})
+        self.assertEqual(worker.claim().pk, job.pk)
+        Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(days=1))
+        worker.requeue_stale()
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'queued')
+
+    def test_periodic_jobs_are_scheduled_once(self):
+        worker = jobs.Worker()
+        worker.schedule_periodic()
+        worker.schedule_periodic()
+        self.assertEqual(Job.objects.filter(name='sweep_overdue_tasks').count(), 1)
+        worker.work(burst=True)
+        sweep = Job.objects.get(name='sweep_overdue_tasks', status='succeeded')
+        worker.schedule_periodic()
+        following = Job.objects.get(name='sweep_overdue_tasks', status='queued')
+        self.assertEqual(following.run_at, sweep.finished_at + timedelta(seconds=60))
+
+    def test_overdue_flag_follows_writes_and_sweep(self):
+        self.make_rows(2)
+        Task.objects.update(due_date=timezone.now() + timedelta(days=1), is_overdue=False)
+        task = Task.objects.get(title='Task 1')
+        task.due_date = timezone.now() - timedelta(days=1)
+        task.save(update_fields=['due_date'])
+        self.assertTrue(Task.objects.get(pk=task.pk).is_overdue)
+        self.assertEqual(self.client.get('/api/tasks/?overdue=true').data['results'][0]['id'], task.pk)
+
+        response = self.client.patch(f'/api/tasks/{task.pk}/', {'status': 'completed'}, format='json')
+        self.assertFalse(response.data['is_overdue'])
+
+        Task.objects.filter(title='Task 2').update(due_date=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.client.get('/api/dashboard/stats/').data['overdue_tasks'], 0)
+        self.assertEqual(jobs.sweep_overdue_tasks(), {'flagged': 1, 'cleared': 0})
+        self.assertEqual(self.client.get('/api/dashboard/stats/').data['overdue_tasks'], 1)
+
+    def test_bulk_writes_set_overdue_flag(self):
+        past = (timezone.now() - timedelta(days=1)).isoformat()
+        response = self.client.post('/api/tasks/bulk/', [{'title': 'Late', 'due_date': past}], format='json')
+        task = Task.objects.get(pk=response.data['created'][0])
+        self.assertTrue(task.is_overdue)
+        self.client.patch('/api/tasks/bulk/', [{'id': task.pk, 'status': 'completed'}], format='json')
+        self.assertFalse(Task.objects.get(pk=task.pk).is_overdue)
+
+    def test_background_export(self):
+        self.make_rows(3)
+        Deal.objects.filter(title='Deal 2').update(stage='won')
+        with override_settings(EXPORT_DIR=Path(self.tmp.name)):
+            response = self.client.get('/api/deals/export/?format=csv&stage=won&background=1')
+            self.assertEqual(response.status_code, 202, response.content)
+            job = json.loads(response.content)
+            self.assertEqual(job['status'], 'queued')
+            self.assertIsNone(job['download_url'])
+
+            jobs.Worker().work(burst=True)
+            job = self.client.get(response['Location']).data
+            self.assertEqual(job['status'], 'succeeded')
+            self.assertEqual(job['result']['rows'], 1)
+            download = self.client.get(job['download_url'])
+        self.assertEqual(download['Content-Disposition'], 'attachment; filename="deals.csv"')
+        streamed = self.client.get('/api/deals/export/?format=csv&stage=won')
+        self.assertEqual(b''.join(download.streaming_content), b''.join(streamed.streaming_content))
+
+        other = User.objects.create_user('other')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(job['url']).status_code, 404)
+
+    def test_stats_command(self):
+        jobs.enqueue('flaky', {'fail_times': 0})
+        call_command('run_worker', '--burst', stdout=StringIO())
+        out = StringIO()
+        call_command('run_worker', '--stats', stdout=out)
+        self.assertIn('flaky: 0 queued, 0 running, 1 succeeded, 0 failed, 0 retries', out.getvalue())
+
+
+CONTACTS_CSV = """first_name,last_name,email,company,position
+Ada,Lovelace,ada@example.com,Analytical,Founder
+Grace,Hopper,grace@example.com,Navy,Admiral
+Alan,Turing,alan@example.com,Analytical,
+Dup,Licate,ada@example.com,Analytical,
+Bad,Email,not-an-email,,
+Old,Timer,old@example.com,Existing,
+"""
+
+
+class ImportTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / 'contacts.csv'
+        self.path.write_text(CONTACTS_CSV)
+        existing = Company.objects.create(name='Existing')
+        Contact.objects.create(first_name='Old', last_name='Timer', email='old@example.com', company=existing)
+
+    def test_import_command(self):
+        out = StringIO()
+        call_command('import_crm', str(self.path), '--kind', 'contacts', '--chunk-size', '2', stdout=out)
+        job = ImportJob.objects.get()
+        self.assertEqual((job.status, job.rows_processed, job.created_count, job.skipped_count),
+                         ('completed', 6, 3, 3))
+        self.assertEqual(Company.objects.filter(name='Analytical').count(), 1)
+        self.assertEqual(Contact.objects.get(email='alan@example.com').company.name, 'Analytical')
+        self.assertEqual(job.errors, [{'row': 5, 'error': "invalid email 'not-an-email'"}])
+        self.assertIn('3 created', out.getvalue())
+
+    def test_rows_breaking_field_constraints_are_skipped(self):
+        self.path.write_text(
+            'name,website,phone,email\n'
+            'Acme,https://acme.example.com,555-0100,hi@acme.example.com\n'
+            f'{"x" * 201},,,\n'
+            'Globex,not a url,,\n'
+            'Initech,,+1 (555) 0100 ext. 12345,\n'
+            'Umbrella,,,nobody\n'
+        )
+        job = ImportJob.objects.create(kind='companies', source=str(self.path))
+        Importer(job, chunk_size=10).run()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.created_count, job.skipped_count), ('completed', 1, 4))
+        self.assertEqual([(error['row'], error['error'].split(':')[0]) for error in job.errors],
+                         [(2, 'name'), (3, 'website'), (4, 'phone'), (5, 'email')])
+        self.assertIn('at most 200 characters', job.errors[0]['error'])
+
+        self.path.write_text('first_name,last_name,email,company,phone\n'
+                             f'Ada,Lovelace,ada@example.com,{"x" * 201},\n'
+                             'Grace,Hopper,grace@example.com,Navy,555 0100 0100 0100 0100\n'
+                             'Alan,Turing,alan@example.com,Navy,\n')
+        job = ImportJob.objects.create(kind='contacts', source=str(self.path))
+        Importer(job).run()
+        job.refresh_from_db()
+        self.assertEqual([error['row'] for error in job.errors], [1, 2])
+        self.assertEqual(list(Contact.objects.filter(company__name='Navy').values_list('email', flat=True)),
+                         ['alan@example.com'])
+
+    def test_resume_skips_committed_rows(self):
+        job = ImportJob.objects.create(kind='contacts', source=str(self.path), rows_processed=2,
+                                       status='failed')
+        Importer(job, chunk_size=2).run()
+        self.assertFalse(Contact.objects.filter(email='grace@example.com').exists())
+        self.assertTrue(Contact.objects.filter(email='alan@example.com').exists())
+        self.assertEqual(ImportJob.objects.get().rows_processed, 6)
+
+    def test_upload_endpoint(self):
+        with override_settings(IMPORT_DIR=Path(self.tmp.name) / 'uploads'):
+            upload = SimpleUploadedFile('contacts.csv', CONTACTS_CSV.encode())
+            response = self.client.post('/api/imports/', {'kind': 'contacts', 'file': upload})
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertEqual(response.data['created_count'], 3)
+
+            with override_settings(IMPORT_INLINE_MAX_BYTES=0):
+                upload = SimpleUploadedFile('contacts.csv', CONTACTS_CSV.encode())
+                response = self.client.post('/api/imports/', {'kind': 'contacts', 'file': upload})
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.data['status'], 'pending')
+            self.assertEqual(Job.objects.get().payload, {'import_job': response.data['id']})
+
+            jobs.Worker().work(burst=True)
+            import_job = self.client.get(f"/api/imports/{response.data['id']}/").data
+            self.assertEqual((import_job['status'], import_job['skipped_count']), ('completed', 6))
+
+    def test_imports_are_private(self):
+        job = ImportJob.objects.create(kind='contacts', source=str(self.path), created_by=self.user)
+        self.client.force_authenticate(User.objects.create_user('other'))
+        self.assertEqual(self.client.get('/api/imports/').data['results'], [])
+        self.assertEqual(self.client.get(f'/api/imports/{job.pk}/').status_code, 404)
+
+
+class SearchTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        if connection.vendor != 'sqlite':
+            self.skipTest('exercises the FTS5 index')
+        acme = Company.objects.create(name='Acme Rockets', industry='Aerospace')
+        Contact.objects.create(first_name='Wile', last_name='Coyote', email='wile@acme.test',
+                               position='Engineer', company=acme, notes='Orders rockets weekly')
+        Deal.objects.create(title='Rocket skates', amount=Decimal('99.00'), company=acme)
+
+    def search(self, **params):
+        response = self.client.get('/api/search/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_ranks_title_matches_first(self):
+        results = self.search(q='rocket')['results']
+        self.assertEqual([(row['type'], row['title']) for row in results][:2],
+                         [('deal', 'Rocket skates'), ('company', 'Acme Rockets')])
+        self.assertIn(('contact', 'Wile Coyote'), [(row['type'], row['title']) for row in results])
+
+    def test_index_follows_writes(self):
+        contact = Contact.objects.get()
+        contact.last_name = 'Genius'
+        contact.save()
+        self.assertEqual(self.search(q='coyote')['results'], [])
+        self.assertEqual(self.search(q='genius')['results'][0]['id'], contact.pk)
+        Contact.objects.bulk_create([Contact(first_name='Road', last_name='Runner', email='rr@acme.test')])
+        self.assertEqual(len(self.search(q='runner')['results']), 1)
+        Contact.objects.all().delete()
+        self.assertEqual(self.search(q='runner')['results'], [])
+
+    def test_type_filter_and_pagination(self):
+        self.assertEqual({row['type'] for row in self.search(q='acme', type='contact')['results']}, {'contact'})
+        page = self.search(q='rocket', page_size=1)
+        self.assertEqual(len(page['results']), 1)
+        self.assertIsNotNone(page['next'])
+        self.assertEqual(self.search(q='***')['results'], [])
+        response = self.client.get('/api/search/', {'q': 'acme', 'type': 'contact,person'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('person', response.data['type'][0])
+
+
+class SearchIndexSchemaTests(TransactionTestCase):
+    def alter_field(self, old_field, new_field):
+        with connection.schema_editor() as editor:
+            editor.alter_field(Company, old_field, new_field)
+
+    def triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'tasks_company'")
+            return sorted(name for name, in cursor.fetchall())
+
+    def test_table_rebuild_drops_triggers(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite rebuilds tables to alter columns')
+        self.assertEqual(self.triggers(), ['tasks_company_search_ad', 'tasks_company_search_ai',
+                                           'tasks_company_search_au'])
+        old_field = Company._meta.get_field('industry')
+        new_field = models.CharField(max_length=150, blank=True)
+        new_field.set_attributes_from_name('industry')
+        self.alter_field(old_field, new_field)
+        self.addCleanup(call_command, 'rebuild_search_index', stdout=StringIO())
+        self.addCleanup(self.alter_field, new_field, old_field)
+        # This is what rebuild_search_index is documented to repair.
+        self.assertEqual(self.triggers(), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        Company.objects.create(name='Acme Rockets')
+        self.assertEqual([row['title'] for row in search.search('rockets')], ['Acme Rockets'])
+
+
+class ConditionalGetTests(CRMTestCase):
+    def test_not_modified_before_any_query(self):
+        self.make_rows(2)
+        response = self.client.get('/api/contacts/')
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/contacts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_response_cache(self):
+        self.make_rows(2)
+        first = self.client.get('/api/deals/?stage=lead')
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get('/api/deals/?stage=lead')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertNotEqual(self.client.get('/api/deals/?stage=won')['ETag'], first['ETag'])
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other'))
+        self.assertNotEqual(other.get('/api/deals/?stage=lead')['ETag'], first['ETag'])
+
+    def test_writes_change_etag(self):
+        self.make_rows(1)
+        company = Company.objects.get()
+        etag = self.client.get('/api/companies/')['ETag']
+        detail = self.client.get(f'/api/companies/{company.pk}/')['ETag']
+
+        self.client.post('/api/contacts/', {'first_name': 'A', 'last_name': 'B', 'email': 'ab@example.com',
+                                            'company': company.pk})
+        response = self.client.get('/api/companies/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['contacts_count'], 2)
+        self.assertNotEqual(self.client.get(f'/api/companies/{company.pk}/')['ETag'], detail)
+
+        etag = self.client.get('/api/deals/')['ETag']
+        response = self.client.post('/api/deals/bulk/', [{'title': 'Bulk', 'amount': '1.00', 'company': company.pk}],
+                                    format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.client.get('/api/deals/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_dashboard_validators(self):
+        response = self.client.get('/api/dashboard/stats/')
+        self.assertIn('Last-Modified', response)
+        response = self.client.get('/api/dashboard/stats/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_rows(1)
+        response = self.client.get('/api/dashboard/stats/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+
+class RowSerializationTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_rows(2)
+        # Null relations, odd decimals and characters JSON encoders disagree on.
+        Contact.objects.create(first_name='Zoë', last_name='Line\u2028Sep', email='z@example.com')
+        Deal.objects.create(title='Tab\tand "quotes"', amount=Decimal('0.5'), company=Company.objects.first())
+        Task.objects.create(title='Orphan', due_date=None)
+
+    def test_rows_match_serializers(self):
+        for model, serializer_class in [(Company, CompanySerializer), (Contact, ContactSerializer),
+                                        (Deal, DealSerializer), (Task, TaskSerializer)]:
+            plan = RowPlan.compile(serializer_class)
+            self.assertIsNotNone(plan, serializer_class)
+            rows = {row['id']: row for row in plan.values(model.objects.all())}
+            for obj in model.objects.all():
+                self.assertEqual(plan.to_representation(rows[obj.pk]), serializer_class(obj).data)
+
+    def test_responses_are_byte_identical(self):
+        for url in ['/api/companies/', '/api/contacts/', '/api/deals/', '/api/tasks/',
+                    f'/api/deals/{Deal.objects.get(contact=None).pk}/']:
+            cache.clear()
+            response = self.client.get(url)
+            cache.clear()
+            with mock.patch('tasks.views.QueryPlanMixin.get_row_plan', return_value=None), \
+                    mock.patch('tasks.renderers.orjson', None):
+                expected = self.client.get(url)
+            self.assertEqual(response.content, expected.content, url)
+        self.assertIn(b'Line\\u2028Sep', self.client.get('/api/contacts/').content)
+
+    def test_browsable_api_uses_serializers(self):
+        response = self.client.get('/api/deals/', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Tab')
+
+    def test_list_is_one_query(self):
+        self.assertEqual(self.count_queries('/api/tasks/'), 1)
+
+
+class SparseFieldsetTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_rows(3)
+
+    def test_fields_trim_output_and_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/contacts/?fields=id,full_name,company_name')
+        self.assertEqual(response.status_code, 200, response.content)
+        for row in response.data['results']:
+            self.assertEqual(set(row), {'id', 'full_name', 'company_name'})
+        self.assertNotIn('"notes"', ctx.captured_queries[0]['sql'])
+        self.assertEqual(response.data['results'][0]['full_name'], 'First Last 3')
+
+    def test_fields_keep_cursors_working(self):
+        response = self.client.get('/api/deals/?fields=title&page_size=2&ordering=amount')
+        self.assertEqual([set(row) for row in response.data['results']], [{'title'}, {'title'}])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_fields_apply_to_browsable_api_and_detail(self):
+        deal = Deal.objects.first()
+        response = self.client.get(f'/api/deals/{deal.pk}/?fields=id,stage')
+        self.assertEqual(response.data, {'id': deal.pk, 'stage': deal.stage})
+        response = self.client.get('/api/deals/?fields=title', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_names_are_rejected(self):
+        self.assertEqual(self.client.get('/api/contacts/?fields=id,secret').status_code, 400)
+        self.assertEqual(self.client.get('/api/tasks/?expand=deals').status_code, 400)
+
+    def test_expand_is_one_query_per_relation(self):
+        url = '/api/companies/?expand=contacts,deals'
+        small = self.count_queries(url)
+        self.make_rows(5)
+        self.assertEqual(self.count_queries(url), small)
+        company = json.loads(self.client.get(url).content)['results'][0]
+        self.assertEqual([contact['full_name'] for contact in company['contacts']], ['First Last 8'])
+        self.assertEqual(company['deals'][0]['contact_name'], 'First Last 8')
+
+    def test_expand_with_fields(self):
+        contact = Contact.objects.first()
+        response = self.client.get(f'/api/contacts/{contact.pk}/?fields=id&expand=tasks')
+        self.assertEqual(set(response.data), {'id', 'tasks'})
+        self.assertEqual(response.data['tasks'][0]['deal_title'], contact.tasks.get().deal.title)
+
+    def test_expanded_responses_follow_writes(self):
+        company = Company.objects.first()
+        url = f'/api/companies/{company.pk}/?expand=deals'
+        self.assertEqual(len(json.loads(self.client.get(url).content)['deals']), 1)
+        self.client.get(url)
+        Deal.objects.create(title='Another', amount=Decimal('1.00'), company=company)
+        self.assertEqual(len(json.loads(self.client.get(url).content)['deals']), 2)
+
+
+METRICS = {**settings.METRICS, 'SERVER_TIMING': True, 'ALLOWED_IPS': ['127.0.0.1']}
+
+
+@override_settings(METRICS=METRICS)
+class RequestMetricsTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        for histogram in metrics.HISTOGRAMS:
+            histogram.clear()
+
+    def test_server_timing_counts_queries(self):
+        self.make_rows(2)
+        response = self.client.get('/api/deals/')
+        timing = dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+        self.assertEqual(set(timing), {'app', 'db', 'serialize'})
+        self.assertIn('desc="1 queries"', timing['db'])
+
+    def test_metrics_endpoint_exposes_histograms_by_view_and_action(self):
+        self.make_rows(2)
+        self.client.get('/api/deals/')
+        self.client.get('/api/deals/')
+        self.client.get(f'/api/deals/{Deal.objects.first().pk}/')
+        body = self.client.get('/metrics').content.decode()
+        labels = 'view="DealViewSet",action="list"'
+        self.assertIn(f'crm_request_duration_seconds_count{{{labels}}} 2', body)
+        self.assertIn(f'crm_request_db_queries_bucket{{{labels},le="1"}} 2', body)
+        self.assertIn(f'crm_request_db_queries_bucket{{{labels},le="0"}} 1', body)
+        self.assertIn('crm_request_serializer_duration_seconds_count{view="DealViewSet",action="retrieve"} 1', body)
+
+    def test_instance_serializers_are_timed(self):
+        self.make_rows(1)
+        self.client.get('/api/companies/?expand=deals')
+        series = metrics.SERIALIZER_DURATION.series[('CompanyViewSet', 'list')]
+        self.assertGreater(series[-2], 0)
+
+    def test_warns_about_repeated_queries_and_budget(self):
+        self.make_rows(6)
+
+        def n_plus_one(request):
+            for company in Company.objects.all():
+                list(company.contacts.all())
+            return HttpResponse()
+
+        middleware = metrics.RequestMetricsMiddleware(n_plus_one)
+        with self.assertLogs('tasks.metrics', 'WARNING') as logs, \
+                override_settings(METRICS={'SERVER_TIMING': False, 'QUERY_BUDGET': 5, 'DUPLICATE_QUERIES': 5}):
+            response = middleware(RequestFactory().get('/report/'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertIn('ran 7 queries, over the budget of 5', logs.output[0])
+        self.assertIn('same query 6 times', logs.output[1])
+
+    @override_settings(METRICS=settings.METRICS)
+    def test_off_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/deals/'))
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_metrics_endpoint_checks_client_address(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.5').status_code, 404)
+
+
+@override_settings(ROOT_URLCONF='tasks.tests')
+class AsyncReadTests(CRMTestCase):
+    def get_both(self, url):
+        """``url`` through the async views, then through the sync ones."""
+        cache.clear()
+        response = self.client.get(url)
+        cache.clear()
+        with override_settings(ROOT_URLCONF='config.urls'):
+            expected = self.client.get(url)
+        return response, expected
+
+    def test_matches_sync_views(self):
+        self.make_rows(3)
+        Deal.objects.filter(title='Deal 2').update(stage='won')
+        urls = ['/api/companies/', '/api/contacts/?page_size=2', '/api/deals/?stage=won',
+                '/api/tasks/?ordering=updated_at', '/api/dashboard/stats/',
+                f'/api/contacts/{Contact.objects.first().pk}/', '/api/companies/?fields=name&expand=deals',
+                f'/api/contacts/{Contact.objects.first().pk}/?expand=tasks']
+        for url in urls:
+            response, expected = self.get_both(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.content, expected.content, url)
+            self.assertIn('ETag', response)
+
+        next_page = json.loads(self.client.get('/api/contacts/?page_size=2').content)['next']
+        response, expected = self.get_both(next_page)
+        self.assertEqual(response.content, expected.content)
+
+    def test_browsable_api(self):
+        self.make_rows(1)
+        for url in ['/api/contacts/?format=api', f'/api/contacts/{Contact.objects.get().pk}/?format=api']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn(b'<form', response.content)
+        response = self.client.get('/api/deals/', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+
+    def test_errors_match_sync_views(self):
+        for url in ['/api/deals/999/', '/api/deals/x/', '/api/deals/?stage=bogus', '/api/deals/?cursor=zz']:
+            response, expected = self.get_both(url)
+            self.assertEqual(response.status_code, expected.status_code, url)
+            self.assertEqual(response.content, expected.content, url)
+        self.client.force_authenticate(None)
+        response, expected = self.get_both('/api/deals/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.content, expected.content)
+
+    @override_settings(METRICS=METRICS)
+    def test_metrics_cover_async_views(self):
+        self.make_rows(2)
+        response = self.client.get('/api/deals/')
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    def test_cached_token_needs_no_query(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.client.force_authenticate(None)
+        token = self.client.post('/api/auth/login/', {'username': 'demo', 'password': 'demo123'}).data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        self.client.get('/api/dashboard/stats/')
+        self.assertEqual(self.count_queries('/api/dashboard/stats/'), 0)
+
+    def test_writes_use_sync_views(self):
+        response = self.client.post('/api/companies/', {'name': 'Acme'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(self.client.get('/api/companies/').content)['results'][0]['name'], 'Acme')
+
+
+class TokenAuthenticationTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.client = APIClient()
+        response = self.client.post('/api/auth/login/', {'username': 'demo', 'password': 'demo123'})
+        self.token = response.data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def test_repeat_requests_skip_token_lookup(self):
+        self.client.get('/api/dashboard/stats/')
+        token_cache.clear()
+        cold = self.count_queries('/api/dashboard/stats/')
+        warm = self.count_queries('/api/dashboard/stats/')
+        self.assertEqual(cold - warm, 1)
+        self.assertEqual(warm, 0)
+
+    def test_login_reads_token_from_database(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/auth/login/', {'username': 'demo', 'password': 'demo123'})
+        self.assertEqual(response.data['token'], self.token)
+        self.assertEqual(len([q for q in ctx.captured_queries if 'authtoken_token' in q['sql']]), 1)
+
+        # Logged out through another worker: this one still has the old key cached.
+        Token.objects.filter(user=self.user).delete()
+        token = self.client.post('/api/auth/login/', {'username': 'demo', 'password': 'demo123'}).data['token']
+        self.assertNotEqual(token, self.token)
+        self.assertEqual(Token.objects.get(user=self.user).key, token)
+        self.assertIsNone(token_cache.get(self.token))
+
+    def test_logout_invalidates(self):
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/dashboard/stats/').status_code, 401)
+        self.client.credentials()
+        token = self.client.post('/api/auth/login/', {'username': 'demo', 'password': 'demo123'}).data['token']
+        self.assertNotEqual(token, self.token)
+
+    def test_deactivation_invalidates(self):
+        self.assertEqual(self.client.get('/api/dashboard/stats/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/api/dashboard/stats/').status_code, 401)
+
+    @override_settings(TOKEN_AUTH_CACHE={'MAX_ENTRIES': 1, 'TIMEOUT': 60, 'USE_DJANGO_CACHE': True})
+    def test_shared_cache_and_eviction(self):
+        other = User.objects.create_user('other')
+        token_cache.set('other-key', other, None)
+        self.assertIsNone(token_cache.key_for_user(self.user.pk))
+        token_cache.clear()
+        self.assertEqual(token_cache.get('other-key')[0], other)
+        token_cache.invalidate_user(other.pk)
+        self.assertIsNone(token_cache.get('other-key'))
+
+
+@skipUnlessDBFeature('supports_partial_indexes')
+class QueryPlanTests(CRMTestCase):
+    full_scan = re.compile(r'^SCAN \S+$')
+
+    def explain(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plans[query['sql']] = [row[-1] for row in cursor.fetchall()]
+        return plans
+
+    def assertIndexed(self, url):
+        for sql, plan in self.explain(url).items():
+            with self.subTest(url=url, sql=sql):
+                self.assertFalse([step for step in plan if self.full_scan.match(step)], plan)
+                self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite syntax')
+        # No ANALYZE: with a handful of rows the planner would rightly prefer
+        # sorting in memory, whereas default statistics model a large table.
+        self.make_rows(5)
+
+    def test_list_pages_walk_created_at_index(self):
+        for url in ['/api/companies/', '/api/contacts/', '/api/deals/', '/api/tasks/']:
+            self.assertIndexed(url)
+            self.assertIndexed(url + '?page_size=2&ordering=created_at')
+
+    def test_dashboard_queries_use_indexes(self):
+        self.assertIndexed('/api/dashboard/stats/')
+
+    def test_work_queue_walks_queue_index(self):
+        self.assertIndexed('/api/tasks/mine/')
+
+    def test_timelines_use_indexes(self):
+        contact = Contact.objects.first()
+        self.assertIndexed(f'/api/contacts/{contact.pk}/timeline/')
+        # A company's tasks are sorted after the join; the rest are range scans.
+        for sql, plan in self.explain(f'/api/companies/{contact.company_id}/timeline/').items():
+            with self.subTest(sql=sql):
+                self.assertFalse([step for step in plan if self.full_scan.match(step)], plan)
+
+
+@override_settings(ROOT_URLCONF='tasks.tests')
+class ChangeFeedTests(CRMTestCase):
+    def logged(self, after=0):
+        return list(Change.objects.filter(id__gt=after).values_list('model', 'object_id', 'action'))
+
+    def test_writes_are_logged(self):
+        company = Company.objects.create(name='Acme')
+        contact = Contact.objects.create(first_name='A', last_name='B', email='a@example.com', company=company)
+        contact.save()
+        pk = company.pk
+        company.delete()
+        self.assertEqual(self.logged(), [
+            ('company', pk, 'saved'), ('contact', contact.pk, 'saved'), ('contact', contact.pk, 'saved'),
+            # Deleting the company nulls the contact's foreign key, so the contact changes too.
+            ('contact', contact.pk, 'saved'), ('company', pk, 'deleted'),
+        ])
+
+    def test_bulk_writes_and_sweep_are_logged(self):
+        response = self.client.post('/api/tasks/bulk/', [{'title': f'T{i}'} for i in range(3)], format='json')
+        ids = response.data['created']
+        self.assertEqual(self.logged(), [('task', pk, 'saved') for pk in ids])
+        cursor = changes.latest_cursor()
+        self.client.patch('/api/tasks/bulk/', [{'id': ids[0], 'status': 'completed'}], format='json')
+        self.client.delete('/api/tasks/bulk/', ids[1:2], format='json')
+        self.assertEqual(self.logged(cursor), [('task', ids[0], 'saved'), ('task', ids[1], 'deleted')])
+
+        cursor = changes.latest_cursor()
+        Task.objects.filter(pk=ids[2]).update(due_date=timezone.now() - timedelta(days=1))
+        jobs.sweep_overdue_tasks()
+        self.assertEqual(self.logged(cursor), [('task', ids[2], 'saved')])
+
+    def test_delta_returns_changed_records(self):
+        self.make_rows(2)
+        response = self.client.get('/api/changes/')
+        self.assertEqual(response.data, {'cursor': changes.latest_cursor(), 'more': False, 'changes': []})
+        cursor = response.data['cursor']
+
+        deal = Deal.objects.get(title='Deal 1')
+        deal.stage = 'won'
+        deal.save()
+        deal.title = 'Deal 1b'
+        deal.save()
+        task = Task.objects.get(title='Task 2')
+        task.save()
+        task_pk = task.pk
+        task.delete()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/changes/?since={cursor}')
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(len(ctx.captured_queries), 5)
+        self.assertEqual(response.data['cursor'], changes.latest_cursor())
+        self.assertFalse(response.data['more'])
+        self.assertEqual(
+            [(item['model'], item['id'], item['action']) for item in response.data['changes']],
+            [('deal', deal.pk, 'saved'), ('task', task_pk, 'deleted')],
+        )
+        expected = json.loads(self.client.get('/api/deals/?stage=won').content)['results'][0]
+        self.assertEqual(json.loads(response.content)['changes'][0]['data'], expected)
+        self.assertIsNone(response.data['changes'][1]['data'])
+
+        response = self.client.get(f'/api/changes/?since={cursor}&models=task')
+        self.assertEqual([item['model'] for item in response.data['changes']], ['task'])
+        self.assertEqual(self.client.get('/api/changes/?models=user').status_code, 400)
+        self.assertEqual(self.client.get('/api/changes/?since=x').status_code, 400)
+
+    @override_settings(CHANGES={**settings.CHANGES, 'PAGE_SIZE': 3})
+    def test_delta_pages(self):
+        companies = [Company.objects.create(name=f'C{i}') for i in range(5)]
+        response = self.client.get('/api/changes/?since=0')
+        self.assertTrue(response.data['more'])
+        self.assertEqual([item['id'] for item in response.data['changes']], [c.pk for c in companies[:3]])
+        response = self.client.get(f'/api/changes/?since={response.data["cursor"]}')
+        self.assertFalse(response.data['more'])
+        self.assertEqual([item['id'] for item in response.data['changes']], [c.pk for c in companies[3:]])
+
+    def test_pruned_cursor_is_gone(self):
+        for i in range(3):
+            Company.objects.create(name=f'C{i}')
+        cursor = changes.latest_cursor()
+        Change.objects.update(created_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(jobs.prune_changes(), {'deleted': 2})
+        self.assertEqual(self.client.get(f'/api/changes/?since={cursor}').status_code, 200)
+        response = self.client.get(f'/api/changes/?since={cursor - 2}')
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.data['cursor'], cursor)
+        self.assertEqual(self.client.get(f'/api/changes/?since={cursor + 1}').status_code, 410)
+
+    @override_settings(CHANGES={**settings.CHANGES, 'POLL_INTERVAL': 0.01})
+    async def test_stream_announces_new_cursors(self):
+        cursor = await changes.alatest_cursor()
+        stream = changes.event_stream(cursor)
+        self.assertEqual(await anext(stream), 'retry: 3000\n\n')
+        pending = asyncio.ensure_future(anext(stream))
+        # Let the broadcaster take its starting cursor before writing.
+        await asyncio.sleep(0.05)
+        company = await Company.objects.acreate(name='Acme')
+        self.assertEqual(await asyncio.wait_for(pending, 5),
+                         f'id: {cursor + 1}\nevent: changes\ndata: {{"cursor": {cursor + 1}, "models": ["company"]}}\n\n')
+        await stream.aclose()
+        # The poll stops once its last stream has closed.
+        await asyncio.sleep(0.05)
+        self.assertIsNone(changes.broadcaster.task)
+        self.assertEqual(await sync_to_async(changes.since)(cursor),
+                         ([('company', company.pk, 'saved')], cursor + 1, False))
+
+    async def test_stream_view(self):
+        token = await Token.objects.acreate(user=self.user)
+        response = await self.async_client.get('/api/changes/stream/?since=0',
+                                               headers={'Authorization': f'Token {token.key}'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(await anext(aiter(response.streaming_content)), b'retry: 3000\n\n')
+        self.assertEqual((await self.async_client.get('/api/changes/stream/')).status_code, 401)
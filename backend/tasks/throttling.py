@@ -0,0 +1,118 @@
+"""
+Token-bucket request budgets (``THROTTLE`` in settings).
+
+Each caller has a bucket of ``BURST`` units that refills at ``RATE`` units
+per second. The caller is the user, or the client IP when anonymous.
+Each request spends the cost of its endpoint (``COSTS``, 1 otherwise), so
+a list page or an export draws more than a detail read. Endpoints listed in
+``ENDPOINTS`` also get a bucket per caller of their own, counted in
+requests: ``(requests per second, burst)``.
+
+A request the budget can't cover gets a ``429`` with ``Retry-After`` set to
+when it would be. Buckets are kept in process. With ``CACHE`` set to a
+cache alias they are kept in that cache instead, and workers sharing it
+share budgets. The cache read and write aren't atomic, so concurrent
+requests from one caller may both spend the same units there.
+"""
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+
+def endpoint(view):
+    """
+    The name costs and endpoint limits are looked up by: the viewset action
+    (``list``, ``export``), the view's ``throttle_scope``, or the function
+    view's name without ``_view``.
+    """
+    action = getattr(view, 'action', None)
+    if action is not None:
+        return action
+    scope = getattr(view, 'throttle_scope', None)
+    if scope is not None:
+        return scope
+    return re.sub(r'_view$', '', type(view).__name__)
+
+
+class Buckets:
+    """Bounded, thread-safe LRU of bucket key -> ``[units, updated]``."""
+
+    def __init__(self):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, cost, rate, burst, now):
+        """Spend ``cost`` units, or return the seconds until there will be enough."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now]
+                if len(self._buckets) > settings.THROTTLE['MAX_BUCKETS']:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return spend(bucket, cost, rate, burst, now)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+def spend(bucket, cost, rate, burst, now):
+    units = min(burst, bucket[0] + max(now - bucket[1], 0) * rate)
+    bucket[1] = now
+    if units < cost:
+        bucket[0] = units
+        return (cost - units) / rate
+    bucket[0] = units - cost
+    return 0
+
+
+buckets = Buckets()
+
+
+def take_shared(cache, key, cost, rate, burst, now):
+    key = 'throttle:' + key
+    bucket = cache.get(key) or [burst, now]
+    wait = spend(bucket, cost, rate, burst, now)
+    # An untouched bucket is full again after burst / rate seconds.
+    cache.set(key, bucket, timeout=math.ceil(burst / rate))
+    return wait
+
+
+class TokenBucketThrottle(BaseThrottle):
+    def allow_request(self, request, view):
+        options = settings.THROTTLE
+        if not options['ENABLED']:
+            return True
+        user = request.user
+        caller = f'user:{user.pk}' if user.is_authenticated else 'ip:' + self.get_ident(request)
+        name = endpoint(view)
+        cost = options['COSTS'].get(name, 1)
+        # A cost above the burst could never be paid.
+        limits = [(caller, min(cost, options['BURST']), options['RATE'], options['BURST'])]
+        if name in options['ENDPOINTS']:
+            # First, so that it says no before the caller's budget is spent.
+            limits.insert(0, (f'{caller}:{name}', 1, *options['ENDPOINTS'][name]))
+
+        now = time.time()
+        cache = caches[options['CACHE']] if options['CACHE'] else None
+        self.wait_seconds = 0
+        for key, cost, rate, burst in limits:
+            if cache is None:
+                wait = buckets.take(key, cost, rate, burst, now)
+            else:
+                wait = take_shared(cache, key, cost, rate, burst, now)
+            if wait:
+                self.wait_seconds = wait
+                return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
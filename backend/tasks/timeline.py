@@ -0,0 +1,144 @@
+"""
+Activity timelines for contacts and companies.
+
+``GET /api/contacts/:id/timeline/`` and ``/api/companies/:id/timeline/``
+list the record and everything related to it, latest activity first. Each
+related record appears once, at its ``updated_at``, as ``created`` or
+``updated``:
+
+- a contact: itself, its deals and its tasks;
+- a company: itself, its contacts, its deals, and the tasks on its deals or
+  its contacts.
+
+Archived deals and tasks (``tasks.archive``) are included, rendered from
+their snapshots with the same ``model`` names. Their sources read ids and
+dates only; the snapshots of those that make the page are fetched after the
+merge, with one more query per archive table.
+
+Every source is one query for ``page_size + 1`` rows from the cursor on,
+and ``heapq.merge`` interleaves them into the page, so a page costs the same
+number of queries however many deals or tasks the record has. Direct
+relations are range scans of an index on ``(<foreign key>, -updated_at, id)``.
+A company's tasks are one join away, so the database sorts those tasks to
+find the page; that query grows with the company's task count.
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import Q
+from rest_framework.decorators import action
+
+from .models import ArchivedDeal, ArchivedTask, Company, Contact, Deal, Task
+from .pagination import KeysetPagination
+from .rows import RowPlan
+from .serializers import CompanySerializer, ContactSerializer, DealSerializer, TaskSerializer
+
+SERIALIZERS = {
+    Company: CompanySerializer,
+    Contact: ContactSerializer,
+    Deal: DealSerializer,
+    Task: TaskSerializer,
+}
+
+# Archived rows appear as the records they were.
+ARCHIVED = {
+    ArchivedDeal: Deal,
+    ArchivedTask: Task,
+}
+
+# auto_now_add and auto_now read the clock separately when a row is created.
+CREATED_WITHIN = timedelta(seconds=1)
+
+
+def sources(instance):
+    """The querysets a timeline is merged from. A record is in only one of them."""
+    if isinstance(instance, Contact):
+        return [
+            Contact.objects.filter(pk=instance.pk),
+            Deal.objects.filter(contact=instance),
+            Task.objects.filter(contact=instance),
+            ArchivedDeal.objects.filter(contact=instance.pk),
+            ArchivedTask.objects.filter(contact=instance.pk),
+        ]
+    return [
+        Company.objects.filter(pk=instance.pk),
+        Contact.objects.filter(company=instance),
+        Deal.objects.filter(company=instance),
+        Task.objects.filter(deal__company=instance),
+        # Tasks on the company's contacts that the deals didn't already bring in.
+        Task.objects.filter(contact__company=instance).exclude(deal__company=instance),
+        ArchivedDeal.objects.filter(company=instance.pk),
+        # Archived tasks keep plain ids, which may point at live or archived deals.
+        ArchivedTask.objects.filter(
+            Q(deal__in=Deal.objects.filter(company=instance).values('pk'))
+            | Q(deal__in=ArchivedDeal.objects.filter(company=instance.pk).values('pk'))
+            | Q(contact__in=Contact.objects.filter(company=instance).values('pk'))
+        ),
+    ]
+
+
+class TimelinePagination(KeysetPagination):
+    default_ordering = '-updated_at'
+    # No ?count=1: a total would read every related record.
+    count = None
+
+    def get_ordering(self, request, view):
+        return self.default_ordering
+
+    def position(self, item):
+        model, plan, row = item
+        return row['updated_at'], row['id']
+
+
+class TimelineMixin:
+    """Adds the ``timeline`` action to the contact and company viewsets."""
+    timeline_dependencies = (Company, Contact, Deal, Task, ArchivedDeal, ArchivedTask, User)
+
+    def get_queryset(self):
+        if self.action == 'timeline':
+            # Only to look the record up; its row comes from ``sources``.
+            return self.queryset.only('pk')
+        return super().get_queryset()
+
+    def get_cache_dependencies(self):
+        dependencies = super().get_cache_dependencies()
+        if self.action == 'timeline':
+            return tuple(dict.fromkeys((*dependencies, *self.timeline_dependencies)))
+        return dependencies
+
+    @action(detail=True)
+    def timeline(self, request, pk=None):
+        """The record and its related records, latest activity first."""
+        return self.conditional(self.timeline_page, request)
+
+    def timeline_page(self, request):
+        instance = self.get_object()
+        paginator = TimelinePagination()
+        paginator.start_page(request, self)
+        pages = []
+        for queryset in sources(instance):
+            if queryset.model in ARCHIVED:
+                plan = None
+                rows = paginator.page_queryset(queryset.values('id', 'created_at', 'updated_at'))
+            else:
+                plan = RowPlan.compile(SERIALIZERS[queryset.model])
+                rows = paginator.page_queryset(plan.values(queryset, 'created_at', 'updated_at'))
+            pages.append([(queryset.model, plan, row) for row in rows])
+        page = paginator.set_page(paginator.merge_pages(*pages))
+        self.add_snapshots(page)
+        return paginator.get_paginated_response([self.timeline_item(*item) for item in page])
+
+    def add_snapshots(self, page):
+        for model in ARCHIVED:
+            rows = {row['id']: row for item_model, plan, row in page if item_model is model}
+            if rows:
+                for pk, snapshot in model.objects.filter(pk__in=rows).values_list('pk', 'snapshot'):
+                    rows[pk]['snapshot'] = snapshot
+
+    def timeline_item(self, model, plan, row):
+        return {
+            'model': ARCHIVED.get(model, model)._meta.model_name,
+            'id': row['id'],
+            'event': 'created' if row['updated_at'] - row['created_at'] < CREATED_WITHIN else 'updated',
+            'data': row['snapshot'] if plan is None else plan.to_representation(row),
+        }
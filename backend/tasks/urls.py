@@ -1,19 +1,39 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .async_views import AsyncReadRouter
 from .views import (
-    CompanyViewSet, ContactViewSet, DealViewSet, TaskViewSet,
-    login_view, logout_view, dashboard_stats
+    CompanyViewSet, ContactViewSet, DealViewSet, TaskViewSet, ImportJobViewSet, JobViewSet, DashboardStatsView,
+    ChangeStreamView, login_view, logout_view, dashboard_stats, dashboard_pipeline, search_view, changes_view
 )
 
-router = DefaultRouter()
-router.register(r'companies', CompanyViewSet)
-router.register(r'contacts', ContactViewSet)
-router.register(r'deals', DealViewSet)
-router.register(r'tasks', TaskViewSet)
 
-urlpatterns = [
-    path('auth/login/', login_view, name='login'),
-    path('auth/logout/', logout_view, name='logout'),
-    path('dashboard/stats/', dashboard_stats, name='dashboard_stats'),
-    path('', include(router.urls)),
-]
+def api_urlpatterns(async_views=False):
+    """
+    The API's routes; ``async_views`` serves dashboard stats and list/detail
+    reads through their async handlers (see ``tasks.async_views``), and adds
+    the change stream.
+    """
+    router = AsyncReadRouter() if async_views else DefaultRouter()
+    router.register(r'companies', CompanyViewSet)
+    router.register(r'contacts', ContactViewSet)
+    router.register(r'deals', DealViewSet)
+    router.register(r'tasks', TaskViewSet)
+    router.register(r'imports', ImportJobViewSet, basename='importjob')
+    router.register(r'jobs', JobViewSet, basename='job')
+
+    routes = [
+        path('auth/login/', login_view, name='login'),
+        path('auth/logout/', logout_view, name='logout'),
+        path('dashboard/stats/', DashboardStatsView.as_async_view() if async_views else dashboard_stats,
+             name='dashboard_stats'),
+        path('dashboard/pipeline/', dashboard_pipeline, name='dashboard_pipeline'),
+        path('search/', search_view, name='search'),
+        path('changes/', changes_view, name='changes'),
+    ]
+    if async_views:
+        routes.append(path('changes/stream/', ChangeStreamView.as_async_view(), name='change_stream'))
+    return routes + [path('', include(router.urls))]
+
+
+urlpatterns = api_urlpatterns(async_views=settings.ASYNC_VIEWS)
@@ -0,0 +1,56 @@
+"""
+Per-table version counters kept in the cache.
+
+Every committed write to a tracked table bumps its counter: model signals
+cover ``save()``/``delete()`` and the bulk paths, which bypass signals, bump
+explicitly. Anything derived from a set of tables (the dashboard snapshot,
+cached API responses, their ETags) is keyed on the current versions of
+those tables, so it goes stale by construction rather than being deleted.
+"""
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+
+KEY = 'version:{label}'
+
+
+def _key(model):
+    return KEY.format(label=model._meta.label_lower)
+
+
+def _fresh():
+    # Seeded from the clock so an evicted counter can't restart at a value
+    # something is still cached under.
+    return time.time_ns() // 1000
+
+
+def get(*models):
+    """Current versions of ``models``, in order, in one cache round-trip."""
+    keys = [_key(model) for model in models]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, _fresh(), timeout=None)
+        found.update(cache.get_many(missing))
+    return tuple(found[key] for key in keys)
+
+
+def bump(*models):
+    for model in models:
+        try:
+            cache.incr(_key(model))
+        except ValueError:
+            cache.add(_key(model), _fresh(), timeout=None)
+
+
+def bump_on_commit(*models):
+    """
+    Bump now, so this transaction's own reads see the change, and again
+    after commit, so nothing another request built from pre-commit data in
+    between is served under the new version.
+    """
+    bump(*models)
+    transaction.on_commit(partial(bump, *models))
@@ -1,16 +1,38 @@
-from rest_framework import viewsets, status
+import uuid
+
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import api_view, action, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.authtoken.models import Token
+from rest_framework.utils.urls import replace_query_param
 from django.contrib.auth import authenticate
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Count, Sum, Q
-from .models import Company, Contact, Deal, Task
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.utils.functional import cached_property
+from . import changes, dashboard, importer, jobs, pipeline, search
+from .authentication import get_token, token_cache
+from .archive import ArchiveMixin
+from .async_views import AsyncReadMixin
+from .bulk import BulkMixin
+from .conditional import ConditionalMixin, not_modified, set_validators
+from .export import ExportMixin, full_name, streaming_content
+from .models import ArchivedDeal, ArchivedTask, Company, Contact, Deal, ImportJob, Job, Task
+from .planning import plan_queryset, prefetch_expansion
+from .renderers import EventStreamRenderer, FastJSONRenderer
+from .rows import RowPlan, RowSerializer
 from .serializers import (
-    CompanySerializer, ContactSerializer, DealSerializer,
-    TaskSerializer, UserSerializer
+    CompanySerializer, ContactSerializer, DealSerializer, ImportJobSerializer,
+    JobSerializer, TaskSerializer, UserSerializer
 )
+from .timeline import TimelineMixin
 
 
 @api_view(['POST'])
@@ -21,7 +43,7 @@ def login_view(request):
 
     user = authenticate(username=username, password=password)
     if user:
-        token, created = Token.objects.get_or_create(user=user)
+        token = get_token(user)
         return Response({
             'token': token.key,
             'user': UserSerializer(user).data
@@ -32,66 +54,424 @@ def login_view(request):
 @api_view(['POST'])
 def logout_view(request):
     if request.user.is_authenticated:
-        request.user.auth_token.delete()
+        Token.objects.filter(user=request.user).delete()
+        token_cache.invalidate_user(request.user.pk)
     return Response({'message': 'Logged out successfully'})
 
 
+class DashboardStatsView(AsyncReadMixin, APIView):
+    throttle_scope = 'dashboard_stats'
+
+    def get(self, request):
+        return self.snapshot_response(request, dashboard.get_snapshot())
+
+    async def aget(self, request):
+        return self.snapshot_response(request, await dashboard.aget_snapshot())
+
+    def snapshot_response(self, request, snapshot):
+        response = not_modified(request, snapshot['etag'], snapshot['modified'])
+        if response is not None:
+            return response
+        return set_validators(Response(snapshot['stats']), snapshot['etag'], snapshot['modified'])
+
+
+dashboard_stats = DashboardStatsView.as_view()
+
+
 @api_view(['GET'])
-def dashboard_stats(request):
-    if not request.user.is_authenticated:
-        return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
-
-    stats = {
-        'total_contacts': Contact.objects.count(),
-        'total_companies': Company.objects.count(),
-        'total_deals': Deal.objects.count(),
-        'total_tasks': Task.objects.count(),
-        'deals_by_stage': list(Deal.objects.values('stage').annotate(count=Count('id'))),
-        'total_deal_value': Deal.objects.aggregate(total=Sum('amount'))['total'] or 0,
-        'won_deals_value': Deal.objects.filter(stage='won').aggregate(total=Sum('amount'))['total'] or 0,
-        'pending_tasks': Task.objects.filter(status='pending').count(),
-        'overdue_tasks': Task.objects.filter(
-            due_date__lt=timezone.now(),
-            status__in=['pending', 'in_progress']
-        ).count() if 'timezone' in dir() else 0,
-    }
-    return Response(stats)
+def dashboard_pipeline(request):
+    return Response(pipeline.summary())
+
+
+@api_view(['GET'])
+def search_view(request):
+    query = request.query_params.get('q', '')
+    kinds = [kind.strip() for kind in request.query_params.get('type', '').split(',') if kind.strip()] or None
+    unknown = sorted(set(kinds or ()).difference(search.KINDS))
+    if unknown:
+        raise ValidationError({'type': [
+            f'Unknown types: {", ".join(unknown)}. Choose from: {", ".join(search.KINDS)}.'
+        ]})
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+        page_size = min(max(int(request.query_params.get('page_size', 20)), 1), 100)
+    except ValueError:
+        return Response({'error': 'page and page_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = search.search(query, kinds=kinds, limit=page_size + 1, offset=(page - 1) * page_size)
+    url = request.build_absolute_uri()
+    return Response({
+        'next': replace_query_param(url, 'page', page + 1) if len(results) > page_size else None,
+        'previous': replace_query_param(url, 'page', page - 1) if page > 1 else None,
+        'results': results[:page_size],
+    })
+
+
+class QueryPlanMixin:
+    """
+    Builds the queryset from the fields the serializer renders.
+
+    JSON reads skip model instances altogether: list and retrieve select
+    ``values()`` rows and render them through the serializer's ``RowPlan``.
+    Those payloads hold only strings, ints and nulls, which is what lets
+    them go through the orjson renderer unchanged.
 
+    Reads take ``?fields=`` to render, and select, only some of the fields,
+    and ``?expand=`` to inline the reverse relations in ``expandable_fields``.
+    Each expansion is one prefetch query for the whole page; expanded reads
+    render from instances.
+    """
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+    expandable_fields = {}
+    read_actions = ('list', 'retrieve')
 
-from django.utils import timezone
+    def get_query_names(self, param, allowed):
+        value = self.request.query_params.get(param) if self.action in self.read_actions else None
+        names = frozenset(name.strip() for name in (value or '').split(',') if name.strip())
+        if not names:
+            return None
+        unknown = names.difference(allowed)
+        if unknown:
+            raise ValidationError({param: [
+                f'Unknown fields: {", ".join(sorted(unknown))}. Choose from: {", ".join(allowed)}.'
+            ]})
+        return names
 
+    @cached_property
+    def field_names(self):
+        return self.get_query_names(self.fields_query_param, list(self.get_serializer_class()().fields))
 
-class CompanyViewSet(viewsets.ModelViewSet):
+    @cached_property
+    def expansions(self):
+        return self.get_query_names(self.expand_query_param, list(self.expandable_fields)) or ()
+
+    def get_cache_dependencies(self):
+        dependencies = list(super().get_cache_dependencies())
+        for name in self.expansions:
+            model = self.expandable_fields[name].Meta.model
+            dependencies.append(model)
+            dependencies.extend(field.related_model for field in model._meta.concrete_fields if field.many_to_one)
+        return tuple(dict.fromkeys(dependencies))
+
+    def get_row_plan(self):
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        if self.action not in self.read_actions or getattr(renderer, 'format', None) != 'json':
+            return None
+        if self.expansions:
+            return None
+        return RowPlan.compile(self.get_serializer_class(), self.field_names)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Cursors read the ordering column off the page's first and last rows.
+        ordering = getattr(self, 'ordering_fields', ())
+        plan = self.get_row_plan()
+        if plan is not None:
+            return plan.values(queryset, *ordering)
+        queryset = plan_queryset(queryset, super().get_serializer(), self.field_names, extra=ordering)
+        for name in self.expansions:
+            queryset = queryset.prefetch_related(
+                prefetch_expansion(queryset.model, name, self.expandable_fields[name]())
+            )
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        plan = self.get_row_plan()
+        if plan is not None and (args or 'instance' in kwargs):
+            return RowSerializer(plan, *args, many=kwargs.get('many', False))
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.field_names is not None or self.expansions:
+            fields = getattr(serializer, 'child', serializer).fields
+            for name in list(fields):
+                if self.field_names is not None and name not in self.field_names:
+                    fields.pop(name)
+            for name in self.expansions:
+                fields[name] = self.expandable_fields[name](many=True, read_only=True)
+        return serializer
+
+
+class CompanyViewSet(BulkMixin, ExportMixin, TimelineMixin, QueryPlanMixin, ConditionalMixin, AsyncReadMixin,
+                     viewsets.ModelViewSet):
     queryset = Company.objects.all()
     serializer_class = CompanySerializer
     permission_classes = [IsAuthenticated]
+    cache_dependencies = (Company, Contact, Deal, User)
+    expandable_fields = {'contacts': ContactSerializer, 'deals': DealSerializer}
+    filter_fields = {'industry': 'industry'}
+    ordering_fields = ['created_at', 'updated_at']
+    export_fields = [
+        'id', 'name', 'industry', 'website', 'phone', 'email', 'address', 'notes',
+        'created_at', 'updated_at', 'created_by', ('created_by_name', 'created_by__username'),
+    ]
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # Deals go with the company through the cascade.
+        pipeline.record_many(old=instance.deals.values(*pipeline.DEAL_FIELDS))
+        instance.delete()
+
+    def bulk_deleting(self, queryset):
+        pipeline.record_many(old=Deal.objects.filter(company__in=queryset).values(*pipeline.DEAL_FIELDS))
+
 
-class ContactViewSet(viewsets.ModelViewSet):
+class ContactViewSet(BulkMixin, ExportMixin, TimelineMixin, QueryPlanMixin, ConditionalMixin, AsyncReadMixin,
+                     viewsets.ModelViewSet):
     queryset = Contact.objects.all()
     serializer_class = ContactSerializer
     permission_classes = [IsAuthenticated]
+    cache_dependencies = (Contact, Company, User)
+    expandable_fields = {'deals': DealSerializer, 'tasks': TaskSerializer}
+    filter_fields = {'company': 'company'}
+    ordering_fields = ['created_at', 'updated_at']
+    export_fields = [
+        'id', 'first_name', 'last_name', 'email', 'phone', 'position', 'company',
+        ('company_name', 'company__name'), 'notes', 'created_at', 'updated_at',
+        'created_by', ('created_by_name', 'created_by__username'),
+    ]
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
 
-class DealViewSet(viewsets.ModelViewSet):
+class DealViewSet(BulkMixin, ExportMixin, ArchiveMixin, QueryPlanMixin, ConditionalMixin, AsyncReadMixin,
+                  viewsets.ModelViewSet):
     queryset = Deal.objects.all()
+    archive_model = ArchivedDeal
     serializer_class = DealSerializer
     permission_classes = [IsAuthenticated]
+    cache_dependencies = (Deal, Company, Contact, User)
+    expandable_fields = {'tasks': TaskSerializer}
+    filter_fields = {
+        'stage': 'stage',
+        'company': 'company',
+        'contact': 'contact',
+    }
+    ordering_fields = ['created_at', 'updated_at', 'amount']
+    export_fields = [
+        'id', 'title', 'amount', 'stage', 'probability', 'expected_close_date',
+        'company', ('company_name', 'company__name'), 'contact', ('contact_name', full_name('contact')),
+        'notes', 'created_at', 'updated_at', 'created_by', ('created_by_name', 'created_by__username'),
+    ]
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        deal = serializer.save(created_by=self.request.user)
+        pipeline.record(new=deal)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old = pipeline.current_state(serializer.instance.pk)
+        deal = serializer.save()
+        pipeline.record(old=old, new=deal)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        pipeline.record(old=pipeline.current_state(instance.pk))
+        instance.delete()
+
+    def bulk_created(self, objs):
+        pipeline.record_many(new=objs)
+
+    def bulk_updated(self, old_states, objs):
+        pipeline.record_many(old=old_states, new=objs)
+
+    def bulk_deleting(self, queryset):
+        pipeline.record_many(old=queryset.values(*pipeline.DEAL_FIELDS))
 
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(BulkMixin, ExportMixin, ArchiveMixin, QueryPlanMixin, ConditionalMixin, AsyncReadMixin,
+                  viewsets.ModelViewSet):
     queryset = Task.objects.all()
+    archive_model = ArchivedTask
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
+    cache_dependencies = (Task, Contact, Deal, User)
+    filter_fields = {
+        'status': 'status',
+        'priority': 'priority',
+        'assigned_to': 'assigned_to',
+        'contact': 'contact',
+        'deal': 'deal',
+        'due_date_after': 'due_date__gte',
+        'due_date_before': 'due_date__lt',
+        'overdue': 'is_overdue',
+    }
+    ordering_fields = ['created_at', 'updated_at']
+    read_actions = ('list', 'retrieve', 'mine')
+    export_fields = [
+        'id', 'title', 'description', 'status', 'priority', 'due_date',
+        'contact', ('contact_name', full_name('contact')), 'deal', ('deal_title', 'deal__title'),
+        'assigned_to', ('assigned_to_name', 'assigned_to__username'),
+        'created_at', 'updated_at', 'created_by', ('created_by_name', 'created_by__username'),
+    ]
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
+
+    @action(detail=False)
+    def mine(self, request):
+        """
+        The user's most urgent ``page_size`` open tasks in work queue order
+        (overdue, then due, then undated; by priority within each), and their
+        task counts by status. Not paginated: the counts tell whether the list
+        is complete, and ``/api/tasks/?assigned_to=`` pages through the rest.
+        """
+        return self.conditional(self.work_queue, request)
+
+    def work_queue(self, request):
+        limit = self.paginator.get_page_size(request)
+        queue = (self.filter_queryset(self.get_queryset())
+                 .filter(assigned_to=request.user, priority_rank__isnull=False)
+                 .order_by(*Task.QUEUE_ORDERING))
+        rows = list(queue[:limit])
+        # Both queries are range scans of task_queue_idx.
+        counts = Task.objects.filter(assigned_to=request.user).aggregate(
+            **{status: Count('pk', filter=Q(status=status)) for status, _ in Task.STATUS_CHOICES},
+            overdue=Count('pk', filter=Q(priority_rank__lt=len(Task.PRIORITY_RANKS))),
+        )
+        return Response({
+            'counts': counts,
+            'results': self.get_serializer(rows, many=True).data,
+        })
+
+
+class ImportJobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                       mixins.ListModelMixin, viewsets.GenericViewSet):
+    serializer_class = ImportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(created_by=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data.pop('file')
+
+        settings.IMPORT_DIR.mkdir(parents=True, exist_ok=True)
+        path = settings.IMPORT_DIR / f'{uuid.uuid4().hex}.csv'
+        with open(path, 'wb') as f:
+            for chunk in upload.chunks():
+                f.write(chunk)
+        job = serializer.save(source=str(path), created_by=request.user)
+
+        # Small files are imported inline; anything bigger goes to the job
+        # worker and the client polls the import.
+        if upload.size <= settings.IMPORT_INLINE_MAX_BYTES:
+            job = importer.Importer(job).run()
+            return Response(self.get_serializer(job).data, status=status.HTTP_201_CREATED)
+        jobs.enqueue('import_csv', {'import_job': job.pk}, created_by=request.user)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class JobViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Job.objects.filter(created_by=self.request.user)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'succeeded' or not job.output:
+            raise Http404
+        try:
+            f = open(job.output, 'rb')
+        except FileNotFoundError:
+            raise Http404
+        response = FileResponse(f, as_attachment=True, filename=(job.result or {}).get('filename'))
+        if isinstance(request._request, ASGIRequest):
+            # Under WSGI the file goes out through wsgi.file_wrapper as it is.
+            response.streaming_content = streaming_content(request._request, response.streaming_content, 16)
+        return response
+
+
+CHANGE_VIEWSETS = {
+    'company': CompanyViewSet,
+    'contact': ContactViewSet,
+    'deal': DealViewSet,
+    'task': TaskViewSet,
+}
+
+
+def get_cursor(value):
+    try:
+        cursor = int(value)
+        if cursor < 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ValidationError({'since': ['Must be a cursor from an earlier response.']})
+    return cursor
+
+
+def change_records(request, found):
+    """``{(model, id): data}`` for the saved records in ``found``, rendered as their list endpoint would."""
+    saved = {}
+    for model, object_id, action in found:
+        if action == 'saved':
+            saved.setdefault(model, []).append(object_id)
+    records = {}
+    for model, ids in saved.items():
+        view = CHANGE_VIEWSETS[model](request=request, format_kwarg=None, action='list', args=(), kwargs={})
+        queryset = view.get_queryset().filter(pk__in=ids)
+        for data in view.get_serializer(queryset, many=True).data:
+            records[model, data['id']] = data
+    return records
+
+
+@api_view(['GET'])
+def changes_view(request):
+    """
+    Records changed after ``?since=<cursor>``, optionally only for
+    ``?models=company,task``. Without ``since``, the cursor to start from.
+    """
+    models = request.query_params.get('models')
+    if models:
+        models = set(models.split(','))
+        unknown = models.difference(CHANGE_VIEWSETS)
+        if unknown:
+            raise ValidationError({'models': [
+                f'Unknown models: {", ".join(sorted(unknown))}. Choose from: {", ".join(CHANGE_VIEWSETS)}.'
+            ]})
+    since = request.query_params.get('since')
+    if since is None:
+        return Response({'cursor': changes.latest_cursor(), 'more': False, 'changes': []})
+    cursor = get_cursor(since)
+    if changes.expired(cursor):
+        return Response({
+            'detail': 'The change log no longer goes back to this cursor; reload and continue from this one.',
+            'cursor': changes.latest_cursor(),
+        }, status=status.HTTP_410_GONE)
+
+    found, cursor, more = changes.since(cursor, models or None)
+    records = change_records(request, found)
+    results = []
+    for model, object_id, action in found:
+        # A record saved in this window may have been deleted since.
+        data = records.get((model, object_id))
+        results.append({'model': model, 'id': object_id, 'action': 'deleted' if data is None else 'saved',
+                        'data': data})
+    return Response({'cursor': cursor, 'more': more, 'changes': results})
+
+
+class ChangeStreamView(AsyncReadMixin, APIView):
+    """
+    Server-Sent Events announcing new change cursors (``tasks.changes``).
+    Routed under ASGI only: under WSGI each open stream would hold a worker.
+    """
+    renderer_classes = [FastJSONRenderer, EventStreamRenderer]
+
+    async def aget(self, request):
+        since = request.query_params.get('since', request.headers.get('Last-Event-ID'))
+        cursor = get_cursor(since) if since is not None else await changes.alatest_cursor()
+        response = StreamingHttpResponse(changes.event_stream(cursor), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Tell nginx not to buffer the stream.
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -17,6 +17,32 @@ api.interceptors.request.use((config) => {
   return config
 })
 
+// Over the request budget the API answers 429 with Retry-After in seconds;
+// wait that long and send the request again.
+const MAX_RETRIES = 3
+api.interceptors.response.use(undefined, async (error) => {
+  const { config, response } = error
+  if (response?.status !== 429 || !config || (config.retries || 0) >= MAX_RETRIES) {
+    throw error
+  }
+  config.retries = (config.retries || 0) + 1
+  const seconds = Number(response.headers['retry-after']) || 1
+  await new Promise((resolve) => setTimeout(resolve, seconds * 1000))
+  return api(config)
+})
+
+// List endpoints are cursor-paginated; follow `next` until the collection is complete.
+async function fetchAll(url, params = {}) {
+  const results = []
+  let response = await api.get(url, { params: { page_size: 500, ...params } })
+  results.push(...response.data.results)
+  while (response.data.next) {
+    response = await api.get(response.data.next)
+    results.push(...response.data.results)
+  }
+  return results
+}
+
 export const authService = {
   async login(username, password) {
     const response = await api.post('/auth/login/', { username, password })
@@ -38,14 +64,18 @@ export const crmService = {
   },
 
   // Companies
-  async getCompanies() {
-    const response = await api.get('/companies/')
-    return response.data
+  async getCompanies(params = {}) {
+    return fetchAll('/companies/', params)
   },
   async getCompany(id) {
     const response = await api.get(`/companies/${id}/`)
     return response.data
   },
+  // One page of the company's activity, newest first
+  async getCompanyTimeline(id, params = {}) {
+    const response = await api.get(`/companies/${id}/timeline/`, { params })
+    return response.data
+  },
   async createCompany(data) {
     const response = await api.post('/companies/', data)
     return response.data
@@ -59,14 +89,17 @@ export const crmService = {
   },
 
   // Contacts
-  async getContacts() {
-    const response = await api.get('/contacts/')
-    return response.data
+  async getContacts(params = {}) {
+    return fetchAll('/contacts/', params)
   },
   async getContact(id) {
     const response = await api.get(`/contacts/${id}/`)
     return response.data
   },
+  async getContactTimeline(id, params = {}) {
+    const response = await api.get(`/contacts/${id}/timeline/`, { params })
+    return response.data
+  },
   async createContact(data) {
     const response = await api.post('/contacts/', data)
     return response.data
@@ -80,9 +113,8 @@ export const crmService = {
   },
 
   // Deals
-  async getDeals() {
-    const response = await api.get('/deals/')
-    return response.data
+  async getDeals(params = {}) {
+    return fetchAll('/deals/', params)
   },
   async getDeal(id) {
     const response = await api.get(`/deals/${id}/`)
@@ -101,8 +133,12 @@ export const crmService = {
   },
 
   // Tasks
-  async getTasks() {
-    const response = await api.get('/tasks/')
+  async getTasks(params = {}) {
+    return fetchAll('/tasks/', params)
+  },
+  // The user's open tasks, most urgent first, with their counts by status
+  async getMyTasks(params = {}) {
+    const response = await api.get('/tasks/mine/', { params })
     return response.data
   },
   async getTask(id) {
@@ -122,4 +158,124 @@ export const crmService = {
   },
 }
 
+export const changeService = {
+  // The cursor to sync from; take it before loading the lists it keeps current.
+  async getCursor() {
+    const response = await api.get('/changes/')
+    return response.data.cursor
+  },
+  async getChanges(since, models) {
+    const response = await api.get('/changes/', { params: { since, models: models.join(',') } })
+    return response.data
+  },
+}
+
+// Apply one model's entries from /changes/ to a list of its records.
+export function applyChanges(records, changes) {
+  const result = [...records]
+  for (const change of changes) {
+    const index = result.findIndex(record => record.id === change.id)
+    if (change.action === 'deleted') {
+      if (index > -1) result.splice(index, 1)
+    } else if (index > -1) {
+      result[index] = change.data
+    } else {
+      result.unshift(change.data)
+    }
+  }
+  return result
+}
+
+// Read the server-sent events of /changes/stream/ through fetch, since
+// EventSource can't send the Authorization header.
+async function readEvents(url, signal, onEvent) {
+  const response = await fetch(url, {
+    headers: { Authorization: `Token ${localStorage.getItem('token')}`, Accept: 'text/event-stream' },
+    signal,
+  })
+  if (!response.ok) return response.status
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+  let buffer = ''
+  for (;;) {
+    const { value, done } = await reader.read()
+    if (done) return response.status
+    buffer += value
+    const messages = buffer.split('\n\n')
+    buffer = messages.pop()
+    for (const message of messages) {
+      const fields = Object.fromEntries(message.split('\n')
+        .filter(line => line && !line.startsWith(':'))
+        .map(line => [line.slice(0, line.indexOf(':')), line.slice(line.indexOf(':') + 1).trim()]))
+      if (fields.event === 'changes') onEvent(JSON.parse(fields.data))
+    }
+  }
+}
+
+// Keep `lists` ({ company: companiesRef, ... }) current from `cursor` on: on
+// each announcement from the change stream, or every `interval` ms where the
+// server has no stream (WSGI). A null list only triggers `onChange`.
+// `onExpired` reloads when the cursor is too old.
+// Returns { sync, stop }; call sync() after your own writes.
+export function watchChanges(lists, cursor, { onChange, onExpired, interval = 10000 } = {}) {
+  const models = Object.keys(lists)
+  const controller = new AbortController()
+  let timer = null
+  let running = null
+
+  const pull = async () => {
+    let page
+    do {
+      try {
+        page = await changeService.getChanges(cursor, models)
+      } catch (error) {
+        if (error.response?.status !== 410) throw error
+        cursor = error.response.data.cursor
+        await onExpired?.()
+        return
+      }
+      for (const model of models) {
+        const changes = page.changes.filter(change => change.model === model)
+        if (changes.length && lists[model]) lists[model].value = applyChanges(lists[model].value, changes)
+      }
+      cursor = page.cursor
+      if (page.changes.length) onChange?.(page.changes)
+    } while (page.more && !controller.signal.aborted)
+  }
+  // One pull at a time; a request during a pull runs once it finishes.
+  const sync = () => {
+    running = (running || Promise.resolve()).then(pull).catch(error => {
+      console.error('Failed to sync changes:', error)
+    })
+    return running
+  }
+
+  const listen = async () => {
+    while (!controller.signal.aborted) {
+      let status
+      try {
+        status = await readEvents(`${API_BASE_URL}/changes/stream/?since=${cursor}`, controller.signal, event => {
+          if (!event.models || event.models.some(model => models.includes(model))) sync()
+        })
+      } catch (error) {
+        if (controller.signal.aborted) return
+      }
+      if (status === 404) {
+        timer = setInterval(sync, interval)
+        return
+      }
+      await new Promise(resolve => setTimeout(resolve, 3000))
+      sync()
+    }
+  }
+  listen()
+
+  return {
+    sync,
+    stop() {
+      controller.abort()
+      clearInterval(timer)
+    },
+  }
+}
+
 export default api